@@ -9,63 +9,9 @@ const MDD_CRITERIA = {
   requiredDurationDays: 14,
   mustIncludeOneOf: ['A1', 'A2'],
 
-  symptoms: {
-    A1: {
-      id: 'depressed_mood',
-      code: 'A1',
-      name: 'Depressed mood most of the day, nearly every day',
-      weight: 1,
-    },
-    A2: {
-      id: 'anhedonia',
-      code: 'A2',
-      name: 'Markedly diminished interest or pleasure in all, or almost all, activities',
-      weight: 1,
-    },
-    A3: {
-      id: 'weight_change',
-      code: 'A3',
-      name: 'Significant weight loss or gain, or decrease/increase in appetite',
-      weight: 1,
-    },
-    A4: {
-      id: 'sleep_disturbance',
-      code: 'A4',
-      name: 'Insomnia or hypersomnia nearly every day',
-      weight: 1,
-    },
-    A5: {
-      id: 'psychomotor',
-      code: 'A5',
-      name: 'Psychomotor agitation or retardation (observable by others)',
-      weight: 1,
-    },
-    A6: {
-      id: 'fatigue',
-      code: 'A6',
-      name: 'Fatigue or loss of energy nearly every day',
-      weight: 1,
-    },
-    A7: {
-      id: 'worthlessness',
-      code: 'A7',
-      name: 'Feelings of worthlessness or excessive/inappropriate guilt',
-      weight: 1,
-    },
-    A8: {
-      id: 'concentration',
-      code: 'A8',
-      name: 'Diminished ability to think or concentrate, or indecisiveness',
-      weight: 1,
-    },
-    A9: {
-      id: 'suicidal_ideation',
-      code: 'A9',
-      name: 'Recurrent thoughts of death, suicidal ideation, or suicide attempt',
-      weight: 1,
-      flagForCrisis: true,
-    },
-  },
+  // Shared with the RAG service's in-process NLP bridge, which must send the
+  // same criterion names as _mapSymptomsToCriteria
+  symptoms: require('./mdd-symptoms.json'),
 
   severityLevels: {
     subthreshold: {
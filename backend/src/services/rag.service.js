@@ -21,7 +21,10 @@ class RAGService {
       if (symptoms) payload.symptoms = symptoms;
       if (metadata) payload.metadata = metadata;
 
-      const response = await this.client.post('/rag/query', payload);
+      // Tell the RAG service when we stop waiting so it can abandon the work
+      const response = await this.client.post('/rag/query', payload, {
+        headers: { 'X-Request-Timeout-Ms': String(config.ragService.timeout) },
+      });
 
       if (!response.data.success) {
         throw new Error('RAG service returned unsuccessful response');
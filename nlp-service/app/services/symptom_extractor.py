@@ -70,6 +70,28 @@ class SymptomExtractor:
         # Process with spaCy
         doc = self.nlp(cleaned_text)
         
+        return self._extract_from_doc(doc, cleaned_text)
+    
+    def extract_batch(self, texts: List[str], batch_size: int = 64) -> List[Dict[str, Any]]:
+        """
+        Extract symptoms from many texts using spaCy's streaming nlp.pipe
+        
+        Args:
+            texts: Natural language inputs describing symptoms
+            batch_size: Number of texts spaCy buffers per batch
+            
+        Returns:
+            List of extraction results, in the same order as the input
+        """
+        cleaned_texts = [self.text_processor.clean_text(text) for text in texts]
+        docs = self.nlp.pipe(cleaned_texts, batch_size=batch_size)
+        return [
+            self._extract_from_doc(doc, cleaned_text)
+            for doc, cleaned_text in zip(docs, cleaned_texts)
+        ]
+    
+    def _extract_from_doc(self, doc: Doc, cleaned_text: str) -> Dict[str, Any]:
+        """Run matchers and marker extraction over an already-processed Doc"""
         # Extract symptoms
         symptoms = []
         detected_symptom_ids = set()
@@ -0,0 +1,388 @@
+"""
+Offline Bulk Symptom Scoring
+Re-scores an archive of patient texts with the SymptomExtractor without going
+through the HTTP API. Input is streamed in fixed-size shards, each shard is
+scored by a worker process holding its own spaCy model and extractor, and the
+results are written to one output file per shard. A checkpoint file records
+finished shards so an interrupted run resumes where it stopped; it also
+records the input file's size and modification time, so an input edited or
+replaced in place is not resumed against stale shards.
+
+Usage:
+    python scripts/bulk_score.py --input archive.jsonl --output-dir scored/
+    python scripts/bulk_score.py --input archive.csv --output-dir scored/ --workers 8
+    python scripts/bulk_score.py --input archive.parquet --output-dir scored/ --text-field narrative
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHECKPOINT_FILE = "_checkpoint.json"
+SUPPORTED_FORMATS = ("jsonl", "csv", "parquet")
+
+# Per-process extractor, created once by the pool initializer
+_worker_extractor = None
+_worker_batch_size = 64
+
+
+# --- Input readers ---
+
+def detect_format(path: str) -> str:
+    """Infer the input format from the file extension"""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("jsonl", "ndjson"):
+        return "jsonl"
+    if ext in ("csv", "parquet"):
+        return ext
+    raise ValueError(
+        f"Cannot infer input format from '{path}'; pass --format ({', '.join(SUPPORTED_FORMATS)})"
+    )
+
+
+def _open_parquet(path: str):
+    """Open a Parquet file; pyarrow is only needed for Parquet input"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Error: reading Parquet input requires pyarrow (pip install pyarrow)")
+        sys.exit(1)
+    return pq.ParquetFile(path)
+
+
+def iter_records(path: str, fmt: str) -> Iterator[Dict[str, Any]]:
+    """Stream records from the input file one at a time"""
+    if fmt == "jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    elif fmt == "csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+    elif fmt == "parquet":
+        parquet_file = _open_parquet(path)
+        for batch in parquet_file.iter_batches(batch_size=1024):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Unsupported input format: {fmt}")
+
+
+def count_records(path: str, fmt: str) -> int:
+    """Count input records cheaply so progress can report an ETA"""
+    if fmt == "parquet":
+        return _open_parquet(path).metadata.num_rows
+
+    count = 0
+    if fmt == "jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            count = sum(1 for line in f if line.strip())
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            count = sum(1 for _ in csv.DictReader(f))
+    return count
+
+
+def iter_shards(
+    records: Iterator[Dict[str, Any]],
+    shard_size: int,
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """Group the record stream into consecutive, deterministically numbered shards"""
+    shard: List[Dict[str, Any]] = []
+    shard_index = 0
+    for record in records:
+        shard.append(record)
+        if len(shard) >= shard_size:
+            yield shard_index, shard
+            shard_index += 1
+            shard = []
+    if shard:
+        yield shard_index, shard
+
+
+# --- Checkpointing ---
+
+def load_checkpoint(output_dir: str, run_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Load the checkpoint for this output directory, or start a fresh one"""
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {"config": run_config, "completed_shards": [], "records_done": 0}
+
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+
+    if checkpoint.get("config") != run_config:
+        print(
+            "Error: output directory holds a checkpoint from a run with different "
+            "settings or a different version of the input file. Use the same "
+            "--input/--shard-size/--text-field on an unchanged input, "
+            "or pass --restart to discard it."
+        )
+        print(f"  Checkpoint: {checkpoint.get('config')}")
+        print(f"  This run:   {run_config}")
+        sys.exit(1)
+
+    return checkpoint
+
+
+def save_checkpoint(output_dir: str, checkpoint: Dict[str, Any]):
+    """Atomically persist the checkpoint"""
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def shard_output_path(output_dir: str, shard_index: int) -> str:
+    return os.path.join(output_dir, f"part-{shard_index:05d}.jsonl")
+
+
+def clear_output(output_dir: str):
+    """Remove the checkpoint and every shard file, finished or partial"""
+    paths = [os.path.join(output_dir, CHECKPOINT_FILE)]
+    paths += glob.glob(os.path.join(output_dir, "part-*.jsonl"))
+    paths += glob.glob(os.path.join(output_dir, "part-*.jsonl.tmp"))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# --- Worker side ---
+
+def init_worker(spacy_model: str, batch_size: int):
+    """Load spaCy and build a SymptomExtractor once per worker process"""
+    global _worker_extractor, _worker_batch_size
+    import spacy
+    from app.services.symptom_extractor import SymptomExtractor
+
+    nlp = spacy.load(spacy_model)
+    _worker_extractor = SymptomExtractor(nlp)
+    _worker_batch_size = batch_size
+
+
+def score_shard(
+    shard_index: int,
+    records: List[Dict[str, Any]],
+    output_dir: str,
+    id_field: str,
+    text_field: str,
+) -> Tuple[int, int]:
+    """
+    Score one shard and write it to its own output file.
+    The file is written under a temporary name and renamed when complete,
+    so a crash never leaves a partial shard that looks finished.
+    """
+    texts = [str(r.get(text_field) or "") for r in records]
+    results = _worker_extractor.extract_batch(texts, batch_size=_worker_batch_size)
+
+    path = shard_output_path(output_dir, shard_index)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record, result in zip(records, results):
+            summary = _worker_extractor.get_symptom_summary(result)
+            f.write(json.dumps({
+                "id": record.get(id_field),
+                "symptoms": result["symptoms"],
+                "metadata": result["metadata"],
+                "summary": summary,
+            }, default=str) + "\n")
+    os.replace(tmp_path, path)
+
+    return shard_index, len(records)
+
+
+# --- Driver ---
+
+def format_eta(seconds: float) -> str:
+    if seconds < 0 or seconds != seconds:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+def run(
+    input_path: str,
+    output_dir: str,
+    fmt: str,
+    id_field: str,
+    text_field: str,
+    workers: int,
+    shard_size: int,
+    batch_size: int,
+    max_pending: Optional[int],
+    spacy_model: str,
+    restart: bool,
+):
+    os.makedirs(output_dir, exist_ok=True)
+
+    stat = os.stat(input_path)
+    run_config = {
+        "input": os.path.abspath(input_path),
+        "input_size": stat.st_size,
+        "input_mtime_ns": stat.st_mtime_ns,
+        "format": fmt,
+        "shard_size": shard_size,
+        "id_field": id_field,
+        "text_field": text_field,
+        "spacy_model": spacy_model,
+    }
+    if restart:
+        # Old shards past the end of a shorter input would otherwise remain
+        clear_output(output_dir)
+    checkpoint = load_checkpoint(output_dir, run_config)
+    completed = set(checkpoint["completed_shards"])
+
+    total_records = count_records(input_path, fmt)
+    total_shards = (total_records + shard_size - 1) // shard_size
+    records_done_before = checkpoint["records_done"]
+
+    print(f"Input: {input_path} ({fmt}, {total_records} records, {total_shards} shards)")
+    print(f"Output: {output_dir}")
+    print(f"Workers: {workers}, shard size: {shard_size}, spaCy batch size: {batch_size}")
+    if completed:
+        print(f"Resuming: {len(completed)}/{total_shards} shards already complete")
+
+    # Bound the number of shards held in memory (queued + in flight), independent
+    # of input size: at most max_pending * shard_size records are resident.
+    max_pending = max_pending or workers * 2
+    remaining_records = total_records - records_done_before
+    records_this_run = 0
+    start_time = time.time()
+
+    def handle_done(done_futures):
+        nonlocal records_this_run
+        for future in done_futures:
+            shard_index, n_records = future.result()
+            completed.add(shard_index)
+            records_this_run += n_records
+            checkpoint["completed_shards"] = sorted(completed)
+            checkpoint["records_done"] = records_done_before + records_this_run
+            save_checkpoint(output_dir, checkpoint)
+
+            elapsed = time.time() - start_time
+            throughput = records_this_run / elapsed if elapsed > 0 else 0.0
+            left = remaining_records - records_this_run
+            eta = left / throughput if throughput > 0 else float("nan")
+            print(
+                f"  Shard {shard_index + 1}/{total_shards} done | "
+                f"{checkpoint['records_done']}/{total_records} records | "
+                f"{throughput:.1f} rec/s | ETA {format_eta(eta)}"
+            )
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(spacy_model, batch_size),
+    ) as pool:
+        pending = set()
+        for shard_index, records in iter_shards(iter_records(input_path, fmt), shard_size):
+            if shard_index in completed:
+                continue
+
+            while len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                handle_done(done)
+
+            pending.add(pool.submit(
+                score_shard, shard_index, records, output_dir, id_field, text_field,
+            ))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            handle_done(done)
+
+    elapsed = time.time() - start_time
+    throughput = records_this_run / elapsed if elapsed > 0 else 0.0
+    print(f"\n{'=' * 60}")
+    print("BULK SCORING COMPLETE")
+    print(f"{'=' * 60}")
+    print(f"  Records scored this run: {records_this_run}")
+    print(f"  Shards complete: {len(completed)}/{total_shards}")
+    print(f"  Throughput: {throughput:.1f} records/s")
+    print(f"  Total time: {elapsed:.1f}s")
+
+
+def main():
+    from app.config.settings import settings
+
+    parser = argparse.ArgumentParser(
+        description="Bulk-score an archive of texts with the symptom extractor"
+    )
+    parser.add_argument("--input", required=True, help="Input file (.jsonl, .csv or .parquet)")
+    parser.add_argument("--output-dir", required=True, help="Directory for sharded output and checkpoint")
+    parser.add_argument(
+        "--format",
+        choices=SUPPORTED_FORMATS,
+        default=None,
+        help="Input format (default: inferred from extension)",
+    )
+    parser.add_argument("--id-field", default="id", help="Record ID field (default: id)")
+    parser.add_argument("--text-field", default="text", help="Record text field (default: text)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=1000,
+        help="Records per shard / output file (default: 1000)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="spaCy nlp.pipe batch size (default: 64)",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="Max shards queued or in flight; caps memory (default: 2 x workers)",
+    )
+    parser.add_argument(
+        "--spacy-model",
+        default=settings.spacy_model,
+        help=f"spaCy model to load (default: {settings.spacy_model})",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Delete any existing checkpoint and shard files and rescore everything",
+    )
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: input not found at '{args.input}'")
+        sys.exit(1)
+
+    run(
+        input_path=args.input,
+        output_dir=args.output_dir,
+        fmt=args.format or detect_format(args.input),
+        id_field=args.id_field,
+        text_field=args.text_field,
+        workers=max(1, args.workers),
+        shard_size=max(1, args.shard_size),
+        batch_size=max(1, args.batch_size),
+        max_pending=args.max_pending,
+        spacy_model=args.spacy_model,
+        restart=args.restart,
+    )
+
+
+if __name__ == "__main__":
+    main()
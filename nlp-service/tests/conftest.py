@@ -0,0 +1,34 @@
+"""
+Shared test setup. Tests need spaCy but no downloaded model: a blank English
+pipeline with a sentencizer and the lookup lemmatizer (spacy-lookups-data)
+is enough for the extractor's matchers.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+spacy = pytest.importorskip("spacy")
+
+
+def blank_pipeline():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    nlp.add_pipe("lemmatizer", config={"mode": "lookup"})
+    nlp.initialize()
+    return nlp
+
+
+@pytest.fixture(scope="session")
+def nlp():
+    return blank_pipeline()
+
+
+@pytest.fixture(scope="session")
+def model_dir(tmp_path_factory, nlp):
+    """The test pipeline on disk, loadable by name like an installed model"""
+    path = tmp_path_factory.mktemp("model")
+    nlp.to_disk(path)
+    return str(path)
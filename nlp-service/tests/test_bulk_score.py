@@ -0,0 +1,90 @@
+"""Offline bulk scorer: sharded output, checkpoint resume and restart"""
+import glob
+import json
+import os
+
+import pytest
+
+from scripts import bulk_score
+
+RECORDS = [
+    {"id": i, "text": text}
+    for i, text in enumerate([
+        "I have felt sad and hopeless every day for 3 weeks.",
+        "I cannot sleep and I am tired all the time.",
+        "I lost interest in everything I used to enjoy.",
+        "Things are fine, no complaints.",
+        "I feel worthless and can't concentrate.",
+    ])
+]
+
+
+def write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def read_output(output_dir):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(output_dir, "part-*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            rows.extend(json.loads(line) for line in f)
+    return rows
+
+
+def score(input_path, output_dir, model_dir, restart=False):
+    bulk_score.run(
+        input_path=input_path,
+        output_dir=output_dir,
+        fmt="jsonl",
+        id_field="id",
+        text_field="text",
+        workers=1,
+        shard_size=2,
+        batch_size=4,
+        max_pending=None,
+        spacy_model=model_dir,
+        restart=restart,
+    )
+
+
+def load_checkpoint(output_dir):
+    with open(os.path.join(output_dir, bulk_score.CHECKPOINT_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_interrupted_run_resumes_and_changed_input_is_refused(tmp_path, model_dir):
+    input_path = str(tmp_path / "archive.jsonl")
+    output_dir = str(tmp_path / "scored")
+    write_jsonl(input_path, RECORDS)
+
+    score(input_path, output_dir, model_dir)
+    full = read_output(output_dir)
+    assert [row["id"] for row in full] == [0, 1, 2, 3, 4]
+    checkpoint = load_checkpoint(output_dir)
+    assert checkpoint["completed_shards"] == [0, 1, 2]
+    assert checkpoint["config"]["input_size"] == os.path.getsize(input_path)
+
+    # Simulate an interruption before shard 0 finished
+    os.remove(bulk_score.shard_output_path(output_dir, 0))
+    checkpoint["completed_shards"] = [1, 2]
+    checkpoint["records_done"] = 3
+    bulk_score.save_checkpoint(output_dir, checkpoint)
+    finished = bulk_score.shard_output_path(output_dir, 1)
+    mtime = os.path.getmtime(finished)
+
+    score(input_path, output_dir, model_dir)
+    assert read_output(output_dir) == full
+    assert os.path.getmtime(finished) == mtime
+    assert load_checkpoint(output_dir)["records_done"] == 5
+
+    # Input edited in place: not resumed against the old shards
+    write_jsonl(input_path, RECORDS[:3])
+    with pytest.raises(SystemExit):
+        score(input_path, output_dir, model_dir)
+
+    # --restart drops every old shard, including those past the new end
+    score(input_path, output_dir, model_dir, restart=True)
+    assert [row["id"] for row in read_output(output_dir)] == [0, 1, 2]
+    assert not os.path.exists(bulk_score.shard_output_path(output_dir, 2))
@@ -0,0 +1,30 @@
+"""SymptomExtractor: batched extraction matches per-text extraction"""
+import pytest
+
+from app.services.symptom_extractor import SymptomExtractor
+
+TEXTS = [
+    "I have felt sad and hopeless every day for 3 weeks and I cannot sleep.",
+    "Lately I am always tired, I lost interest in my hobbies and I can't concentrate at work.",
+    "I don't feel sad. Things are fine.",
+    "",
+    "Sometimes I think about death and feel worthless, for about two months now.",
+]
+
+
+@pytest.fixture(scope="module")
+def extractor(nlp):
+    return SymptomExtractor(nlp)
+
+
+def test_extract_batch_matches_extract(extractor):
+    expected = [extractor.extract(text) for text in TEXTS]
+    assert extractor.extract_batch(TEXTS, batch_size=2) == expected
+    assert any(result["symptoms"] for result in expected)
+
+
+def test_extract_batch_keeps_input_order(extractor):
+    forward = extractor.extract_batch(TEXTS)
+    backward = extractor.extract_batch(list(reversed(TEXTS)))
+    assert backward == list(reversed(forward))
+    assert extractor.extract_batch([]) == []
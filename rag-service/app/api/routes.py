@@ -1,7 +1,20 @@
 """API routes for RAG service"""
-from fastapi import APIRouter, HTTPException
-from app.api.schemas import RAGQueryRequest, RAGQueryResponse, HealthResponse
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.api.schemas import (
+    RAGQueryRequest,
+    RAGQueryResponse,
+    BatchAssessmentRequest,
+    CombinedAssessmentRequest,
+    HealthResponse,
+)
 from app.services.rag_pipeline import RAGPipeline
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.http_client import pool_stats
+from app.services.job_queue import JobQueue, JobWorkerPool, SUCCEEDED, FAILED
 from app.config.settings import settings
 from app.utils.logger import setup_logger
 import time
@@ -11,6 +24,36 @@ router = APIRouter()
 
 # Initialized during app lifespan
 rag_pipeline: RAGPipeline = None
+job_queue: JobQueue = None
+job_workers: JobWorkerPool = None
+
+
+def _deadline(timeout_ms: Optional[str]) -> Optional[Deadline]:
+    """Parse the X-Request-Timeout-Ms header; 504 if the budget is already spent"""
+    try:
+        deadline = Deadline.from_header(timeout_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if deadline is not None and deadline.expired:
+        raise HTTPException(status_code=504, detail="Deadline exceeded before processing")
+    return deadline
+
+
+async def _retrieval_filter(disorder_filter: Optional[str]) -> Optional[dict]:
+    """Chroma where-filter for an optional disorder code prefix"""
+    if not disorder_filter:
+        return None
+    return await rag_pipeline.retrieval_service.adisorder_filter(disorder_filter)
+
+
+async def _pipeline_inputs(request: RAGQueryRequest) -> dict:
+    """Convert a query request into RAGPipeline.assess keyword arguments"""
+    return {
+        "patient_text": request.text,
+        "symptoms": [s.model_dump() for s in request.symptoms] if request.symptoms else None,
+        "metadata": request.metadata.model_dump() if request.metadata else None,
+        "retrieval_filter": await _retrieval_filter(request.disorder_filter),
+    }
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -21,6 +64,8 @@ async def health_check():
 
     if rag_pipeline:
         try:
+            # Also picks up a re-ingestion done by another process
+            await rag_pipeline.retrieval_service.arefresh_if_changed(force=True)
             stats = rag_pipeline.retrieval_service.get_collection_stats()
             chroma_status = stats.get("status", "unknown")
             doc_count = stats.get("document_count", 0)
@@ -32,63 +77,270 @@ async def health_check():
         service="rag-service",
         version="1.0.0",
         openai_model=settings.openai_model,
-        embedding_model=settings.embedding_model,
+        embedding_model=(
+            rag_pipeline.embedding_service.model if rag_pipeline else settings.embedding_model
+        ),
         chromadb_status=chroma_status,
         document_count=doc_count,
+        http_pool=pool_stats.snapshot(),
+        coalesced_requests=rag_pipeline.coalesced_calls if rag_pipeline else 0,
     )
 
 
 @router.post("/rag/query", response_model=RAGQueryResponse)
-async def query_assessment(request: RAGQueryRequest):
+async def query_assessment(
+    request: RAGQueryRequest,
+    x_request_timeout_ms: Optional[str] = Header(default=None),
+):
     """
     Perform RAG-powered clinical assessment.
     Accepts patient text + optional NLP symptoms, returns AI clinical assessment.
+    An X-Request-Timeout-Ms header sets a deadline; past it the work is
+    cancelled and 504 is returned.
     """
     if rag_pipeline is None:
         raise HTTPException(status_code=503, detail="RAG service not fully initialized")
+    deadline = _deadline(x_request_timeout_ms)
 
     try:
         start = time.time()
         logger.info(f"RAG query received: text_length={len(request.text)}")
 
-        # Build retrieval filter if disorder_filter specified
-        retrieval_filter = None
-        if request.disorder_filter:
-            retrieval_filter = {"disorder_code": request.disorder_filter}
+        # Run the RAG pipeline
+        inputs = await _pipeline_inputs(request)
+        result = await rag_pipeline.assess(**inputs, deadline=deadline)
 
-        # Convert symptoms to dicts for the pipeline
-        symptoms_data = None
-        if request.symptoms:
-            symptoms_data = [s.model_dump() for s in request.symptoms]
+        total_time = (time.time() - start) * 1000
+        logger.info(f"RAG query completed in {total_time:.0f}ms")
 
-        metadata_data = None
-        if request.metadata:
-            metadata_data = request.metadata.model_dump()
+        return RAGQueryResponse(
+            success=True,
+            data={
+                "assessment": result["assessment"],
+                "sources": result["sources"],
+                "usage": result["usage"],
+                "metrics": result["pipeline_metrics"],
+                "cached": result.get("cached", False),
+            },
+        )
 
-        # Run the RAG pipeline
-        result = await rag_pipeline.assess(
+    except DeadlineExceeded as e:
+        logger.warning(f"RAG query abandoned: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"RAG query failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"RAG assessment failed: {str(e)}",
+        )
+
+
+@router.post("/rag/query/batch", response_model=RAGQueryResponse)
+async def query_assessment_batch(
+    request: BatchAssessmentRequest,
+    x_request_timeout_ms: Optional[str] = Header(default=None),
+):
+    """
+    Batch RAG assessment. Queries are embedded and searched together and
+    LLM calls run under a concurrency cap. Each result carries its own
+    success flag and error; usage is aggregated across the batch.
+    An X-Request-Timeout-Ms deadline covers the whole batch: past it the
+    shared embedding and retrieval return 504, and unfinished items fail.
+    """
+    if rag_pipeline is None:
+        raise HTTPException(status_code=503, detail="RAG service not fully initialized")
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.items)} items (max {settings.batch_max_items})",
+        )
+    deadline = _deadline(x_request_timeout_ms)
+
+    try:
+        logger.info(f"RAG batch received: {len(request.items)} items")
+        items = [await _pipeline_inputs(item) for item in request.items]
+        result = await rag_pipeline.assess_batch(items, deadline=deadline)
+        metrics = result["metrics"]
+        logger.info(
+            f"RAG batch completed: {metrics['succeeded']}/{metrics['items']} succeeded "
+            f"in {metrics['total_ms']:.0f}ms"
+        )
+        return RAGQueryResponse(success=True, data=result)
+
+    except DeadlineExceeded as e:
+        logger.warning(f"RAG batch abandoned: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"RAG batch failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"RAG batch assessment failed: {str(e)}",
+        )
+
+
+def _job_status(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+    }
+
+
+async def _get_job(job_id: str) -> dict:
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not enabled")
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found or expired: {job_id}")
+    return job
+
+
+@router.post("/rag/jobs", status_code=202, response_model=RAGQueryResponse)
+async def submit_job(
+    request: RAGQueryRequest,
+    idempotency_key: Optional[str] = Header(default=None),
+):
+    """
+    Submit an assessment to run in the background.
+    Returns a job ID immediately; poll /rag/jobs/{job_id} and fetch the result
+    from /rag/jobs/{job_id}/result. Resubmitting with the same Idempotency-Key
+    header (or, without one, the identical request) returns the existing job.
+    """
+    if rag_pipeline is None:
+        raise HTTPException(status_code=503, detail="RAG service not fully initialized")
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not enabled")
+
+    try:
+        inputs = await _pipeline_inputs(request)
+        job, created = await asyncio.to_thread(job_queue.submit, inputs, idempotency_key)
+    except Exception as e:
+        logger.error(f"Job submission failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Job submission failed: {str(e)}")
+
+    if created:
+        job_workers.notify()
+        logger.info(f"Job {job['id']} queued: text_length={len(request.text)}")
+    return RAGQueryResponse(
+        success=True,
+        data={**_job_status(job), "deduplicated": not created},
+    )
+
+
+@router.get("/rag/jobs/{job_id}", response_model=RAGQueryResponse)
+async def get_job(job_id: str):
+    """Job status: queued, running, succeeded or failed"""
+    return RAGQueryResponse(success=True, data=_job_status(await _get_job(job_id)))
+
+
+@router.get("/rag/jobs/{job_id}/result", response_model=RAGQueryResponse)
+async def get_job_result(job_id: str):
+    """
+    Job result in the /rag/query response shape.
+    202 while the job is queued or running; failed jobs return success=false.
+    """
+    job = await _get_job(job_id)
+    if job["status"] == SUCCEEDED:
+        return RAGQueryResponse(success=True, data=job["result"])
+    if job["status"] == FAILED:
+        return RAGQueryResponse(success=False, error=job["error"])
+    return JSONResponse(
+        status_code=202,
+        content=RAGQueryResponse(success=False, data=_job_status(job)).model_dump(),
+    )
+
+
+def _sse(event: str, data) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/rag/query/stream")
+async def query_assessment_stream(
+    request: RAGQueryRequest,
+    x_request_timeout_ms: Optional[str] = Header(default=None),
+):
+    """
+    Streaming RAG assessment over server-sent events.
+    Emits `sources` right after retrieval, one `field` event per completed
+    top-level assessment field, then `done` with usage and pipeline metrics.
+    Failures after the stream has started, including a passed
+    X-Request-Timeout-Ms deadline, are reported as an `error` event.
+    """
+    if rag_pipeline is None:
+        raise HTTPException(status_code=503, detail="RAG service not fully initialized")
+    deadline = _deadline(x_request_timeout_ms)
+
+    logger.info(f"RAG stream received: text_length={len(request.text)}")
+
+    inputs = await _pipeline_inputs(request)
+
+    async def event_stream():
+        try:
+            async for event in rag_pipeline.assess_stream(**inputs, deadline=deadline):
+                yield _sse(event["event"], event["data"])
+        except Exception as e:
+            logger.error(f"RAG stream failed: {str(e)}", exc_info=True)
+            yield _sse("error", {"detail": f"RAG assessment failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/rag/assess", response_model=RAGQueryResponse)
+async def combined_assessment(
+    request: CombinedAssessmentRequest,
+    x_request_timeout_ms: Optional[str] = Header(default=None),
+):
+    """
+    Combined assessment: in-process NLP symptom extraction followed by the RAG
+    pipeline. Replaces the backend's separate NLP and RAG calls with one request.
+    Requires ENABLE_INPROCESS_NLP=true.
+    """
+    if rag_pipeline is None:
+        raise HTTPException(status_code=503, detail="RAG service not fully initialized")
+    if rag_pipeline.nlp_service is None or not rag_pipeline.nlp_service.is_ready():
+        raise HTTPException(status_code=503, detail="In-process NLP is not enabled")
+    deadline = _deadline(x_request_timeout_ms)
+
+    try:
+        start = time.time()
+        logger.info(f"Combined assessment received: text_length={len(request.text)}")
+
+        result = await rag_pipeline.assess_text(
             patient_text=request.text,
-            symptoms=symptoms_data,
-            metadata=metadata_data,
-            retrieval_filter=retrieval_filter,
+            retrieval_filter=await _retrieval_filter(request.disorder_filter),
+            deadline=deadline,
         )
 
         total_time = (time.time() - start) * 1000
-        logger.info(f"RAG query completed in {total_time:.0f}ms")
+        logger.info(f"Combined assessment completed in {total_time:.0f}ms")
 
         return RAGQueryResponse(
             success=True,
             data={
+                "nlp": result["nlp"],
                 "assessment": result["assessment"],
                 "sources": result["sources"],
                 "usage": result["usage"],
                 "metrics": result["pipeline_metrics"],
+                "cached": result.get("cached", False),
             },
         )
 
+    except DeadlineExceeded as e:
+        logger.warning(f"Combined assessment abandoned: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        logger.error(f"RAG query failed: {str(e)}", exc_info=True)
+        logger.error(f"Combined assessment failed: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
-            detail=f"RAG assessment failed: {str(e)}",
+            detail=f"Combined assessment failed: {str(e)}",
         )
@@ -32,7 +32,21 @@ class RAGQueryRequest(BaseModel):
     metadata: Optional[AssessmentMetadata] = None
     disorder_filter: Optional[str] = Field(
         None,
-        description="Optional disorder code to filter retrieval (e.g., 'F32' for MDD)"
+        description="Optional ICD code prefix to filter retrieval (e.g., 'F32' matches F32, F32.1, ...)"
+    )
+
+
+class BatchAssessmentRequest(BaseModel):
+    """Many RAG assessments in one request; results are returned in the same order"""
+    items: List[RAGQueryRequest] = Field(..., min_length=1, description="Assessments to run")
+
+
+class CombinedAssessmentRequest(BaseModel):
+    """Request for a combined in-process NLP extraction + RAG assessment"""
+    text: str = Field(..., min_length=10, max_length=5000, description="Patient presentation text")
+    disorder_filter: Optional[str] = Field(
+        None,
+        description="Optional ICD code prefix to filter retrieval (e.g., 'F32' matches F32, F32.1, ...)"
     )
 
 
@@ -85,11 +99,36 @@ class SourceReference(BaseModel):
 
 class PipelineMetrics(BaseModel):
     """Performance metrics for the RAG pipeline"""
+    nlp_ms: float = 0.0
     embedding_ms: float = 0.0
+    embedding_cache_hits: int = 0
+    embedding_cache_misses: int = 0
+    embedding_cache_hit_rate: float = 0.0
+    embedding_ms_saved: float = 0.0
+    embedding_rate_limit_wait_ms: float = 0.0
+    embedding_hedged: bool = False
+    embedding_batch_callers: int = 0
     retrieval_ms: float = 0.0
     llm_ms: float = 0.0
+    llm_rate_limit_wait_ms: float = 0.0
+    http_pool_saturation: float = 0.0
     total_ms: float = 0.0
     chunks_retrieved: int = 0
+    chunks_candidates: int = 0
+    chunks_pinned: int = 0
+    retrieval_queries: int = 1
+    context_tokens_saved: int = 0
+    chunks_merged: int = 0
+    context_tokens_merged: int = 0
+    context_tokens_compressed: int = 0
+    context_compression_ratio: float = 1.0
+    prompt_tokens_estimate: int = 0
+    cached_prompt_tokens: int = 0
+    cached_prompt_ratio: float = 0.0
+    time_to_sources_ms: float = 0.0
+    time_to_first_field_ms: float = 0.0
+    assessment_cache: str = ""
+    coalesced: bool = False
 
 
 class TokenUsage(BaseModel):
@@ -97,6 +136,8 @@ class TokenUsage(BaseModel):
     prompt_tokens: int = 0
     completion_tokens: int = 0
     total_tokens: int = 0
+    # Prompt tokens served from the provider's prompt-prefix cache
+    cached_prompt_tokens: int = 0
     model: str = ""
 
 
@@ -116,3 +157,5 @@ class HealthResponse(BaseModel):
     embedding_model: str
     chromadb_status: str
     document_count: int
+    http_pool: Optional[Dict[str, Any]] = None
+    coalesced_requests: int = 0
@@ -13,12 +13,71 @@ class Settings(BaseSettings):
 
     # OpenAI
     openai_api_key: str = ""
+    # Override the API endpoint, e.g. the local stand-in (scripts/mock_openai.py)
+    openai_base_url: str = ""
     openai_model: str = "gpt-4o"
     embedding_model: str = "text-embedding-3-small"
     embedding_dimensions: int = 1536
     max_completion_tokens: int = 4096
+    # Input-token budget for system + user prompt (gpt-4o has a 128k context)
+    max_input_tokens: int = 120000
     temperature: float = 0.2
 
+    # Shared HTTP connection pool for OpenAI traffic (keep-alive, HTTP/2
+    # when the h2 package is installed) and per-operation timeouts
+    http2_enabled: bool = True
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 30.0
+    http_connect_timeout_seconds: float = 5.0
+    http_pool_timeout_seconds: float = 10.0
+    chat_read_timeout_seconds: float = 120.0
+    embedding_read_timeout_seconds: float = 15.0
+    # Connections opened at startup so the first requests skip TLS setup
+    http_warm_connections: int = 2
+
+    # Client-side rate limiting of OpenAI calls: RPM/TPM token buckets per
+    # model. 0 = use the limits reported in x-ratelimit-* response headers
+    rate_limit_enabled: bool = True
+    chat_rpm_limit: int = 0
+    chat_tpm_limit: int = 0
+    embedding_rpm_limit: int = 0
+    embedding_tpm_limit: int = 0
+
+    # Embedding provider: "openai", "local" (sentence-transformers on CPU,
+    # falls back to "hashing" if not installed) or "hashing" (deterministic)
+    embedding_provider: str = "openai"
+    local_embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # "torch" or "onnx"
+    local_embedding_runtime: str = "torch"
+    local_embedding_batch_size: int = 32
+    local_embedding_workers: int = 2
+
+    # Hedged embedding requests: send a second identical request when the
+    # first is still running after the recent p95 latency
+    embedding_hedge_enabled: bool = False
+    embedding_hedge_percentile: float = 95.0
+    embedding_hedge_min_samples: int = 20
+    # Micro-batching: embedding requests arriving within the window (or
+    # until max size distinct texts) share one provider call. A request
+    # with no call in flight is sent at once, without waiting
+    embedding_microbatch_enabled: bool = True
+    embedding_batch_window_ms: float = 5.0
+    embedding_batch_max_size: int = 64
+
+    # Request deadlines (X-Request-Timeout-Ms header). Each stage may use the
+    # remaining time less these minimums for the stages after it
+    default_request_timeout_seconds: float = 0.0
+    deadline_margin_ms: int = 250
+    deadline_embed_min_ms: int = 100
+    deadline_retrieval_min_ms: int = 100
+    deadline_llm_min_ms: int = 2000
+
+    # Embedding cache (in-memory LRU + SQLite)
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "/data/embedding_cache.db"
+    embedding_cache_memory_entries: int = 2048
+
     # ChromaDB
     chroma_persist_dir: str = "/data/chroma_db"
     chroma_collection_name: str = "dsm5"
@@ -26,6 +85,81 @@ class Settings(BaseSettings):
     # Retrieval
     retrieval_top_k: int = 8
     retrieval_min_score: float = 0.3
+    retrieval_workers: int = 4
+    # How often (seconds) to check whether another process, such as a
+    # re-ingestion, replaced the persisted index; 0 = only on /health
+    index_refresh_interval_seconds: float = 30.0
+    # "chroma" (HNSW via ChromaDB), "numpy" (exact in-memory search) or
+    # "partitioned" (in-memory, one partition per disorder code)
+    retrieval_backend: str = "chroma"
+    # Restrict retrieval to disorder partitions implied by NLP-detected symptoms
+    retrieval_auto_partition: bool = False
+    # Post-retrieval selection: fetch a larger candidate pool, drop chunks
+    # below retrieval_min_score, keep context_top_k diverse chunks via MMR.
+    # Off by default: it changes which and how many chunks reach the prompt
+    context_selection_enabled: bool = False
+    retrieval_candidate_k: int = 20
+    context_top_k: int = 5
+    mmr_lambda: float = 0.7
+    # Merge retrieved chunks of one section whose ingested character spans
+    # overlap or touch, so chunk_overlap text is not sent twice
+    chunk_merge_enabled: bool = True
+    # Query-focused extractive compression: keep each reference's sentences
+    # closest to the query (embedded at ingestion) within a per-chunk budget
+    context_compression_enabled: bool = False
+    context_compression_chunk_tokens: int = 120
+    # Hybrid BM25 + vector retrieval fused with reciprocal-rank fusion
+    hybrid_retrieval: bool = False
+    hybrid_candidate_pool: int = 20
+    rrf_k: int = 60
+    bm25_k1: float = 1.5
+    bm25_b: float = 0.75
+    # Multi-query retrieval: key patient sentences plus one sub-query per
+    # detected symptom, embedded in one batch and searched concurrently
+    multi_query_enabled: bool = False
+    multi_query_max_sentences: int = 4
+    # Pin precomputed diagnostic-criteria chunks for detected MDD criteria
+    criterion_pinning_enabled: bool = False
+    criterion_pin_max: int = 3
+    criterion_chunks_per_disorder: int = 1
+    # Cache-friendly prompt layout: system prompt, then the canonically
+    # ordered MDD criteria chunks and the task, then per-request content,
+    # so the provider's prompt-prefix cache can reuse the shared start
+    prompt_cache_layout: bool = False
+    prompt_core_max_tokens: int = 4000
+
+    # Single-flight: identical concurrent assessments share one pipeline run
+    request_coalescing_enabled: bool = True
+
+    # Batch assessment (/rag/query/batch)
+    batch_max_items: int = 500
+    batch_embed_size: int = 256
+    batch_llm_concurrency: int = 8
+
+    # Async assessment jobs (/rag/jobs), persisted in SQLite
+    job_queue_enabled: bool = True
+    job_queue_path: str = "/data/jobs.db"
+    job_workers: int = 4
+    job_result_ttl_seconds: int = 86400
+    # Jobs interrupted this many times (e.g. they crash the process) are failed
+    job_max_attempts: int = 3
+    job_poll_interval_seconds: float = 1.0
+
+    # Assessment cache
+    assessment_cache_enabled: bool = True
+    assessment_cache_ttl_seconds: int = 3600
+    assessment_cache_max_entries: int = 1024
+    semantic_cache_enabled: bool = False
+    semantic_cache_ttl_seconds: int = 900
+    semantic_cache_max_distance: float = 0.05
+
+    # In-process NLP (combined /rag/assess endpoint)
+    enable_inprocess_nlp: bool = False
+    nlp_service_path: str = "../nlp-service"
+    # Criterion names shared with the backend (mdd-criteria.js)
+    nlp_criteria_path: str = "../backend/src/models/mdd-symptoms.json"
+    nlp_spacy_model: str = "en_core_web_md"
+    nlp_inprocess_workers: int = 2
 
     # Ingestion
     chunk_size: int = 800
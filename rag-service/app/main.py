@@ -4,7 +4,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.api import routes
+from app.services import http_client
 from app.services.rag_pipeline import RAGPipeline
+from app.services.job_queue import JobQueue, JobWorkerPool
 from app.config.settings import settings
 from app.utils.logger import setup_logger
 
@@ -26,6 +28,7 @@ async def lifespan(app: FastAPI):
     # Initialize RAG pipeline
     try:
         routes.rag_pipeline = RAGPipeline()
+        routes.rag_pipeline.retrieval_service.load_index()
         stats = routes.rag_pipeline.retrieval_service.get_collection_stats()
         logger.info(f"ChromaDB collection stats: {stats}")
 
@@ -44,13 +47,73 @@ async def lifespan(app: FastAPI):
         # Still start — health endpoint will report the problem
         routes.rag_pipeline = RAGPipeline()
 
+    # Open OpenAI connections before the first request
+    if settings.openai_api_key:
+        await http_client.warm_up()
+
+    # Precomputed criterion table for pinning criteria chunks and the
+    # cache-friendly prompt prefix
+    if (
+        settings.criterion_pinning_enabled or settings.prompt_cache_layout
+    ) and routes.rag_pipeline.is_ready():
+        try:
+            table = await routes.rag_pipeline.refresh_criterion_table()
+            logger.info(f"Criterion table ready: {table.size} pinned chunks")
+        except Exception as e:
+            logger.error(f"Failed to load criterion table, pinning deferred: {e}")
+
+    # Optional in-process NLP for the combined /rag/assess endpoint
+    if settings.enable_inprocess_nlp:
+        try:
+            from app.services.nlp_bridge import InProcessNLPService
+
+            nlp_service = InProcessNLPService()
+            nlp_service.load()
+            routes.rag_pipeline.nlp_service = nlp_service
+        except Exception as e:
+            logger.error(f"Failed to load in-process NLP, /rag/assess disabled: {e}")
+
+    # Background assessment jobs (/rag/jobs)
+    if settings.job_queue_enabled:
+        try:
+            routes.job_queue = JobQueue(
+                settings.job_queue_path,
+                result_ttl_seconds=settings.job_result_ttl_seconds,
+                max_attempts=settings.job_max_attempts,
+            )
+            routes.job_workers = JobWorkerPool(
+                routes.job_queue,
+                routes.rag_pipeline,
+                workers=settings.job_workers,
+                poll_interval=settings.job_poll_interval_seconds,
+            )
+            routes.job_workers.start()
+        except Exception as e:
+            logger.error(f"Failed to start job queue, /rag/jobs disabled: {e}")
+            routes.job_queue = None
+            routes.job_workers = None
+
     logger.info(f"RAG service started on {settings.host}:{settings.port}")
     logger.info(f"OpenAI model: {settings.openai_model}")
-    logger.info(f"Embedding model: {settings.embedding_model}")
+    if routes.rag_pipeline:
+        embedding_service = routes.rag_pipeline.embedding_service
+        logger.info(
+            f"Embedding model: {embedding_service.model} "
+            f"({embedding_service.provider.name}, {embedding_service.dimensions} dims)"
+        )
 
     yield
 
     logger.info("Shutting down RAG service...")
+    if routes.job_workers:
+        await routes.job_workers.stop()
+        routes.job_queue.close()
+    if routes.rag_pipeline:
+        routes.rag_pipeline.retrieval_service.shutdown()
+        routes.rag_pipeline.embedding_service.close()
+    if routes.rag_pipeline and routes.rag_pipeline.nlp_service:
+        routes.rag_pipeline.nlp_service.shutdown()
+    await http_client.aclose()
 
 
 app = FastAPI(
@@ -84,6 +147,10 @@ async def root():
         "endpoints": {
             "health": "/health",
             "query": "/rag/query",
+            "query_stream": "/rag/query/stream",
+            "query_batch": "/rag/query/batch",
+            "assess": "/rag/assess",
+            "jobs": "/rag/jobs",
         },
     }
 
@@ -1,26 +1,47 @@
 """Query template builders for RAG-augmented prompts"""
+import re
 from typing import List, Dict, Any, Optional
 
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
 
-def build_assessment_prompt(
-    patient_text: str,
-    retrieved_context: List[Dict[str, Any]],
-    detected_symptoms: Optional[List[Dict[str, Any]]] = None,
-    metadata: Optional[Dict[str, Any]] = None,
-) -> str:
+
+def build_core_criteria_block(core_chunks: List[Dict[str, Any]]) -> str:
     """
-    Build the user prompt for clinical assessment, combining:
-    - Retrieved DSM-5-TR context from vector search
-    - Patient presentation text
-    - NLP-detected symptoms (if available)
+    Stable block of core diagnostic criteria for the start of the user prompt.
+    Depends only on the chunks (given in canonical order), never on the
+    request, so system prompt + this block form a prefix shared by every
+    call and eligible for provider-side prompt caching.
     """
+    sections = [
+        "=" * 60,
+        "CORE DSM-5-TR DIAGNOSTIC CRITERIA",
+        "=" * 60,
+    ]
+    for ctx in core_chunks:
+        meta = ctx.get("metadata", {})
+        sections.append("\n--- Core Reference ---")
+        if meta.get("section_title"):
+            sections.append(f"Section: {meta['section_title']}")
+        if meta.get("disorder_name"):
+            sections.append(f"Disorder: {meta['disorder_name']}")
+        if meta.get("disorder_code"):
+            sections.append(f"Code: {meta['disorder_code']}")
+        if meta.get("page_range"):
+            sections.append(f"Pages: {meta['page_range']}")
+        sections.append(f"\n{ctx.get('document', '')}")
+    return "\n".join(sections)
 
-    sections = []
 
-    # Section 1: Retrieved DSM-5-TR Context
-    sections.append("=" * 60)
-    sections.append("RETRIEVED DSM-5-TR REFERENCE MATERIAL")
-    sections.append("=" * 60)
+def _references_section(
+    retrieved_context: List[Dict[str, Any]],
+    title: str,
+    empty_note: str,
+) -> List[str]:
+    sections = [
+        "=" * 60,
+        title,
+        "=" * 60,
+    ]
 
     if retrieved_context:
         for i, ctx in enumerate(retrieved_context, 1):
@@ -44,78 +65,143 @@ def build_assessment_prompt(
                 sections.append(f"Relevance Score: {relevance:.2f}")
             sections.append(f"\n{doc_text}")
     else:
-        sections.append("No relevant DSM-5-TR references were retrieved.")
-        sections.append("Provide assessment based on general DSM-5-TR knowledge.")
+        sections.append(empty_note)
+    return sections
 
-    # Section 2: NLP-Detected Symptoms
-    if detected_symptoms:
-        sections.append("\n" + "=" * 60)
-        sections.append("PRE-SCREENING: NLP-DETECTED SYMPTOMS")
-        sections.append("=" * 60)
-        sections.append(
-            "The following symptoms were detected by automated NLP pattern matching. "
-            "Use these as a starting point but apply your own clinical judgment."
-        )
 
-        for symptom in detected_symptoms:
-            if symptom.get("detected"):
-                status = "DETECTED"
-                confidence = symptom.get("confidence", 0)
-                evidence = symptom.get("evidence", [])
-                context = symptom.get("sentenceContext", "")
-
-                sections.append(
-                    f"\n• [{status}] {symptom.get('dsm5Code', '?')}: "
-                    f"{symptom.get('name', 'Unknown')}"
-                )
-                sections.append(f"  Confidence: {confidence:.0%}")
-                if evidence:
-                    sections.append(f"  Evidence: {', '.join(evidence)}")
-                if context:
-                    sections.append(f"  Context: \"{context}\"")
-
-        not_detected = [s for s in detected_symptoms if not s.get("detected")]
-        if not_detected:
-            sections.append("\nNot detected by NLP:")
-            for symptom in not_detected:
-                sections.append(
-                    f"  ○ {symptom.get('dsm5Code', '?')}: "
-                    f"{symptom.get('name', 'Unknown')}"
-                )
-
-    # Section 3: Metadata
-    if metadata:
-        sections.append("\n" + "=" * 60)
-        sections.append("ADDITIONAL CONTEXT")
-        sections.append("=" * 60)
-        if metadata.get("durationDays"):
-            sections.append(f"Reported duration: {metadata['durationDays']} days")
-        if metadata.get("durationSpecified") is False:
-            sections.append("Duration was NOT specified in the text")
-        if metadata.get("functionalImpairment"):
+def _symptoms_section(detected_symptoms: Optional[List[Dict[str, Any]]]) -> List[str]:
+    if not detected_symptoms:
+        return []
+    sections = [
+        "\n" + "=" * 60,
+        "PRE-SCREENING: NLP-DETECTED SYMPTOMS",
+        "=" * 60,
+        "The following symptoms were detected by automated NLP pattern matching. "
+        "Use these as a starting point but apply your own clinical judgment.",
+    ]
+
+    for symptom in detected_symptoms:
+        if symptom.get("detected"):
+            status = "DETECTED"
+            confidence = symptom.get("confidence", 0)
+            evidence = symptom.get("evidence", [])
+            context = symptom.get("sentenceContext", "")
+
+            sections.append(
+                f"\n• [{status}] {symptom.get('dsm5Code', '?')}: "
+                f"{symptom.get('name', 'Unknown')}"
+            )
+            sections.append(f"  Confidence: {confidence:.0%}")
+            if evidence:
+                sections.append(f"  Evidence: {', '.join(evidence)}")
+            if context:
+                sections.append(f"  Context: \"{context}\"")
+
+    not_detected = [s for s in detected_symptoms if not s.get("detected")]
+    if not_detected:
+        sections.append("\nNot detected by NLP:")
+        for symptom in not_detected:
             sections.append(
-                f"Functional impairment detected: {metadata['functionalImpairment']}"
+                f"  ○ {symptom.get('dsm5Code', '?')}: "
+                f"{symptom.get('name', 'Unknown')}"
             )
+    return sections
+
+
+def _metadata_section(metadata: Optional[Dict[str, Any]]) -> List[str]:
+    if not metadata:
+        return []
+    sections = [
+        "\n" + "=" * 60,
+        "ADDITIONAL CONTEXT",
+        "=" * 60,
+    ]
+    if metadata.get("durationDays"):
+        sections.append(f"Reported duration: {metadata['durationDays']} days")
+    if metadata.get("durationSpecified") is False:
+        sections.append("Duration was NOT specified in the text")
+    if metadata.get("functionalImpairment"):
+        sections.append(
+            f"Functional impairment detected: {metadata['functionalImpairment']}"
+        )
+    return sections
+
+
+def _patient_section(patient_text: str) -> List[str]:
+    return [
+        "\n" + "=" * 60,
+        "PATIENT PRESENTATION (ORIGINAL TEXT)",
+        "=" * 60,
+        patient_text,
+    ]
+
+
+_ASSESSMENT_TASK = (
+    "Based on {material}, "
+    "provide a comprehensive clinical decision-support assessment. "
+    "Cite specific DSM-5-TR criteria from the retrieved references. "
+    "Consider differential diagnoses beyond MDD. "
+    "Identify any gaps in the clinical picture that would need further evaluation. "
+    "Respond in the JSON format specified in your system instructions."
+)
+
 
-    # Section 4: Patient Presentation
-    sections.append("\n" + "=" * 60)
-    sections.append("PATIENT PRESENTATION (ORIGINAL TEXT)")
-    sections.append("=" * 60)
-    sections.append(patient_text)
-
-    # Section 5: Assessment Task
-    sections.append("\n" + "=" * 60)
-    sections.append("ASSESSMENT TASK")
-    sections.append("=" * 60)
-    sections.append(
-        "Based on the DSM-5-TR reference material above and the patient presentation, "
-        "provide a comprehensive clinical decision-support assessment. "
-        "Cite specific DSM-5-TR criteria from the retrieved references. "
-        "Consider differential diagnoses beyond MDD. "
-        "Identify any gaps in the clinical picture that would need further evaluation. "
-        "Respond in the JSON format specified in your system instructions."
+def _task_section(material: str) -> List[str]:
+    return [
+        "\n" + "=" * 60,
+        "ASSESSMENT TASK",
+        "=" * 60,
+        _ASSESSMENT_TASK.format(material=material),
+    ]
+
+
+def build_assessment_prompt(
+    patient_text: str,
+    retrieved_context: List[Dict[str, Any]],
+    detected_symptoms: Optional[List[Dict[str, Any]]] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    core_block: Optional[str] = None,
+) -> str:
+    """
+    Build the user prompt for clinical assessment, combining:
+    - Retrieved DSM-5-TR context from vector search
+    - Patient presentation text
+    - NLP-detected symptoms (if available)
+
+    With ``core_block`` (see ``build_core_criteria_block``) the prompt is laid
+    out for prefix caching: the core criteria and the assessment task come
+    first, and everything that varies per request follows.
+    """
+    if core_block is None:
+        sections = _references_section(
+            retrieved_context,
+            "RETRIEVED DSM-5-TR REFERENCE MATERIAL",
+            "No relevant DSM-5-TR references were retrieved.\n"
+            "Provide assessment based on general DSM-5-TR knowledge.",
+        )
+        sections += _symptoms_section(detected_symptoms)
+        sections += _metadata_section(metadata)
+        sections += _patient_section(patient_text)
+        sections += _task_section("the DSM-5-TR reference material above and the patient presentation")
+        return "\n".join(sections)
+
+    # Static prefix: identical for every request
+    sections = [core_block]
+    sections += _task_section(
+        "the core criteria above, the case-specific DSM-5-TR references below "
+        "and the patient presentation at the end"
     )
 
+    # Per-request content
+    sections.append("")
+    sections += _references_section(
+        retrieved_context,
+        "RETRIEVED DSM-5-TR REFERENCE MATERIAL (CASE-SPECIFIC)",
+        "No further references were retrieved beyond the core criteria above.",
+    )
+    sections += _symptoms_section(detected_symptoms)
+    sections += _metadata_section(metadata)
+    sections += _patient_section(patient_text)
     return "\n".join(sections)
 
 
@@ -141,3 +227,41 @@ def build_retrieval_query(
             )
 
     return " ".join(parts)
+
+
+def build_retrieval_subqueries(
+    patient_text: str,
+    detected_symptoms: Optional[List[Dict[str, Any]]] = None,
+    max_sentences: int = 4,
+) -> List[str]:
+    """
+    Split a presentation into focused retrieval queries: up to
+    ``max_sentences`` key patient sentences plus one query per detected symptom.
+
+    Sentences quoted as symptom context or containing symptom evidence are
+    preferred, then the longest remaining ones; original order is kept.
+    """
+    sentences = [s.strip() for s in _SENTENCE_SPLIT.split(patient_text) if len(s.strip()) > 15]
+    detected = [s for s in (detected_symptoms or []) if s.get("detected") and s.get("name")]
+
+    cues = set()
+    for symptom in detected:
+        if symptom.get("sentenceContext"):
+            cues.add(symptom["sentenceContext"].strip().lower())
+        cues.update(e.lower() for e in symptom.get("evidence") or [] if e)
+
+    def priority(idx: int):
+        lowered = sentences[idx].lower()
+        matched = any(cue in lowered or lowered in cue for cue in cues)
+        return (not matched, -len(sentences[idx]))
+
+    keep = sorted(sorted(range(len(sentences)), key=priority)[:max_sentences])
+    queries = [sentences[i] for i in keep]
+
+    for symptom in detected:
+        detail = symptom.get("sentenceContext") or ", ".join(symptom.get("evidence") or [])
+        query = f"DSM-5 diagnostic criteria for {symptom['name']}"
+        queries.append(f"{query}: {detail}" if detail else query)
+
+    # Drop duplicates while keeping order
+    return list(dict.fromkeys(queries))
@@ -1,4 +1,5 @@
 """System prompt for clinical assessment LLM calls"""
+import hashlib
 
 CLINICAL_SYSTEM_PROMPT = """You are a Clinical Decision Support System grounded in DSM-5-TR criteria. 
 You are NOT a diagnostician. You are a tool that assists licensed mental health professionals by:
@@ -52,3 +53,8 @@ You must respond in valid JSON with the following structure:
   ],
   "confidence_notes": "Honest assessment of the confidence level of this analysis, noting what information is missing or ambiguous, and what additional clinical data would strengthen the assessment"
 }"""
+
+# Changes whenever the prompt text changes; used to key cached assessments
+CLINICAL_SYSTEM_PROMPT_VERSION = hashlib.sha256(
+    CLINICAL_SYSTEM_PROMPT.encode("utf-8")
+).hexdigest()[:12]
@@ -0,0 +1,194 @@
+"""Two-tier cache for LLM clinical assessments: exact prompt and semantic near-duplicate"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class AssessmentCache:
+    """
+    Caches completed assessments so repeated presentations skip the LLM call.
+
+    - Exact tier: keyed by (system-prompt version, model, sha256(user prompt)).
+      Hits only when the fully built prompt is byte-identical.
+    - Semantic tier (optional): returns a prior assessment when the query
+      embedding is within ``max_distance`` cosine distance of a cached one
+      *and* the detected symptom set and retrieval scope are identical.
+
+    Both tiers expire entries after their TTL and are tagged with the index
+    version they were produced under; ``invalidate`` drops everything when the
+    underlying DSM-5 index changes.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        semantic_enabled: bool = False,
+        semantic_ttl_seconds: float = 0.0,
+        semantic_max_distance: float = 0.05,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.semantic_enabled = semantic_enabled
+        self.semantic_ttl_seconds = semantic_ttl_seconds
+        self.semantic_max_distance = semantic_max_distance
+
+        self._lock = threading.Lock()
+        self._index_version: Optional[str] = None
+        # key -> (expires_at, result)
+        self._exact: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Parallel structures for the semantic tier
+        self._sem_vectors: List[np.ndarray] = []
+        self._sem_entries: List[Tuple[float, Tuple[FrozenSet[str], str], Dict[str, Any]]] = []
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    # --- Keys ---
+
+    @staticmethod
+    def exact_key(prompt_version: str, model: str, user_prompt: str) -> str:
+        prompt_hash = hashlib.sha256(user_prompt.encode("utf-8")).hexdigest()
+        return f"{prompt_version}:{model}:{prompt_hash}"
+
+    @staticmethod
+    def symptom_set(symptoms: Optional[List[Dict[str, Any]]]) -> FrozenSet[str]:
+        """Canonical set of detected symptom codes"""
+        if not symptoms:
+            return frozenset()
+        return frozenset(
+            s.get("dsm5Code") or s.get("symptomId", "")
+            for s in symptoms
+            if s.get("detected")
+        )
+
+    # --- Invalidation ---
+
+    def set_index_version(self, index_version: str):
+        """Record the current index version, dropping entries built against another"""
+        with self._lock:
+            if self._index_version is not None and index_version != self._index_version:
+                logger.info(
+                    f"Index version changed ({self._index_version} -> {index_version}), "
+                    f"clearing assessment cache"
+                )
+                self._clear_locked()
+            self._index_version = index_version
+
+    def invalidate(self, index_version: Optional[str] = None):
+        """Invalidation hook: drop all cached assessments"""
+        with self._lock:
+            self._clear_locked()
+            if index_version is not None:
+                self._index_version = index_version
+
+    def _clear_locked(self):
+        self._exact.clear()
+        self._sem_vectors.clear()
+        self._sem_entries.clear()
+
+    # --- Exact tier ---
+
+    def get_exact(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at < now:
+                del self._exact[key]
+                return None
+            self._exact.move_to_end(key)
+            self.exact_hits += 1
+            return result
+
+    def put_exact(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._exact[key] = (time.time() + self.ttl_seconds, result)
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+
+    # --- Semantic tier ---
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get_semantic(
+        self, embedding: List[float], symptoms: FrozenSet[str], scope: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        if not self.semantic_enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            self._evict_expired_semantic(now)
+            candidates = [
+                i for i, (_, entry_key, _) in enumerate(self._sem_entries)
+                if entry_key == (symptoms, scope)
+            ]
+            if not candidates:
+                return None
+
+            query = self._normalize(embedding)
+            matrix = np.stack([self._sem_vectors[i] for i in candidates])
+            distances = 1.0 - matrix @ query
+            best = int(np.argmin(distances))
+            if distances[best] > self.semantic_max_distance:
+                return None
+
+            self.semantic_hits += 1
+            return self._sem_entries[candidates[best]][2]
+
+    def put_semantic(
+        self,
+        embedding: List[float],
+        symptoms: FrozenSet[str],
+        result: Dict[str, Any],
+        scope: str = "",
+    ):
+        if not self.semantic_enabled:
+            return
+        with self._lock:
+            self._sem_vectors.append(self._normalize(embedding))
+            self._sem_entries.append(
+                (time.time() + self.semantic_ttl_seconds, (symptoms, scope), result)
+            )
+            overflow = len(self._sem_entries) - self.max_entries
+            if overflow > 0:
+                del self._sem_vectors[:overflow]
+                del self._sem_entries[:overflow]
+
+    def _evict_expired_semantic(self, now: float):
+        keep = [i for i, (expires_at, _, _) in enumerate(self._sem_entries) if expires_at >= now]
+        if len(keep) != len(self._sem_entries):
+            self._sem_vectors = [self._sem_vectors[i] for i in keep]
+            self._sem_entries = [self._sem_entries[i] for i in keep]
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "exact_entries": len(self._exact),
+                "semantic_entries": len(self._sem_entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "index_version": self._index_version,
+            }
@@ -0,0 +1,174 @@
+"""Sparse BM25 index with compact array-backed postings"""
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Keeps ICD codes such as "f33.1" and criterion labels such as "a1" as single tokens
+_TOKEN_PATTERN = re.compile(r"[a-z]\d+(?:\.\d+)?|[a-z0-9]+")
+
+_STOPWORDS = frozenset(
+    "the of and to in is are be or for with that as on by it this an at from "
+    "was were has have had not but i me my we our you your he she they them".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def index_path(persist_dir: str, collection_name: str) -> str:
+    """Location of the BM25 index stored next to the Chroma collection"""
+    return os.path.join(persist_dir, f"{collection_name}_bm25.npz")
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunk collection, stored in CSR form:
+
+    - ``vocab``: term -> term id
+    - ``offsets[t]:offsets[t + 1]`` slices ``postings_docs`` / ``postings_tf``
+      for term id ``t`` (int32 doc indices, uint16 term frequencies)
+    - ``doc_lengths``: tokens per document
+
+    Scoring a query touches only the postings of its terms, with one
+    vectorised update per term.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.vocab: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings_docs = np.zeros(0, dtype=np.int32)
+        self.postings_tf = np.zeros(0, dtype=np.uint16)
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def build(self, ids: List[str], documents: List[str]) -> "BM25Index":
+        """Build postings from raw document text"""
+        term_postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = np.zeros(len(documents), dtype=np.float32)
+
+        for doc_idx, text in enumerate(documents):
+            tokens = tokenize(text or "")
+            doc_lengths[doc_idx] = len(tokens)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term_postings.setdefault(token, []).append((doc_idx, min(tf, 65535)))
+
+        terms = sorted(term_postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for term_id, term in enumerate(terms):
+            offsets[term_id + 1] = offsets[term_id] + len(term_postings[term])
+
+        postings_docs = np.empty(offsets[-1], dtype=np.int32)
+        postings_tf = np.empty(offsets[-1], dtype=np.uint16)
+        for term_id, term in enumerate(terms):
+            start, end = offsets[term_id], offsets[term_id + 1]
+            entries = term_postings[term]
+            postings_docs[start:end] = [d for d, _ in entries]
+            postings_tf[start:end] = [tf for _, tf in entries]
+
+        self.ids = list(ids)
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.doc_lengths = doc_lengths
+        self._compute_idf()
+        return self
+
+    def _compute_idf(self):
+        n_docs = max(len(self.ids), 1)
+        doc_freq = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        self._avg_length = float(self.doc_lengths.mean()) if self.doc_lengths.size else 0.0
+        # Per-document length normalisation term, precomputed once
+        if self._avg_length > 0:
+            self._length_norm = (
+                self.k1 * (1 - self.b + self.b * self.doc_lengths / self._avg_length)
+            ).astype(np.float32)
+        else:
+            self._length_norm = np.full(self.doc_lengths.shape, self.k1, dtype=np.float32)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Return up to top_k (chunk id, BM25 score) pairs, best first"""
+        if not self.ids or top_k <= 0:
+            return []
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return []
+        k = min(top_k, matched.size)
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    # --- Persistence ---
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            offsets=self.offsets,
+            postings_docs=self.postings_docs,
+            postings_tf=self.postings_tf,
+            doc_lengths=self.doc_lengths,
+            meta=np.frombuffer(
+                json.dumps({"ids": self.ids, "terms": terms, "k1": self.k1, "b": self.b}).encode(),
+                dtype=np.uint8,
+            ),
+        )
+        os.replace(tmp_path, path)
+        logger.info(f"BM25 index saved: {len(self.ids)} docs, {len(terms)} terms -> {path}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode())
+            index = cls(k1=meta["k1"], b=meta["b"])
+            index.ids = meta["ids"]
+            index.vocab = {term: i for i, term in enumerate(meta["terms"])}
+            index.offsets = data["offsets"]
+            index.postings_docs = data["postings_docs"]
+            index.postings_tf = data["postings_tf"]
+            index.doc_lengths = data["doc_lengths"]
+        index._compute_idf()
+        return index
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: score(d) = sum over lists of 1 / (k + rank)"""
+    fused: Dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, item_id in enumerate(ranked, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -0,0 +1,121 @@
+"""Merging of neighbouring retrieved chunks that share overlap text"""
+from typing import Any, Dict, List, Optional, Tuple
+
+_POSITION_KEYS = ("section_index", "char_start", "char_end")
+
+
+def _span(ctx: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+    """(section, start, end) from ingestion metadata; None for older collections"""
+    meta = ctx.get("metadata") or {}
+    try:
+        section, start, end = (int(meta[key]) for key in _POSITION_KEYS)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if section < 0 or start < 0 or end < start:
+        return None
+    return section, start, end
+
+
+def merge_page_ranges(ranges: List[str]) -> str:
+    """Smallest "first-last" range covering every "a-b" (or single page) in ``ranges``"""
+    pages = []
+    for value in ranges:
+        for part in str(value or "").split("-"):
+            if part.strip().isdigit():
+                pages.append(int(part))
+    if not pages:
+        return next((r for r in ranges if r), "")
+    return f"{min(pages)}-{max(pages)}"
+
+
+def _token_share(ctx: Dict[str, Any], chars: int) -> Optional[float]:
+    """Stored token count of ``ctx`` prorated to ``chars`` of its text; None without a count"""
+    count = (ctx.get("metadata") or {}).get("token_count")
+    if not count or not ctx["document"]:
+        return None
+    return int(count) * chars / len(ctx["document"])
+
+
+def _merge_group(group: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+    """One context item spanning ``group`` (sorted by start offset), overlap removed"""
+    first = group[0][1]
+    text = first["document"]
+    end = _span(first)[2]
+    tokens = _token_share(first, len(text))
+    for _, ctx in group[1:]:
+        _, start, ctx_end = _span(ctx)
+        if ctx_end > end:
+            added = ctx["document"][end - start:]
+            text += added
+            end = ctx_end
+            share = _token_share(ctx, len(added))
+            tokens = None if tokens is None or share is None else tokens + share
+
+    # Ranked position and citation fields follow the best-ranked member
+    best = min(group, key=lambda item: item[0])[1]
+    metadata = dict(best["metadata"])
+    metadata.update({
+        "char_start": _span(first)[1],
+        "char_end": end,
+        "chunk_index": first["metadata"].get("chunk_index", -1),
+        "page_range": merge_page_ranges([ctx["metadata"].get("page_range", "") for _, ctx in group]),
+    })
+    # The members' stored counts minus the overlap, so nothing is tokenized per request
+    if tokens is None:
+        metadata.pop("token_count", None)
+    else:
+        metadata["token_count"] = max(1, round(tokens))
+    return {
+        "document": text,
+        "metadata": metadata,
+        "distance": min(ctx["distance"] for _, ctx in group),
+        "id": best["id"],
+        "merged_ids": [ctx["id"] for _, ctx in group],
+    }
+
+
+def merge_adjacent_chunks(retrieved_context: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Coalesce chunks from the same section whose character spans overlap or
+    touch into one de-duplicated span, with a merged page range. The merged
+    item takes the place of its best-ranked member; everything else keeps
+    its ranked order. Chunks without position metadata are left as they are.
+    """
+    by_section: Dict[int, List[Tuple[int, Dict[str, Any]]]] = {}
+    for rank, ctx in enumerate(retrieved_context):
+        span = _span(ctx)
+        if span is not None:
+            by_section.setdefault(span[0], []).append((rank, ctx))
+
+    replacement: Dict[int, Dict[str, Any]] = {}
+    dropped = set()
+    for members in by_section.values():
+        if len(members) < 2:
+            continue
+        members.sort(key=lambda item: _span(item[1])[1])
+        groups = [[members[0]]]
+        end = _span(members[0][1])[2]
+        for item in members[1:]:
+            _, start, item_end = _span(item[1])
+            if start <= end:
+                groups[-1].append(item)
+                end = max(end, item_end)
+            else:
+                groups.append([item])
+                end = item_end
+        for group in groups:
+            if len(group) < 2:
+                continue
+            ranks = [rank for rank, _ in group]
+            replacement[min(ranks)] = _merge_group(group)
+            dropped.update(ranks)
+
+    if not replacement:
+        return retrieved_context
+    merged = []
+    for rank, ctx in enumerate(retrieved_context):
+        if rank in replacement:
+            merged.append(replacement[rank])
+        elif rank not in dropped:
+            merged.append(ctx)
+    return merged
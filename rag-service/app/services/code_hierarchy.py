@@ -0,0 +1,85 @@
+"""ICD-10 code hierarchy for prefix-based disorder filtering"""
+from typing import Dict, Iterable, List, Optional, Set
+
+# Disorder code prefixes worth searching for each detected MDD criterion.
+# Every presentation searches the depressive disorders plus the usual
+# differentials (bipolar, adjustment); individual criteria add disorders
+# whose text discusses overlapping symptoms.
+CORE_MOOD_PREFIXES = ["F32", "F33", "F34.1", "F31", "F43.2"]
+
+SYMPTOM_DISORDER_PREFIXES: Dict[str, List[str]] = {
+    "A1": [],                    # Depressed mood
+    "A2": [],                    # Anhedonia
+    "A3": ["F50"],               # Weight/appetite change -> eating disorders
+    "A4": ["F51"],               # Sleep disturbance -> insomnia disorder
+    "A5": ["F41.1", "F90"],      # Psychomotor changes -> GAD, ADHD
+    "A6": [],                    # Fatigue
+    "A7": [],                    # Worthlessness/guilt
+    "A8": ["F41.1", "F90"],      # Concentration -> GAD, ADHD
+    "A9": ["F43.1"],             # Suicidal ideation -> trauma-related
+}
+
+
+def normalize_code(code: str) -> str:
+    return (code or "").strip().upper()
+
+
+class CodeHierarchy:
+    """
+    Precomputed prefix → codes map over the disorder codes present in the index.
+
+    Every code is registered under each of its prefixes, so "F3" resolves to
+    {"F31", "F32", "F32.1", "F33.1", ...} and "F32" to {"F32", "F32.1", ...}
+    with a single dict lookup.
+    """
+
+    def __init__(self, codes: Iterable[str], names: Optional[Dict[str, Set[str]]] = None):
+        self.codes: Set[str] = {normalize_code(c) for c in codes}
+        self.prefix_map: Dict[str, Set[str]] = {}
+        for code in self.codes:
+            for end in range(1, len(code) + 1):
+                self.prefix_map.setdefault(code[:end], set()).add(code)
+        # disorder_name -> codes seen with that name
+        self.name_map: Dict[str, Set[str]] = {
+            name.lower(): {normalize_code(c) for c in name_codes}
+            for name, name_codes in (names or {}).items()
+        }
+
+    @classmethod
+    def from_metadatas(cls, metadatas: Iterable[Dict]) -> "CodeHierarchy":
+        codes: Set[str] = set()
+        names: Dict[str, Set[str]] = {}
+        for meta in metadatas:
+            if not meta:
+                continue
+            code = meta.get("disorder_code", "") or ""
+            codes.add(code)
+            name = meta.get("disorder_name")
+            if name:
+                names.setdefault(name, set()).add(code)
+        return cls(codes, names)
+
+    def resolve(self, prefixes: Iterable[str]) -> Set[str]:
+        """Resolve code prefixes to the set of concrete codes present in the index"""
+        resolved: Set[str] = set()
+        for prefix in prefixes:
+            prefix = normalize_code(prefix)
+            if prefix:
+                resolved |= self.prefix_map.get(prefix, set())
+            elif "" in self.codes:
+                resolved.add("")
+        return resolved
+
+    def resolve_name(self, name: str) -> Set[str]:
+        return set(self.name_map.get((name or "").lower(), set()))
+
+    def codes_for_symptoms(self, symptoms: List[Dict]) -> Set[str]:
+        """
+        Pick partitions for a presentation from its NLP-detected symptoms.
+        Always includes uncoded ("General") chunks.
+        """
+        prefixes = list(CORE_MOOD_PREFIXES)
+        for symptom in symptoms or []:
+            if symptom.get("detected"):
+                prefixes.extend(SYMPTOM_DISORDER_PREFIXES.get(symptom.get("dsm5Code", ""), []))
+        return self.resolve(prefixes) | self.resolve([""])
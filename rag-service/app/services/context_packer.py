@@ -0,0 +1,140 @@
+"""Token-budgeted packing of retrieved context into the assessment prompt"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.prompts.system_prompt import CLINICAL_SYSTEM_PROMPT
+from app.prompts.query_templates import build_assessment_prompt
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Conservative characters-per-token ratio for short dynamic text we do not
+# encode (reference headers, symptom lines). English averages ~4.
+_CHARS_PER_TOKEN_ESTIMATE = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-bound token estimate for short strings"""
+    return len(text) // _CHARS_PER_TOKEN_ESTIMATE + 1
+
+
+class ContextPacker:
+    """
+    Fills the prompt's input-token budget with retrieved chunks in ranked
+    order, without building and re-encoding the full prompt.
+
+    Token costs come from:
+    - ``token_count`` chunk metadata written at ingestion (encoded once per
+      chunk ID and memoised for collections ingested before that field existed)
+    - cached counts for the static system prompt and prompt scaffolding
+    - one encode of the patient text per request
+    - character-based upper-bound estimates for small per-request blocks
+
+    The patient presentation is never truncated: if it alone exceeds the
+    budget, the prompt is sent with no references.
+    """
+
+    def __init__(self, llm_service):
+        self.llm_service = llm_service
+        self.core_block: Optional[str] = None
+        self._static_tokens: Optional[int] = None
+        self._chunk_tokens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def set_core_block(self, core_block: Optional[str]):
+        """Use the cache-friendly layout with this core criteria block"""
+        self.core_block = core_block
+        self._static_tokens = None
+
+    @property
+    def static_tokens(self) -> int:
+        """System prompt plus the fixed scaffolding of the user prompt (computed once)"""
+        if self._static_tokens is None:
+            scaffold = build_assessment_prompt(
+                patient_text="", retrieved_context=[], core_block=self.core_block
+            )
+            self._static_tokens = self.llm_service.count_tokens(CLINICAL_SYSTEM_PROMPT + scaffold)
+        return self._static_tokens
+
+    def chunk_tokens(self, ctx: Dict[str, Any]) -> int:
+        """Token count of a chunk's text, from ingestion metadata when available"""
+        count = (ctx.get("metadata") or {}).get("token_count")
+        if count:
+            return int(count)
+        chunk_id = ctx.get("id", "")
+        with self._lock:
+            cached = self._chunk_tokens.get(chunk_id)
+        if cached is None:
+            cached = self.llm_service.count_tokens(ctx.get("document", ""))
+            with self._lock:
+                self._chunk_tokens[chunk_id] = cached
+        return cached
+
+    def reference_tokens(self, ctx: Dict[str, Any]) -> int:
+        """Chunk text plus its Section/Disorder/Code/Pages/Type header lines"""
+        meta = ctx.get("metadata") or {}
+        header = " ".join(
+            str(meta.get(key, ""))
+            for key in ("section_title", "disorder_name", "disorder_code", "page_range", "section_type")
+        )
+        # "--- Reference N ---", field labels and the relevance line
+        return self.chunk_tokens(ctx) + estimate_tokens(header) + 24
+
+    @staticmethod
+    def _dynamic_block_tokens(
+        symptoms: Optional[List[Dict[str, Any]]],
+        metadata: Optional[Dict[str, Any]],
+    ) -> int:
+        """Upper-bound estimate for the symptom and metadata sections"""
+        total = 0
+        if symptoms:
+            total += 80  # section header and instructions
+            for symptom in symptoms:
+                line = " ".join([
+                    str(symptom.get("name", "")),
+                    " ".join(symptom.get("evidence") or []),
+                    symptom.get("sentenceContext") or "",
+                ])
+                total += estimate_tokens(line) + 12
+        if metadata:
+            total += 40 + estimate_tokens(str(metadata.get("functionalImpairment", "")))
+        return total
+
+    def pack(
+        self,
+        patient_text: str,
+        retrieved_context: List[Dict[str, Any]],
+        budget: int,
+        symptoms: Optional[List[Dict[str, Any]]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Greedily keep chunks in their ranked order while they fit the budget.
+        Returns (chunks to include, estimated total input tokens).
+        """
+        fixed = (
+            self.static_tokens
+            + self.llm_service.count_tokens(patient_text)
+            + self._dynamic_block_tokens(symptoms, metadata)
+        )
+        if fixed > budget:
+            logger.warning(
+                f"Patient presentation alone (~{fixed} tokens) exceeds the input budget "
+                f"({budget}); sending without references"
+            )
+            return [], fixed
+
+        remaining = budget - fixed
+        packed = []
+        for ctx in retrieved_context:
+            cost = self.reference_tokens(ctx)
+            if cost <= remaining:
+                packed.append(ctx)
+                remaining -= cost
+
+        if len(packed) < len(retrieved_context):
+            logger.info(
+                f"Token budget kept {len(packed)}/{len(retrieved_context)} chunks "
+                f"(budget {budget})"
+            )
+        return packed, budget - remaining
@@ -0,0 +1,67 @@
+"""Post-retrieval context selection: score thresholding and MMR diversification"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def mmr_select(
+    query_embedding: List[float],
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+) -> List[int]:
+    """
+    Maximal marginal relevance: greedily pick items that are relevant to the
+    query but dissimilar to what has already been picked.
+    Returns indices into ``embeddings`` in selection order.
+    """
+    n = embeddings.shape[0]
+    if n == 0 or k <= 0:
+        return []
+
+    vectors = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to anything already selected
+    redundancy = similarity[:, selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        redundancy = np.maximum(redundancy, similarity[:, pick])
+
+    return selected
+
+
+def select_context(
+    retrieved_context: List[Dict[str, Any]],
+    embeddings: np.ndarray,
+    query_embedding: List[float],
+    final_k: int,
+    min_score: float,
+    lambda_mult: float = 0.7,
+) -> List[Dict[str, Any]]:
+    """
+    Drop chunks whose relevance (1 - cosine distance) is below ``min_score``,
+    then keep at most ``final_k`` of the rest chosen by MMR.
+    ``embeddings`` rows align with ``retrieved_context``.
+    """
+    keep = [
+        i for i, ctx in enumerate(retrieved_context)
+        if max(0.0, 1 - ctx["distance"]) >= min_score
+    ]
+    if not keep:
+        return []
+
+    order = mmr_select(query_embedding, embeddings[keep], final_k, lambda_mult)
+    return [retrieved_context[keep[i]] for i in order]
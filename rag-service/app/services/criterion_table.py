@@ -0,0 +1,214 @@
+"""Precomputed criterion → diagnostic-criteria chunk table for the fixed MDD symptom set"""
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services.code_hierarchy import SYMPTOM_DISORDER_PREFIXES, CodeHierarchy
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# One retrieval query per MDD criterion, matching the NLP service's dsm5Code vocabulary
+CRITERION_QUERIES: Dict[str, str] = {
+    "A1": "Diagnostic criteria: depressed mood most of the day, nearly every day",
+    "A2": "Diagnostic criteria: markedly diminished interest or pleasure in all, or almost all, activities",
+    "A3": "Diagnostic criteria: significant weight loss or weight gain, or decrease or increase in appetite",
+    "A4": "Diagnostic criteria: insomnia or hypersomnia nearly every day",
+    "A5": "Diagnostic criteria: psychomotor agitation or retardation observable by others",
+    "A6": "Diagnostic criteria: fatigue or loss of energy nearly every day",
+    "A7": "Diagnostic criteria: feelings of worthlessness or excessive or inappropriate guilt",
+    "A8": "Diagnostic criteria: diminished ability to think or concentrate, or indecisiveness",
+    "A9": "Diagnostic criteria: recurrent thoughts of death, suicidal ideation, or a suicide attempt",
+}
+
+# Disorders whose criteria are pinned for every MDD criterion, ahead of the
+# per-criterion differentials in SYMPTOM_DISORDER_PREFIXES
+MDD_PREFIXES = ["F32", "F33"]
+
+CRITERIA_SECTION_TYPE = "diagnostic_criteria"
+
+
+def table_path(persist_dir: str, collection_name: str) -> str:
+    """Location of the criterion table stored next to the Chroma collection"""
+    return os.path.join(persist_dir, f"{collection_name}_criteria.json")
+
+
+def index_signature(collection, embedding_model: str) -> str:
+    """Changes when the collection is re-created, resized or re-embedded with another model"""
+    return f"{collection.id}:{collection.count()}:{embedding_model}"
+
+
+def fetch_criteria_rows(collection) -> Dict[str, Any]:
+    """All chunks tagged as diagnostic criteria at ingestion, with their embeddings"""
+    return collection.get(
+        where={"section_type": CRITERIA_SECTION_TYPE},
+        include=["documents", "metadatas", "embeddings"],
+    )
+
+
+class CriterionTable:
+    """
+    For each MDD criterion and each disorder it is checked against, the best
+    matching ``diagnostic_criteria`` chunks with their text, metadata and
+    embedding. Pinning a detected criterion's chunks needs no embedding call
+    or vector search at query time.
+    """
+
+    def __init__(self, signature: str = ""):
+        self.signature = signature
+        # criterion -> [{"id", "prefix_rank", "score"}], best first per disorder
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        # chunk id -> {"document", "metadata", "embedding"}
+        self.chunks: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.chunks)
+
+    def build(
+        self,
+        criterion_vectors: Dict[str, List[float]],
+        rows: Dict[str, Any],
+        hierarchy: CodeHierarchy,
+        per_disorder: int = 1,
+    ) -> "CriterionTable":
+        """Rank criteria chunks per (criterion, disorder) by cosine to the criterion query"""
+        ids = rows.get("ids") or []
+        if not ids:
+            logger.warning("No diagnostic_criteria chunks indexed; criterion table is empty")
+            return self
+
+        matrix = np.asarray(rows["embeddings"], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        codes = np.array(
+            [(meta or {}).get("disorder_code", "") or "" for meta in rows["metadatas"]],
+            dtype=object,
+        )
+
+        used = set()
+        for criterion, vector in criterion_vectors.items():
+            query = np.asarray(vector, dtype=np.float32)
+            query /= max(float(np.linalg.norm(query)), 1e-12)
+            scores = matrix @ query
+
+            targets = MDD_PREFIXES + SYMPTOM_DISORDER_PREFIXES.get(criterion, [])
+            entries = []
+            for rank, prefix in enumerate(targets):
+                allowed = list(hierarchy.resolve([prefix]))
+                candidates = np.flatnonzero(np.isin(codes, allowed))
+                if candidates.size == 0:
+                    continue
+                best = candidates[np.argsort(-scores[candidates])[:per_disorder]]
+                for row in best:
+                    entries.append({
+                        "id": ids[row],
+                        "prefix_rank": rank,
+                        "score": float(scores[row]),
+                    })
+                    used.add(int(row))
+            self.entries[criterion] = entries
+
+        for row in sorted(used):
+            self.chunks[ids[row]] = {
+                "document": rows["documents"][row],
+                "metadata": rows["metadatas"][row] or {},
+                "embedding": rows["embeddings"][row],
+            }
+
+        logger.info(
+            f"Criterion table built: {len(self.entries)} criteria -> {self.size} chunks"
+        )
+        return self
+
+    def pinned(
+        self,
+        symptoms: Optional[List[Dict[str, Any]]],
+        query_embedding: List[float],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Context entries for the detected criteria: MDD criteria chunks first,
+        then differential disorders, best criterion match first within each.
+        Distances are to ``query_embedding``, like live retrieval results.
+        """
+        if not self.chunks or limit <= 0:
+            return []
+
+        candidates = []
+        for symptom in symptoms or []:
+            if symptom.get("detected"):
+                candidates.extend(self.entries.get(symptom.get("dsm5Code", ""), []))
+        candidates.sort(key=lambda e: (e["prefix_rank"], -e["score"]))
+
+        chosen: List[str] = []
+        for entry in candidates:
+            if entry["id"] not in chosen:
+                chosen.append(entry["id"])
+            if len(chosen) >= limit:
+                break
+        if not chosen:
+            return []
+
+        vectors = np.asarray([self.chunks[i]["embedding"] for i in chosen], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        distances = 1.0 - vectors @ query
+
+        return [
+            {
+                "document": self.chunks[chunk_id]["document"],
+                "metadata": self.chunks[chunk_id]["metadata"],
+                "distance": float(dist),
+                "id": chunk_id,
+            }
+            for chunk_id, dist in zip(chosen, distances)
+        ]
+
+    def core_chunks(self) -> List[Dict[str, Any]]:
+        """
+        The MDD (F32/F33) criteria chunks matched by any criterion, ordered by
+        chunk ID. The result depends only on the index, so it can open every
+        prompt as a cacheable prefix.
+        """
+        ids = sorted({
+            entry["id"]
+            for entries in self.entries.values()
+            for entry in entries
+            if entry["prefix_rank"] < len(MDD_PREFIXES)
+        })
+        return [
+            {
+                "id": chunk_id,
+                "document": self.chunks[chunk_id]["document"],
+                "metadata": self.chunks[chunk_id]["metadata"],
+            }
+            for chunk_id in ids
+        ]
+
+    # --- Persistence ---
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        chunks = {
+            chunk_id: {**chunk, "embedding": [float(x) for x in chunk["embedding"]]}
+            for chunk_id, chunk in self.chunks.items()
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"signature": self.signature, "entries": self.entries, "chunks": chunks}, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Criterion table saved: {self.size} chunks -> {path}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["CriterionTable"]:
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        table = cls(signature=data.get("signature", ""))
+        table.entries = data.get("entries", {})
+        table.chunks = data.get("chunks", {})
+        return table
@@ -0,0 +1,111 @@
+"""Request deadlines: per-stage time budgets and deadline-aware retries"""
+import asyncio
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from tenacity.stop import stop_base
+
+from app.config.settings import settings
+
+T = TypeVar("T")
+
+# Pipeline stages in execution order
+STAGES = ("embed", "retrieve", "llm")
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed before the pipeline finished"""
+
+
+class Deadline:
+    """
+    Absolute point in time (monotonic clock) by which a request must finish.
+
+    Stages run under ``stage_timeout``: whatever time remains, less the
+    minimum the later stages need (the DEADLINE_*_MIN_MS settings). A slow
+    stage may use time the later stages do not need, and a fast one leaves
+    the rest to them.
+    """
+
+    def __init__(self, timeout_seconds: float):
+        self.timeout = timeout_seconds
+        self.expires_at = time.monotonic() + timeout_seconds
+
+    @classmethod
+    def from_header(cls, timeout_ms: Optional[str]) -> Optional["Deadline"]:
+        """
+        Deadline from an X-Request-Timeout-Ms header (the caller's remaining
+        timeout in milliseconds), falling back to DEFAULT_REQUEST_TIMEOUT_SECONDS.
+        None when neither is set.
+        """
+        if timeout_ms:
+            try:
+                seconds = float(timeout_ms) / 1000
+            except ValueError:
+                raise ValueError(f"Invalid X-Request-Timeout-Ms header: {timeout_ms!r}")
+            # Leave a margin for the response to travel back to the caller
+            return cls(max(seconds - settings.deadline_margin_ms / 1000, 0.0))
+        if settings.default_request_timeout_seconds > 0:
+            return cls(settings.default_request_timeout_seconds)
+        return None
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, stage: str):
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def stage_timeout(self, stage: str) -> float:
+        """
+        Seconds ``stage`` may take so the stages after it keep their minimum.
+        When less than every pending stage's minimum is left, the remaining
+        time is split in proportion to those minimums instead.
+        """
+        minimums = {
+            "embed": settings.deadline_embed_min_ms / 1000,
+            "retrieve": settings.deadline_retrieval_min_ms / 1000,
+            "llm": settings.deadline_llm_min_ms / 1000,
+        }
+        pending = STAGES[STAGES.index(stage):]
+        remaining = max(self.remaining(), 0.0)
+        later = sum(minimums[s] for s in pending[1:])
+        if remaining >= later + minimums[stage]:
+            return remaining - later
+        total = later + minimums[stage]
+        return remaining * minimums[stage] / total if total > 0 else remaining
+
+
+async def within(deadline: Optional[Deadline], stage: str, awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable``, cancelling it if ``stage`` overruns its budget"""
+    if deadline is None:
+        return await awaitable
+    timeout = deadline.stage_timeout(stage)
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(
+            f"Deadline exceeded during {stage} ({timeout * 1000:.0f}ms budget)"
+        ) from None
+
+
+class stop_before_deadline(stop_base):
+    """
+    Tenacity stop condition: give up when another attempt (the backoff plus
+    the average attempt so far) cannot finish before the ``deadline``
+    keyword argument of the retried call.
+    """
+
+    def __init__(self, wait):
+        self.wait = wait
+
+    def __call__(self, retry_state) -> bool:
+        deadline: Optional[Deadline] = retry_state.kwargs.get("deadline")
+        if deadline is None:
+            return False
+        attempt_seconds = retry_state.seconds_since_start / retry_state.attempt_number
+        return deadline.remaining() < self.wait(retry_state) + attempt_seconds
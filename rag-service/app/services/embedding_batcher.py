@@ -0,0 +1,140 @@
+"""Micro-batching of concurrent embedding requests into shared provider calls"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.services.deadline import Deadline
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Per-call stats shared by every caller in a batch
+_SHARED_STATS = ("rate_limit_wait_ms", "hedged")
+
+
+class _Batch:
+    """Texts collected during one window, deduplicated, and the callers' stats"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.texts: Dict[str, int] = {}
+        self.stats: List[Dict[str, Any]] = []
+        self.callers = 0
+        # Latest caller deadline; unbounded once a caller without one joins
+        self.deadline: Optional[Deadline] = None
+        self.unbounded = False
+        self.future: asyncio.Future = loop.create_future()
+        # Nobody may be left to read a failure if every caller was cancelled
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+class EmbeddingBatcher:
+    """
+    Combines embedding requests that arrive within ``window_seconds`` of the
+    first one, or until ``max_size`` distinct texts are queued, into one
+    call of ``create``. Identical texts are embedded once, and each caller
+    gets the vectors for its own texts in order. A request arriving while
+    no call is in flight is sent at once, so a lone caller never waits for
+    the window; batching starts once calls overlap.
+
+    The shared call runs in its own task, so cancelling one caller (for
+    example on a deadline) does not fail the others in the batch. Its
+    retries stop at the latest deadline among the callers.
+    """
+
+    def __init__(
+        self,
+        create: Callable[
+            [List[str], Dict[str, Any], Optional[Deadline]], Awaitable[List[List[float]]]
+        ],
+        window_seconds: float,
+        max_size: int,
+    ):
+        self._create = create
+        self.window = window_seconds
+        self.max_size = max(max_size, 1)
+        self._open: Optional[_Batch] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Lifetime counters: caller requests vs provider calls made for them
+        self.requests = 0
+        self.calls = 0
+
+    async def embed(
+        self,
+        texts: List[str],
+        stats: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[List[float]]:
+        if len(texts) > self.max_size:
+            # Already a full batch on its own
+            self.requests += 1
+            self.calls += 1
+            call_stats: Dict[str, Any] = {}
+            vectors = await self._create(texts, call_stats, deadline)
+            self._copy_stats(call_stats, [stats] if stats is not None else [], len(texts), 1)
+            return vectors
+
+        batch = self._open
+        new_texts = [t for t in dict.fromkeys(texts) if batch is None or t not in batch.texts]
+        if batch is not None and len(batch.texts) + len(new_texts) > self.max_size:
+            self._flush()
+            batch = None
+        if batch is None:
+            batch = self._open = _Batch(asyncio.get_running_loop())
+        for text in texts:
+            batch.texts.setdefault(text, len(batch.texts))
+        batch.callers += 1
+        if deadline is None:
+            batch.unbounded = True
+        elif batch.deadline is None or deadline.expires_at > batch.deadline.expires_at:
+            batch.deadline = deadline
+        if stats is not None:
+            batch.stats.append(stats)
+        self.requests += 1
+
+        if len(batch.texts) >= self.max_size or not self._tasks:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+        vectors = await asyncio.shield(batch.future)
+        return [vectors[batch.texts[text]] for text in texts]
+
+    def _flush(self):
+        """Close the open batch and start its provider call"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._open = self._open, None
+        if batch is None:
+            return
+        self.calls += 1
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _Batch):
+        call_stats: Dict[str, Any] = {}
+        try:
+            deadline = None if batch.unbounded else batch.deadline
+            vectors = await self._create(list(batch.texts), call_stats, deadline)
+        except asyncio.CancelledError:
+            batch.future.cancel()
+            raise
+        except Exception as e:
+            if not batch.future.done():
+                batch.future.set_exception(e)
+            return
+        self._copy_stats(call_stats, batch.stats, len(batch.texts), batch.callers)
+        if not batch.future.done():
+            batch.future.set_result(vectors)
+        if batch.callers > 1:
+            logger.debug(f"Embedded {len(batch.texts)} texts for {batch.callers} callers in one call")
+
+    @staticmethod
+    def _copy_stats(call_stats: Dict[str, Any], targets: List[Dict[str, Any]], size: int, callers: int):
+        for stats in targets:
+            for key in _SHARED_STATS:
+                if key in call_stats:
+                    stats[key] = call_stats[key]
+            stats["batch_size"] = size
+            stats["batch_callers"] = callers
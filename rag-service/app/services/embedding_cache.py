@@ -0,0 +1,189 @@
+"""Two-level (memory LRU + SQLite) cache for text embeddings"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _encode_vector(vector: List[float]) -> bytes:
+    """Pack a vector as a compact float32 blob"""
+    return array("f", vector).tobytes()
+
+
+def _decode_vector(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """
+    Caches embeddings keyed on (model, dimensions, sha256(text)).
+
+    Lookups hit an in-memory LRU first and fall back to a local SQLite store,
+    promoting disk hits into memory. Vectors are stored as float32 blobs
+    (6 KB for 1536 dimensions). Thread-safe.
+
+    Async callers use ``aget_many`` / ``aput_many``, which keep SQLite reads,
+    writes and commits off the event loop on a single dedicated thread.
+    """
+
+    def __init__(self, path: Optional[str], max_memory_entries: int = 2048):
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache")
+
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            try:
+                directory = os.path.dirname(os.path.abspath(path))
+                os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+                )
+                self._db.commit()
+                logger.info(f"Embedding cache persisted at {path}")
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache disk store unavailable, memory only: {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(model: str, dimensions: int, text: str) -> str:
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{dimensions}:{text_hash}"
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_lookup(self, keys: List[str]) -> Tuple[Dict[str, List[float]], List[str]]:
+        """Vectors found in the LRU, and the keys left for the disk tier"""
+        found: Dict[str, List[float]] = {}
+        disk_keys = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                else:
+                    disk_keys.append(key)
+        return found, disk_keys if self._db is not None else []
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        placeholders = ",".join("?" * len(keys))
+        with self._db_lock:
+            if self._db is None:
+                return {}
+            try:
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    keys,
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+                return {}
+        return {key: _decode_vector(blob) for key, blob in rows}
+
+    def _write_disk(self, items: Dict[str, List[float]]):
+        rows = [(key, _encode_vector(vector)) for key, vector in items.items()]
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+
+    def _merge(
+        self,
+        keys: List[str],
+        found: Dict[str, List[float]],
+        from_disk: Dict[str, List[float]],
+    ) -> Dict[str, List[float]]:
+        """Promote disk hits into the LRU and count hits/misses"""
+        with self._lock:
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+                found[key] = vector
+            unique = set(keys)
+            self.hits += sum(1 for key in unique if key in found)
+            self.misses += sum(1 for key in unique if key not in found)
+        return found
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for whichever keys are present (blocking)"""
+        found, disk_keys = self._memory_lookup(keys)
+        from_disk = self._read_disk(disk_keys) if disk_keys else {}
+        return self._merge(keys, found, from_disk)
+
+    async def aget_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Async ``get_many``: the LRU is checked on the event loop and only
+        memory misses go to SQLite, on the cache's own thread.
+        """
+        found, disk_keys = self._memory_lookup(keys)
+        from_disk: Dict[str, List[float]] = {}
+        if disk_keys:
+            loop = asyncio.get_running_loop()
+            from_disk = await loop.run_in_executor(self._executor, self._read_disk, disk_keys)
+        return self._merge(keys, found, from_disk)
+
+    def _remember_many(self, items: Dict[str, List[float]]):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors in memory and on disk (blocking)"""
+        if not items:
+            return
+        self._remember_many(items)
+        self._write_disk(items)
+
+    def aput_many(self, items: Dict[str, List[float]]):
+        """
+        Store vectors in memory now and queue the SQLite write on the
+        cache's thread; the caller does not wait for the commit.
+        """
+        if not items:
+            return
+        self._remember_many(items)
+        if self._db is not None:
+            self._executor.submit(self._write_disk, dict(items))
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        # Let queued writes finish before closing the connection
+        self._executor.shutdown(wait=True)
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
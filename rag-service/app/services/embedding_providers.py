@@ -0,0 +1,302 @@
+"""Embedding provider backends: OpenAI API, local CPU model, deterministic hashing"""
+import asyncio
+import hashlib
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from tenacity import retry, stop_after_attempt, wait_exponential
+
+from app.config.settings import settings
+from app.services.context_packer import estimate_tokens
+from app.services.deadline import Deadline, stop_before_deadline
+from app.services.rate_limiter import get_limiter
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_RETRY_WAIT = wait_exponential(multiplier=1, min=1, max=10)
+
+
+class EmbeddingMismatchError(ValueError):
+    """Raised when a collection was built with a different embedding model or dimension"""
+
+
+class EmbeddingProvider:
+    """
+    Interface implemented by every embedding backend.
+
+    ``name``, ``model`` and ``dimensions`` identify the vector space; they are
+    recorded on the Chroma collection so vectors from different models are
+    never mixed in one index.
+    """
+
+    name = ""
+    # Network-bound providers can have slow requests hedged (see EmbeddingService)
+    remote = False
+
+    def __init__(self, model: str, dimensions: int):
+        self.model = model
+        self.dimensions = dimensions
+
+    @property
+    def identity(self) -> Dict[str, Any]:
+        return {
+            "embedding_provider": self.name,
+            "embedding_model": self.model,
+            "embedding_dimensions": self.dimensions,
+        }
+
+    async def embed(
+        self,
+        texts: List[str],
+        stats: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[List[float]]:
+        """
+        Embed ``texts``. Providers that queue for API quota add the time
+        spent waiting to ``stats["rate_limit_wait_ms"]``; providers that
+        retry stop retrying when an attempt can no longer beat ``deadline``.
+        """
+        raise NotImplementedError
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Remote embeddings through the OpenAI API"""
+
+    name = "openai"
+    remote = True
+
+    def __init__(self):
+        super().__init__(settings.embedding_model, settings.embedding_dimensions)
+        from app.services.http_client import openai_client
+
+        self.client = openai_client("embedding")
+        self.limiter = get_limiter("embedding", self.model)
+
+    async def embed(
+        self,
+        texts: List[str],
+        stats: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[List[float]]:
+        waits: List[float] = []
+        reserved = sum(estimate_tokens(text) for text in texts)
+        response = await self._create(texts, reserved, waits, deadline=deadline)
+        if self.limiter is not None:
+            self.limiter.reconcile(reserved, response.usage.total_tokens)
+        if stats is not None:
+            stats["rate_limit_wait_ms"] = round(
+                stats.get("rate_limit_wait_ms", 0.0) + sum(waits), 1
+            )
+        return [item.embedding for item in response.data]
+
+    @retry(
+        stop=stop_after_attempt(3) | stop_before_deadline(_RETRY_WAIT),
+        wait=_RETRY_WAIT,
+    )
+    async def _create(
+        self,
+        texts: List[str],
+        reserved: int,
+        waits: List[float],
+        deadline: Optional[Deadline] = None,
+    ):
+        from openai import RateLimitError
+
+        if self.limiter is not None:
+            waits.append(await self.limiter.acquire(reserved))
+        extra = {"timeout": max(deadline.remaining(), 0.001)} if deadline is not None else {}
+        try:
+            raw = await self.client.embeddings.with_raw_response.create(
+                model=self.model,
+                input=texts,
+                dimensions=self.dimensions,
+                **extra,
+            )
+        except RateLimitError as e:
+            if self.limiter is not None:
+                self.limiter.on_rate_limited(e.response.headers)
+            raise
+        if self.limiter is not None:
+            self.limiter.observe_headers(raw.headers)
+        return raw.parse()
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        """
+        Blocking batch embedding for ingestion scripts. Truncates texts over
+        the model's token limit and splits into sub-batches.
+        """
+        import tiktoken
+
+        from app.services.http_client import openai_sync_client
+
+        client = openai_sync_client("embedding")
+
+        try:
+            encoder = tiktoken.encoding_for_model(self.model)
+        except KeyError:
+            encoder = tiktoken.get_encoding("cl100k_base")
+
+        max_tokens_per_text = 8000  # Leave margin below 8191 limit
+
+        safe_texts = []
+        for text in texts:
+            tokens = encoder.encode(text)
+            if len(tokens) > max_tokens_per_text:
+                safe_texts.append(encoder.decode(tokens[:max_tokens_per_text]))
+            else:
+                safe_texts.append(text)
+
+        all_embeddings = []
+        sub_batch_size = 20  # Smaller batches to stay within API limits
+        for i in range(0, len(safe_texts), sub_batch_size):
+            response = client.embeddings.create(
+                model=self.model,
+                input=safe_texts[i:i + sub_batch_size],
+                dimensions=self.dimensions,
+            )
+            all_embeddings.extend([item.embedding for item in response.data])
+        return all_embeddings
+
+
+class _ThreadPoolProvider(EmbeddingProvider):
+    """Runs a blocking CPU encoder in mini-batches on a dedicated thread pool"""
+
+    def __init__(self, model: str, dimensions: int):
+        super().__init__(model, dimensions)
+        self.batch_size = max(1, settings.local_embedding_batch_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.local_embedding_workers,
+            thread_name_prefix="embedding",
+        )
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[i:i + self.batch_size]))
+        return vectors
+
+    async def embed(
+        self,
+        texts: List[str],
+        stats: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self._encode, batch) for batch in batches
+        ))
+        return [vector for batch in results for vector in batch]
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LocalEmbeddingProvider(_ThreadPoolProvider):
+    """
+    Small sentence-transformers model on CPU (PyTorch or ONNX runtime).
+    Needs the optional ``sentence-transformers`` package and a model that is
+    either cached locally or downloadable.
+    """
+
+    name = "local"
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+
+        kwargs = {"device": "cpu"}
+        if settings.local_embedding_runtime != "torch":
+            kwargs["backend"] = settings.local_embedding_runtime
+        self._model = SentenceTransformer(settings.local_embedding_model, **kwargs)
+        super().__init__(
+            settings.local_embedding_model,
+            self._model.get_sentence_embedding_dimension(),
+        )
+        logger.info(
+            f"Local embedding model loaded: {self.model} "
+            f"({self.dimensions} dims, {settings.local_embedding_runtime})"
+        )
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return vectors.astype(np.float32).tolist()
+
+
+_HASH_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+class HashingEmbeddingProvider(_ThreadPoolProvider):
+    """
+    Deterministic feature-hashing vectorizer over word unigrams and bigrams.
+    No model files or network; identical text always yields the identical
+    vector, which makes it suitable for tests and air-gapped smoke runs.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimensions: Optional[int] = None):
+        super().__init__("hashing-v1", dimensions or settings.embedding_dimensions)
+
+    def _vector(self, text: str) -> List[float]:
+        tokens = _HASH_TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+        counts: Dict[int, float] = {}
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            index = value % self.dimensions
+            sign = 1.0 if (value >> 63) & 1 else -1.0
+            counts[index] = counts.get(index, 0.0) + sign
+
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for index, count in counts.items():
+            # Sublinear term frequency, keeping the hashed sign
+            vector[index] = math.copysign(1.0 + math.log(abs(count)), count) if count else 0.0
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+
+def create_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Build the configured provider: "openai", "local" or "hashing".
+    "local" falls back to "hashing" when sentence-transformers is not installed.
+    """
+    name = (name or settings.embedding_provider).lower()
+    if name == "openai":
+        return OpenAIEmbeddingProvider()
+    if name == "local":
+        try:
+            return LocalEmbeddingProvider()
+        except ImportError:
+            logger.warning(
+                "sentence-transformers is not installed; falling back to the "
+                "hashing embedding provider"
+            )
+            return HashingEmbeddingProvider()
+    if name == "hashing":
+        return HashingEmbeddingProvider()
+    raise ValueError(f"Unknown embedding provider: {name}")
@@ -1,95 +1,186 @@
-"""OpenAI embedding service for generating text embeddings"""
-from openai import AsyncOpenAI
-from typing import List
-from tenacity import retry, stop_after_attempt, wait_exponential
+"""Embedding service for generating text embeddings"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, List, Dict, Any, Optional
 
 from app.config.settings import settings
+from app.services.deadline import Deadline
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_providers import EmbeddingProvider, create_provider
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
 class EmbeddingService:
-    """Generates text embeddings using OpenAI's embedding API"""
-
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
-        self.model = settings.embedding_model
-        self.dimensions = settings.embedding_dimensions
-
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=10),
-    )
-    async def embed_text(self, text: str) -> List[float]:
+    """
+    Generates text embeddings through the configured provider
+    (EMBEDDING_PROVIDER=openai|local|hashing), with caching. Cache misses
+    from concurrent requests are micro-batched into shared provider calls.
+    """
+
+    def __init__(self, provider: Optional[EmbeddingProvider] = None):
+        self.provider = provider or create_provider()
+        self.model = self.provider.model
+        self.dimensions = self.provider.dimensions
+
+        self.cache: Optional[EmbeddingCache] = None
+        if settings.embedding_cache_enabled:
+            self.cache = EmbeddingCache(
+                path=settings.embedding_cache_path or None,
+                max_memory_entries=settings.embedding_cache_memory_entries,
+            )
+        # Running average of API latency per request, used to estimate time saved by hits
+        self._avg_api_ms = 0.0
+        self._api_calls = 0
+        # Recent API latencies, used to pick the hedging delay
+        self._latencies: Deque[float] = deque(maxlen=256)
+        self.batcher: Optional[EmbeddingBatcher] = None
+        if settings.embedding_microbatch_enabled:
+            self.batcher = EmbeddingBatcher(
+                self._timed_create,
+                window_seconds=settings.embedding_batch_window_ms / 1000,
+                max_size=settings.embedding_batch_max_size,
+            )
+
+    @property
+    def identity(self) -> Dict[str, Any]:
+        """Provider, model and dimensions recorded on the collection"""
+        return self.provider.identity
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging (recent p95 latency), or None to not hedge"""
+        if not settings.embedding_hedge_enabled or not self.provider.remote:
+            return None
+        if len(self._latencies) < settings.embedding_hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = int(round(settings.embedding_hedge_percentile / 100 * (len(ordered) - 1)))
+        return ordered[index] / 1000
+
+    async def _create_embeddings(
+        self,
+        texts: List[str],
+        stats: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[List[float]]:
+        """
+        Embed a list of texts with the provider. With hedging enabled, a
+        request still running after the recent p95 latency gets a second
+        identical request; the first successful response wins and the other
+        is cancelled.
+        """
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self.provider.embed(texts, stats=stats, deadline=deadline)
+
+        primary = asyncio.ensure_future(self.provider.embed(texts, stats=stats, deadline=deadline))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        if stats is not None:
+            stats["hedged"] = True
+        hedge = asyncio.ensure_future(self.provider.embed(texts, deadline=deadline))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Both attempts failed; surface the original request's error
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def embed_text(
+        self, text: str, stats: Optional[Dict[str, Any]] = None
+    ) -> List[float]:
         """Generate embedding for a single text string"""
-        response = await self.client.embeddings.create(
-            model=self.model,
-            input=text,
-            dimensions=self.dimensions,
-        )
-        return response.data[0].embedding
-
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=10),
-    )
-    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a batch of texts"""
-        response = await self.client.embeddings.create(
-            model=self.model,
-            input=texts,
-            dimensions=self.dimensions,
-        )
-        return [item.embedding for item in response.data]
+        embeddings = await self.embed_batch([text], stats=stats)
+        return embeddings[0]
+
+    async def embed_batch(
+        self,
+        texts: List[str],
+        stats: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for a batch of texts.
+        Cached vectors are reused; only cache misses are sent to the API.
+        If ``stats`` is given it is filled with cache hits/misses, the
+        estimated API time saved and any rate-limit wait for this call.
+        Provider retries give up once they cannot finish before ``deadline``.
+        """
+        if self.cache is None:
+            return await self._fetch(texts, stats, deadline)
+
+        keys = [EmbeddingCache.make_key(self.model, self.dimensions, t) for t in texts]
+        cached = await self.cache.aget_many(keys)
+
+        # Deduplicate misses so repeated texts are only embedded once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = await self._fetch(list(missing.values()), stats, deadline)
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.aput_many(fresh)
+            cached.update(fresh)
+
+        if stats is not None:
+            hits = len(set(keys)) - len(missing)
+            stats["cache_hits"] = hits
+            stats["cache_misses"] = len(missing)
+            stats["ms_saved"] = round(self._avg_api_ms if hits and not missing else 0.0, 1)
+
+        return [cached[key] for key in keys]
+
+    async def _fetch(
+        self,
+        texts: List[str],
+        stats: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[List[float]]:
+        """Embed through the micro-batcher when enabled"""
+        if self.batcher is None:
+            return await self._timed_create(texts, stats, deadline)
+        return await self.batcher.embed(texts, stats, deadline)
+
+    async def _timed_create(
+        self,
+        texts: List[str],
+        stats: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[List[float]]:
+        start = time.time()
+        vectors = await self._create_embeddings(texts, stats, deadline)
+        elapsed = (time.time() - start) * 1000
+        self._api_calls += 1
+        self._latencies.append(elapsed)
+        self._avg_api_ms += (elapsed - self._avg_api_ms) / self._api_calls
+        return vectors
+
+    def cache_hit_rate(self) -> float:
+        """Lifetime hit rate of the embedding cache (0.0 when disabled)"""
+        return self.cache.hit_rate if self.cache else 0.0
 
     def embed_text_sync(self, text: str) -> List[float]:
         """Synchronous embedding for use in ingestion scripts"""
-        from openai import OpenAI
-
-        client = OpenAI(api_key=settings.openai_api_key)
-        response = client.embeddings.create(
-            model=self.model,
-            input=text,
-            dimensions=self.dimensions,
-        )
-        return response.data[0].embedding
+        return self.provider.embed_sync([text])[0]
 
     def embed_batch_sync(self, texts: List[str]) -> List[List[float]]:
-        """Synchronous batch embedding for use in ingestion scripts.
-        Handles token limits by truncating long texts and splitting into sub-batches."""
-        import tiktoken
-        from openai import OpenAI
-
-        client = OpenAI(api_key=settings.openai_api_key)
-
-        # Get encoder for token counting / truncation
-        try:
-            encoder = tiktoken.encoding_for_model(self.model)
-        except KeyError:
-            encoder = tiktoken.get_encoding("cl100k_base")
-
-        max_tokens_per_text = 8000  # Leave margin below 8191 limit
-
-        # Truncate any texts that exceed the token limit
-        safe_texts = []
-        for text in texts:
-            tokens = encoder.encode(text)
-            if len(tokens) > max_tokens_per_text:
-                safe_texts.append(encoder.decode(tokens[:max_tokens_per_text]))
-            else:
-                safe_texts.append(text)
-
-        # Process in sub-batches to avoid total token limits
-        all_embeddings = []
-        sub_batch_size = 20  # Smaller batches to stay within API limits
-        for i in range(0, len(safe_texts), sub_batch_size):
-            sub_batch = safe_texts[i:i + sub_batch_size]
-            response = client.embeddings.create(
-                model=self.model,
-                input=sub_batch,
-                dimensions=self.dimensions,
-            )
-            all_embeddings.extend([item.embedding for item in response.data])
+        """Synchronous batch embedding for use in ingestion scripts"""
+        return self.provider.embed_sync(texts)
 
-        return all_embeddings
+    def close(self):
+        self.provider.close()
+        if self.cache is not None:
+            self.cache.close()
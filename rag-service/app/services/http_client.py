@@ -0,0 +1,228 @@
+"""Process-wide pooled HTTP clients for OpenAI traffic"""
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+class PoolStats:
+    """In-flight request count against the pool's connection limit"""
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.in_use = 0
+        self.peak = 0
+        self.saturated_events = 0
+
+    def acquire(self):
+        self.in_use += 1
+        self.peak = max(self.peak, self.in_use)
+        if self.in_use > self.max_connections:
+            # Requests beyond the limit wait in httpx for a free connection
+            self.saturated_events += 1
+
+    def release(self):
+        self.in_use -= 1
+
+    @property
+    def saturation(self) -> float:
+        return self.in_use / self.max_connections if self.max_connections else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_use": self.in_use,
+            "peak": self.peak,
+            "max_connections": self.max_connections,
+            "saturation": round(self.saturation, 3),
+            "saturated_requests": self.saturated_events,
+        }
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that releases the pool slot once the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, stats: PoolStats):
+        self._stream = stream
+        self._stats = stats
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._stats.release()
+
+
+class _CountingTransport(httpx.AsyncHTTPTransport):
+    """Counts requests that hold a connection, from send until the body is closed"""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.acquire()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.stats.release()
+            raise
+        response.stream = _ReleasingStream(response.stream, self.stats)
+        return response
+
+
+def _http2_available() -> bool:
+    if not settings.http2_enabled:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry_seconds,
+    )
+
+
+def _timeout(read_seconds: float) -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=settings.http_connect_timeout_seconds,
+        read=read_seconds,
+        write=settings.http_connect_timeout_seconds,
+        pool=settings.http_pool_timeout_seconds,
+    )
+
+
+def _read_timeout(operation: str) -> float:
+    # Chat completions generate for a long time; embeddings should come
+    # back quickly or be retried
+    if operation == "chat":
+        return settings.chat_read_timeout_seconds
+    return settings.embedding_read_timeout_seconds
+
+
+pool_stats = PoolStats(settings.http_max_connections)
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[httpx.Client] = None
+_openai_clients: Dict[str, Any] = {}
+_openai_sync_clients: Dict[str, Any] = {}
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """The shared keep-alive connection pool used by every async OpenAI client"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        http2 = _http2_available()
+        _async_client = httpx.AsyncClient(
+            transport=_CountingTransport(pool_stats, http2=http2, limits=_limits()),
+            timeout=_timeout(settings.chat_read_timeout_seconds),
+        )
+        logger.info(
+            f"HTTP pool created: max_connections={settings.http_max_connections}, "
+            f"keepalive={settings.http_max_keepalive_connections}, http2={http2}"
+        )
+    return _async_client
+
+
+def get_sync_http_client() -> httpx.Client:
+    """Blocking counterpart for ingestion scripts, reused across calls"""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(
+            http2=_http2_available(),
+            limits=_limits(),
+            timeout=_timeout(settings.chat_read_timeout_seconds),
+        )
+    return _sync_client
+
+
+def openai_client(operation: str):
+    """
+    AsyncOpenAI client for ``operation`` ("chat" or "embedding") on the
+    shared pool, with that operation's timeouts. SDK retries are off
+    because callers retry through tenacity and the rate limiter.
+    """
+    if operation not in _openai_clients:
+        from openai import AsyncOpenAI
+
+        _openai_clients[operation] = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url or None,
+            http_client=get_async_http_client(),
+            timeout=_timeout(_read_timeout(operation)),
+            max_retries=0,
+        )
+    return _openai_clients[operation]
+
+
+def openai_sync_client(operation: str):
+    """
+    Blocking OpenAI client for ``operation`` on the shared sync pool.
+    Keeps the SDK's own retries: the ingestion path has no tenacity wrapper.
+    """
+    if operation not in _openai_sync_clients:
+        from openai import OpenAI
+
+        _openai_sync_clients[operation] = OpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url or None,
+            http_client=get_sync_http_client(),
+            timeout=_timeout(_read_timeout(operation)),
+        )
+    return _openai_sync_clients[operation]
+
+
+async def warm_up(connections: Optional[int] = None):
+    """
+    Open keep-alive connections (DNS, TCP and TLS) to the OpenAI endpoint
+    before the first request. The response status does not matter.
+    """
+    connections = settings.http_warm_connections if connections is None else connections
+    if connections <= 0:
+        return
+    client = get_async_http_client()
+    url = (settings.openai_base_url or DEFAULT_OPENAI_BASE_URL).rstrip("/") + "/models"
+    headers = {"Authorization": f"Bearer {settings.openai_api_key}"}
+
+    async def ping():
+        response = await client.get(url, headers=headers, timeout=_timeout(10.0))
+        await response.aclose()
+
+    results = await asyncio.gather(*(ping() for _ in range(connections)), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, Exception)]
+    if failures:
+        logger.warning(f"HTTP pool warm-up: {len(failures)}/{connections} failed: {failures[0]}")
+    else:
+        logger.info(f"HTTP pool warmed with {connections} connections to {url}")
+
+
+async def aclose():
+    """Close the shared pools (lifespan shutdown)"""
+    global _async_client, _sync_client
+    _openai_clients.clear()
+    _openai_sync_clients.clear()
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
@@ -0,0 +1,289 @@
+"""Durable SQLite-backed assessment job queue and async worker pool"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_COLUMNS = (
+    "id", "idempotency_key", "status", "request", "result", "error",
+    "attempts", "created_at", "started_at", "finished_at",
+)
+
+
+class JobQueue:
+    """
+    Assessment jobs persisted in SQLite (WAL mode) so they survive restarts.
+
+    Submissions with an idempotency key already present return the existing
+    job instead of enqueueing a duplicate. Finished jobs are deleted
+    ``result_ttl_seconds`` after completion. A job interrupted by
+    ``max_attempts`` shutdowns is failed rather than queued again.
+    Thread-safe.
+    """
+
+    def __init__(self, path: str, result_ttl_seconds: int = 86400, max_attempts: int = 3):
+        self.result_ttl_seconds = result_ttl_seconds
+        self.max_attempts = max(max_attempts, 1)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, "
+            "idempotency_key TEXT UNIQUE NOT NULL, "
+            "status TEXT NOT NULL, "
+            "request TEXT NOT NULL, "
+            "result TEXT, "
+            "error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, "
+            "started_at REAL, "
+            "finished_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        logger.info(f"Job queue persisted at {path}")
+
+    @staticmethod
+    def request_key(request: Dict[str, Any]) -> str:
+        """Default idempotency key: hash of the canonical request JSON"""
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _row(self, row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["request"] = json.loads(job["request"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _select(self, where: str, params: tuple) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE {where}", params
+        ).fetchone()
+        return self._row(row)
+
+    def _expired(self, job: Dict[str, Any]) -> bool:
+        """Finished longer ago than the result TTL; gone until purged"""
+        return bool(job["finished_at"]) and time.time() - job["finished_at"] > self.result_ttl_seconds
+
+    def submit(
+        self,
+        request: Dict[str, Any],
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Enqueue a job, or return the job already holding this idempotency key.
+        A previously failed job with the same key, or one whose result has
+        expired, is queued again. Returns (job, created).
+        """
+        key = idempotency_key or self.request_key(request)
+        now = time.time()
+        with self._lock:
+            existing = self._select("idempotency_key = ?", (key,))
+            if existing is not None:
+                if existing["status"] != FAILED and not self._expired(existing):
+                    return existing, False
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, request = ?, result = NULL, error = NULL, "
+                    "attempts = 0, created_at = ?, started_at = NULL, finished_at = NULL "
+                    "WHERE id = ?",
+                    (QUEUED, json.dumps(request), now, existing["id"]),
+                )
+                return self._select("id = ?", (existing["id"],)), True
+
+            job_id = uuid.uuid4().hex
+            self._db.execute(
+                "INSERT INTO jobs (id, idempotency_key, status, request, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job_id, key, QUEUED, json.dumps(request), now),
+            )
+            return self._select("id = ?", (job_id,)), True
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running and return it"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                    (QUEUED,),
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    (RUNNING, time.time(), row[0]),
+                )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+            return self._select("id = ?", (row[0],))
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                (SUCCEEDED, json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a job; expired results are treated as gone"""
+        with self._lock:
+            job = self._select("id = ?", (job_id,))
+        if job and self._expired(job):
+            return None
+        return job
+
+    def requeue_running(self) -> int:
+        """
+        Return jobs left running by a previous process to the queue (call at
+        startup). Jobs already claimed ``max_attempts`` times are failed
+        instead, so one that crashes the process cannot loop forever.
+        """
+        with self._lock:
+            failed = self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE status = ? AND attempts >= ?",
+                (
+                    FAILED,
+                    f"RAG assessment failed: interrupted {self.max_attempts} times",
+                    time.time(),
+                    RUNNING,
+                    self.max_attempts,
+                ),
+            ).rowcount
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?",
+                (QUEUED, RUNNING),
+            )
+        if failed:
+            logger.warning(f"Failed {failed} jobs interrupted {self.max_attempts} times")
+        return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """Delete finished jobs older than the result TTL"""
+        cutoff = time.time() - self.result_ttl_seconds
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (SUCCEEDED, FAILED, cutoff),
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobWorkerPool:
+    """
+    Async workers that claim queued jobs and run them through the RAG pipeline.
+    Workers sleep until a submission wakes them or the poll interval passes.
+    Queue reads and writes run in worker threads, off the event loop.
+    """
+
+    def __init__(self, queue: JobQueue, pipeline, workers: int = 4, poll_interval: float = 1.0):
+        self.queue = queue
+        self.pipeline = pipeline
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._last_purge = 0.0
+
+    def start(self):
+        recovered = self.queue.requeue_running()
+        if recovered:
+            logger.info(f"Re-queued {recovered} jobs interrupted by the previous shutdown")
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Job worker pool started with {self.workers} workers")
+
+    def notify(self):
+        """Wake idle workers after a submission"""
+        self._wake.set()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, number: int):
+        while True:
+            await self._maybe_purge()
+            # Cleared before claiming so a submission made meanwhile still wakes us
+            self._wake.clear()
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        start = time.time()
+        try:
+            result = await self.pipeline.assess(**job["request"])
+        except asyncio.CancelledError:
+            # Left as running; re-queued at the next startup
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {e}", exc_info=True)
+            await asyncio.to_thread(self.queue.fail, job["id"], f"RAG assessment failed: {str(e)}")
+            return
+
+        await asyncio.to_thread(self.queue.complete, job["id"], {
+            "assessment": result["assessment"],
+            "sources": result["sources"],
+            "usage": result["usage"],
+            "metrics": result["pipeline_metrics"],
+            "cached": result.get("cached", False),
+        })
+        logger.info(f"Job {job['id']} completed in {(time.time() - start) * 1000:.0f}ms")
+
+    async def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        purged = await asyncio.to_thread(self.queue.purge_expired)
+        if purged:
+            logger.info(f"Purged {purged} expired jobs")
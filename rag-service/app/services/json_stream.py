@@ -0,0 +1,113 @@
+"""Incremental parser that yields top-level JSON object fields as they complete"""
+import json
+from typing import Any, List, Tuple
+
+_WHITESPACE = " \t\r\n"
+
+
+class TopLevelFieldParser:
+    """
+    Consumes a JSON object in arbitrary text fragments (e.g. streamed LLM
+    output) and returns each top-level ``key: value`` pair once its value is
+    fully received.
+
+    Only string/escape state and nesting depth are tracked character by
+    character; each completed value is decoded with ``json.loads`` once.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key: List[str] = []
+        self._value: List[str] = []
+        # expect_key -> in_key -> expect_colon -> in_value -> (expect_key | done)
+        self._state = "start"
+        self.emitted: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consume a fragment; return the fields completed by it, in order"""
+        self._buffer.append(text)
+        completed: List[Tuple[str, Any]] = []
+
+        for ch in text:
+            state = self._state
+            if state == "done":
+                break
+
+            if state == "start":
+                if ch == "{":
+                    self._state = "expect_key"
+                continue
+
+            if state == "expect_key":
+                if ch == '"':
+                    self._state = "in_key"
+                    self._key = []
+                elif ch == "}":
+                    self._state = "done"
+                continue
+
+            if state == "in_key":
+                if self._escaped:
+                    self._escaped = False
+                    self._key.append(ch)
+                elif ch == "\\":
+                    self._escaped = True
+                    self._key.append(ch)
+                elif ch == '"':
+                    self._state = "expect_colon"
+                else:
+                    self._key.append(ch)
+                continue
+
+            if state == "expect_colon":
+                if ch == ":":
+                    self._state = "in_value"
+                    self._value = []
+                    self._depth = 0
+                continue
+
+            # in_value
+            if self._in_string:
+                self._value.append(ch)
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 0 and ch in ",}":
+                completed.append(self._finish_value())
+                self._state = "expect_key" if ch == "," else "done"
+                continue
+
+            if not self._value and ch in _WHITESPACE:
+                continue
+            self._value.append(ch)
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+
+        return completed
+
+    def _finish_value(self) -> Tuple[str, Any]:
+        key = json.loads('"' + "".join(self._key) + '"')
+        value = json.loads("".join(self._value).rstrip(_WHITESPACE))
+        self.emitted.append(key)
+        return key, value
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return "".join(self._buffer)
@@ -1,24 +1,30 @@
 """OpenAI LLM service for clinical assessment generation"""
 import json
-from openai import AsyncOpenAI
-from typing import Dict, Any, Optional
+from openai import RateLimitError
+from typing import AsyncIterator, Dict, Any, List, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential
 import tiktoken
 
 from app.config.settings import settings
+from app.services.deadline import Deadline, stop_before_deadline
+from app.services.http_client import openai_client
+from app.services.rate_limiter import get_limiter
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+_RETRY_WAIT = wait_exponential(multiplier=1, min=2, max=15)
+
 
 class LLMService:
     """Handles OpenAI chat completion calls with structured output"""
 
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        self.client = openai_client("chat")
         self.model = settings.openai_model
         self.max_tokens = settings.max_completion_tokens
         self.temperature = settings.temperature
+        self.limiter = get_limiter("chat", self.model)
         self._encoder = None
 
     @property
@@ -44,18 +50,57 @@ class LLMService:
         return self.encoder.decode(truncated_tokens)
 
     @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=15),
+        stop=stop_after_attempt(3) | stop_before_deadline(_RETRY_WAIT),
+        wait=_RETRY_WAIT,
     )
+    async def _create(
+        self,
+        kwargs: Dict[str, Any],
+        reserved: int,
+        waits: List[float],
+        deadline: Optional[Deadline] = None,
+    ):
+        """
+        One chat completion call through the shared rate limiter. Every
+        attempt, retries included, waits for ``reserved`` tokens of quota;
+        the time spent waiting is appended to ``waits``. With a ``deadline`` a retry is only made
+        if it can still finish in time, and each attempt's HTTP timeout is
+        capped at the time remaining.
+        """
+        if self.limiter is not None:
+            waits.append(await self.limiter.acquire(reserved))
+        if deadline is not None:
+            kwargs = {**kwargs, "timeout": max(deadline.remaining(), 0.001)}
+        try:
+            raw = await self.client.chat.completions.with_raw_response.create(**kwargs)
+        except RateLimitError as e:
+            if self.limiter is not None:
+                self.limiter.on_rate_limited(e.response.headers)
+            raise
+        if self.limiter is not None:
+            self.limiter.observe_headers(raw.headers)
+        return raw.parse()
+
+    def _reservation(self, input_tokens: int) -> int:
+        """
+        Tokens to reserve for one call. Providers count ``max_tokens`` against
+        the TPM limit up front, so the prompt alone would under-reserve.
+        """
+        return input_tokens + self.max_tokens
+
     async def generate_assessment(
         self,
         system_prompt: str,
         user_prompt: str,
         response_format: Optional[Dict[str, Any]] = None,
+        input_tokens: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
     ) -> Dict[str, Any]:
         """
         Generate a clinical assessment using the LLM.
         Returns parsed JSON response.
+        Pass ``input_tokens`` when the caller already estimated the prompt size
+        to skip re-encoding it here.
         """
         messages = [
             {"role": "system", "content": system_prompt},
@@ -63,8 +108,8 @@ class LLMService:
         ]
 
         # Log token usage estimate
-        total_input = system_prompt + user_prompt
-        input_tokens = self.count_tokens(total_input)
+        if input_tokens is None:
+            input_tokens = self.count_tokens(system_prompt + user_prompt)
         logger.info(
             f"LLM call: model={self.model}, input_tokens≈{input_tokens}, "
             f"max_output={self.max_tokens}"
@@ -78,10 +123,14 @@ class LLMService:
             "response_format": {"type": "json_object"},
         }
 
-        response = await self.client.chat.completions.create(**kwargs)
+        waits: List[float] = []
+        reserved = self._reservation(input_tokens)
+        response = await self._create(kwargs, reserved, waits, deadline=deadline)
 
         content = response.choices[0].message.content
         usage = response.usage
+        if self.limiter is not None:
+            self.limiter.reconcile(reserved, usage.total_tokens)
 
         logger.info(
             f"LLM response: prompt_tokens={usage.prompt_tokens}, "
@@ -89,22 +138,126 @@ class LLMService:
             f"total_tokens={usage.total_tokens}"
         )
 
+        parsed = self.parse_content(content)
+
+        return {
+            "result": parsed,
+            "usage": self._usage_dict(usage),
+            "rate_limit_wait_ms": round(sum(waits), 1),
+        }
+
+    def _usage_dict(self, usage) -> Dict[str, Any]:
+        """API usage as a TokenUsage dict, including prompt tokens served from the provider's prefix cache"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+            "cached_prompt_tokens": getattr(details, "cached_tokens", None) or 0,
+            "model": self.model,
+        }
+
+    def parse_content(self, content: str) -> Dict[str, Any]:
+        """Parse the model's JSON output, keeping raw text as the narrative on failure"""
         try:
-            parsed = json.loads(content)
+            return json.loads(content)
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse LLM JSON response: {e}")
             logger.error(f"Raw content: {content[:500]}")
-            parsed = {
+            return {
                 "clinical_narrative": content,
                 "parse_error": True,
             }
 
-        return {
-            "result": parsed,
-            "usage": {
-                "prompt_tokens": usage.prompt_tokens,
-                "completion_tokens": usage.completion_tokens,
-                "total_tokens": usage.total_tokens,
+    async def _open_stream(
+        self,
+        messages,
+        reserved: int,
+        waits: List[float],
+        deadline: Optional[Deadline] = None,
+    ):
+        # Only opening the stream is retried; a stream that fails midway
+        # cannot be resumed without re-sending already-emitted fields
+        return await self._create(
+            {
                 "model": self.model,
+                "messages": messages,
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "response_format": {"type": "json_object"},
+                "stream": True,
+                "stream_options": {"include_usage": True},
             },
-        }
+            reserved,
+            waits,
+            deadline=deadline,
+        )
+
+    async def stream_assessment(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        input_tokens: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a clinical assessment. Yields ``{"rate_limit_wait_ms": ...}``
+        once the stream is open, ``{"content": <text fragment>}`` for each
+        delta, then a final ``{"usage": {...}}``.
+        """
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        if input_tokens is None:
+            input_tokens = self.count_tokens(system_prompt + user_prompt)
+        logger.info(
+            f"LLM stream: model={self.model}, input_tokens≈{input_tokens}, "
+            f"max_output={self.max_tokens}"
+        )
+
+        waits: List[float] = []
+        reserved = self._reservation(input_tokens)
+        stream = await self._open_stream(messages, reserved, waits, deadline=deadline)
+        completion: List[str] = []
+        reconciled = False
+        try:
+            yield {"rate_limit_wait_ms": round(sum(waits), 1)}
+            usage = None
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        completion.append(delta)
+                        yield {"content": delta}
+
+            if usage is None:
+                logger.warning("LLM stream ended without usage; reporting the prompt estimate")
+                yield {"usage": {
+                    "prompt_tokens": input_tokens,
+                    "completion_tokens": 0,
+                    "total_tokens": input_tokens,
+                    "cached_prompt_tokens": 0,
+                    "model": self.model,
+                }}
+                return
+
+            if self.limiter is not None:
+                self.limiter.reconcile(reserved, usage.total_tokens)
+            reconciled = True
+            logger.info(
+                f"LLM stream complete: prompt_tokens={usage.prompt_tokens}, "
+                f"completion_tokens={usage.completion_tokens}, "
+                f"total_tokens={usage.total_tokens}"
+            )
+            yield {"usage": self._usage_dict(usage)}
+        finally:
+            if not reconciled:
+                # Failed, cut short by the caller (client disconnect, deadline) or
+                # no usage chunk: charge the prompt and what was generated so far
+                # instead of holding the whole max_tokens reservation
+                if self.limiter is not None:
+                    self.limiter.reconcile(reserved, input_tokens + self.count_tokens("".join(completion)))
+                await stream.close()
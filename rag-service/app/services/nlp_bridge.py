@@ -0,0 +1,208 @@
+"""In-process symptom extraction using the NLP service's SymptomExtractor"""
+import asyncio
+import builtins
+import importlib
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# The NLP service's ``app`` package is imported under this name
+NLP_PACKAGE = "nlp_service_app"
+
+_import_lock = threading.Lock()
+
+
+def _nlp_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """``__import__`` for NLP modules: their absolute ``app.*`` imports resolve to NLP_PACKAGE"""
+    if level == 0 and (name == "app" or name.startswith("app.")):
+        name = NLP_PACKAGE + name[len("app"):]
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+
+_NLP_BUILTINS = {**vars(builtins), "__import__": _nlp_import}
+
+
+class _NLPLoader(importlib.machinery.SourceFileLoader):
+    def exec_module(self, module):
+        # Scoped to the NLP modules' own globals; nothing else sees the remapping
+        module.__builtins__ = _NLP_BUILTINS
+        super().exec_module(module)
+
+
+class _NLPFinder(importlib.abc.MetaPathFinder):
+    """Finds NLP_PACKAGE and its submodules in the NLP service's ``app`` directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname != NLP_PACKAGE and not fullname.startswith(NLP_PACKAGE + "."):
+            return None
+        location = os.path.join(self.root, *fullname.split(".")[1:])
+        if os.path.isfile(os.path.join(location, "__init__.py")):
+            filename = os.path.join(location, "__init__.py")
+            return importlib.util.spec_from_file_location(
+                fullname, filename,
+                loader=_NLPLoader(fullname, filename),
+                submodule_search_locations=[location],
+            )
+        if os.path.isfile(location + ".py"):
+            filename = location + ".py"
+            return importlib.util.spec_from_file_location(
+                fullname, filename, loader=_NLPLoader(fullname, filename)
+            )
+        return None
+
+
+def _load_nlp_modules(nlp_service_path: str) -> Dict[str, Any]:
+    """
+    Import the NLP service's extractor without clashing with this service's
+    own ``app`` package.
+
+    Both services ship a top-level package named ``app``. The NLP one is
+    imported as NLP_PACKAGE by a meta path finder, and its modules get an
+    ``__import__`` that maps their ``app.*`` imports onto it. This
+    service's ``sys.modules`` entries are never touched, so concurrent
+    imports are unaffected.
+    """
+    path = os.path.abspath(nlp_service_path)
+    root = os.path.join(path, "app")
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"NLP service source not found at '{path}'")
+
+    with _import_lock:
+        if NLP_PACKAGE not in sys.modules:
+            # Ahead of PathFinder, which would otherwise load submodules via the package __path__
+            sys.meta_path.insert(0, _NLPFinder(root))
+        extractor = importlib.import_module(f"{NLP_PACKAGE}.services.symptom_extractor")
+
+    return {"SymptomExtractor": extractor.SymptomExtractor}
+
+
+def load_criteria(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    DSM-5 criterion table (code -> id, name, ...) shared with the backend's
+    mdd-criteria.js, so symptoms carry the same names on both paths.
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def to_pipeline_inputs(nlp_result: Dict[str, Any], criteria: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Map NLP service output (``/nlp/extract-symptoms`` data or raw extractor
+    output) to the symptoms/metadata format RAGPipeline receives from the
+    backend: one entry per DSM-5 criterion in ``criteria``, detected or not,
+    named as in the backend's criterion table.
+    """
+    detected = {s["symptom_id"]: s for s in nlp_result["symptoms"]}
+
+    symptoms: List[Dict[str, Any]] = []
+    for code, criterion in criteria.items():
+        match = detected.get(criterion["id"])
+        if match:
+            symptoms.append({
+                "dsm5Code": code,
+                "symptomId": criterion["id"],
+                "name": criterion["name"],
+                "detected": True,
+                "confidence": match["confidence"],
+                "evidence": match["matched_phrases"],
+                "sentenceContext": match["sentence_context"],
+                "matchType": match["match_type"],
+            })
+        else:
+            symptoms.append({
+                "dsm5Code": code,
+                "symptomId": criterion["id"],
+                "name": criterion["name"],
+                "detected": False,
+                "confidence": 0.0,
+                "evidence": [],
+                "sentenceContext": None,
+                "matchType": None,
+            })
+
+    nlp_metadata = nlp_result["metadata"]
+    metadata = {
+        "durationDays": nlp_metadata["duration_days"],
+        "durationSpecified": nlp_metadata["duration_days"] > 0,
+        "functionalImpairment": nlp_metadata.get("functional_impairment"),
+        "processingTime": nlp_metadata.get("processing_time_ms"),
+    }
+
+    return {"symptoms": symptoms, "metadata": metadata}
+
+
+class InProcessNLPService:
+    """
+    Runs the NLP service's SymptomExtractor inside the RAG service process.
+
+    All requests share one bounded thread pool, so spaCy work never blocks the
+    event loop and concurrency stays capped regardless of request volume.
+    Output is converted to the same symptom/metadata shape the backend sends
+    to /rag/query, so it can be fed straight into RAGPipeline.assess.
+    """
+
+    def __init__(self):
+        self._extractor = None
+        self._criteria: Dict[str, Dict[str, Any]] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.nlp_inprocess_workers,
+            thread_name_prefix="nlp",
+        )
+
+    def load(self):
+        """Import the extractor and load the spaCy model (blocking, call at startup)"""
+        import spacy
+
+        self._criteria = load_criteria(settings.nlp_criteria_path)
+        modules = _load_nlp_modules(settings.nlp_service_path)
+        nlp_model = spacy.load(settings.nlp_spacy_model)
+        self._extractor = modules["SymptomExtractor"](nlp_model)
+        logger.info(
+            f"In-process NLP ready (spaCy model '{settings.nlp_spacy_model}', "
+            f"{settings.nlp_inprocess_workers} workers)"
+        )
+
+    def is_ready(self) -> bool:
+        return self._extractor is not None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _extract_sync(self, text: str) -> Dict[str, Any]:
+        result = self._extractor.extract(text)
+        summary = self._extractor.get_symptom_summary(result)
+        return {
+            "symptoms": result["symptoms"],
+            "metadata": result["metadata"],
+            "summary": summary,
+        }
+
+    async def extract(self, text: str) -> Dict[str, Any]:
+        """Extract symptoms on the shared worker pool"""
+        if self._extractor is None:
+            raise RuntimeError("In-process NLP is not loaded")
+
+        start = time.time()
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._executor, self._extract_sync, text)
+        result["metadata"]["processing_time_ms"] = round((time.time() - start) * 1000, 2)
+        return result
+
+    def to_pipeline_inputs(self, nlp_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Map raw extractor output to the backend's /rag/query symptoms/metadata format"""
+        return to_pipeline_inputs(nlp_result, self._criteria)
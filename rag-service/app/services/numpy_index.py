@@ -0,0 +1,260 @@
+"""In-memory NumPy exact-search index over the ChromaDB collection"""
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+EMPTY_RESULT = {"documents": [], "metadatas": [], "distances": [], "ids": []}
+
+
+class UnsupportedFilterError(ValueError):
+    """Raised when a where-filter uses an operator the NumPy index cannot evaluate"""
+
+
+class NumpyIndex:
+    """
+    Exact cosine search over all collection embeddings held in RAM.
+
+    A DSM-5-TR ingestion is a few thousand 1536-d chunks, so a single float32
+    matrix fits comfortably in memory. One matrix-vector product plus an
+    ``argpartition`` top-k beats a round trip through HNSW and SQLite.
+    Metadata is stored column-wise so ``where`` filters become vectorised
+    boolean masks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.matrix: Optional[np.ndarray] = None  # (n, d) float32, L2-normalised rows
+        self.ids: Optional[np.ndarray] = None
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.columns: Dict[str, np.ndarray] = {}
+        self.id_to_row: Dict[str, int] = {}
+
+    @property
+    def size(self) -> int:
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def load(self, collection, page_size: int = 1000) -> int:
+        """Load every embedding, ID, document and metadata row from a Chroma collection"""
+        ids: List[str] = []
+        documents: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        vectors: List[np.ndarray] = []
+
+        total = collection.count()
+        for offset in range(0, total, page_size):
+            page = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=page_size,
+                offset=offset,
+            )
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(m or {} for m in page["metadatas"])
+            vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+
+        self.build(ids, documents, metadatas, vectors)
+        logger.info(f"NumPy index loaded: {self.size} vectors")
+        return self.size
+
+    def build(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        vectors: List[np.ndarray],
+    ):
+        """Build the index from already-fetched rows"""
+        if vectors:
+            matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        else:
+            matrix = None
+
+        keys = set()
+        for meta in metadatas:
+            keys.update(meta.keys())
+        columns = {
+            key: np.array([meta.get(key) for meta in metadatas], dtype=object)
+            for key in keys
+        }
+
+        with self._lock:
+            self.matrix = matrix
+            self.ids = np.array(ids, dtype=object)
+            self.documents = documents
+            self.metadatas = metadatas
+            self.columns = columns
+            self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    # --- Filtering ---
+
+    def _column(self, key: str) -> np.ndarray:
+        column = self.columns.get(key)
+        if column is None:
+            return np.full(self.size, None, dtype=object)
+        return column
+
+    def _mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Evaluate a Chroma-style where clause into a boolean row mask"""
+        mask = np.ones(self.size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(self.size, dtype=bool)
+                for clause in condition:
+                    any_mask |= self._mask(clause)
+                mask &= any_mask
+            elif isinstance(condition, dict):
+                for op, value in condition.items():
+                    mask &= self._compare(self._column(key), op, value)
+            else:
+                mask &= self._column(key) == condition
+        return mask
+
+    @staticmethod
+    def _compare(column: np.ndarray, op: str, value: Any) -> np.ndarray:
+        if op == "$eq":
+            return column == value
+        if op == "$ne":
+            return column != value
+        if op == "$in":
+            return np.isin(column, list(value))
+        if op == "$nin":
+            return ~np.isin(column, list(value))
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            numeric = np.array(
+                [v if isinstance(v, (int, float)) else np.nan for v in column],
+                dtype=np.float64,
+            )
+            with np.errstate(invalid="ignore"):
+                if op == "$gt":
+                    return numeric > value
+                if op == "$gte":
+                    return numeric >= value
+                if op == "$lt":
+                    return numeric < value
+                return numeric <= value
+        raise UnsupportedFilterError(f"Unsupported where operator: {op}")
+
+    # --- Search ---
+
+    def query(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Exact top-k cosine search. Returns the same flattened shape as
+        RetrievalService.query, with cosine distances (1 - similarity).
+        """
+        return self.query_batch([query_embedding], top_k, where)[0]
+
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        ``query`` for many embeddings sharing one ``where``: the filter is
+        evaluated once and every query is scored in one matrix-matrix product.
+        """
+        with self._lock:
+            matrix, ids = self.matrix, self.ids
+            documents, metadatas = self.documents, self.metadatas
+
+            if matrix is None or top_k <= 0 or not query_embeddings:
+                return [dict(EMPTY_RESULT) for _ in query_embeddings]
+
+            if where:
+                rows = np.flatnonzero(self._mask(where))
+                if rows.size == 0:
+                    return [dict(EMPTY_RESULT) for _ in query_embeddings]
+                matrix = matrix[rows]
+            else:
+                rows = np.arange(matrix.shape[0])
+
+            scores = matrix @ self._normalize_queries(query_embeddings).T
+
+        return [
+            self._top_k(scores[:, i], rows, top_k, ids, documents, metadatas)
+            for i in range(scores.shape[1])
+        ]
+
+    @staticmethod
+    def _normalize_queries(query_embeddings: List[List[float]]) -> np.ndarray:
+        """(q, d) float32 matrix of unit-length query vectors"""
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return queries / norms
+
+    def lookup(
+        self,
+        chunk_ids: List[str],
+        query_embedding: List[float],
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, tuple]:
+        """
+        Fetch specific chunks by ID, keeping only those matching ``where``.
+        Returns id -> (document, metadata, cosine distance to the query).
+        """
+        with self._lock:
+            rows = np.array(
+                [self.id_to_row[i] for i in chunk_ids if i in self.id_to_row],
+                dtype=np.int64,
+            )
+            if rows.size == 0 or self.matrix is None:
+                return {}
+            if where:
+                rows = rows[self._mask(where)[rows]]
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+            distances = 1.0 - self.matrix[rows] @ query
+
+            return {
+                self.ids[row]: (self.documents[row], self.metadatas[row], float(dist))
+                for row, dist in zip(rows, distances)
+            }
+
+    def vectors_for(self, chunk_ids: List[str]) -> np.ndarray:
+        """Normalised embeddings for the given chunk IDs, in the same order"""
+        with self._lock:
+            rows = [self.id_to_row[i] for i in chunk_ids]
+            return self.matrix[rows]
+
+    @staticmethod
+    def _top_k(
+        scores: np.ndarray,
+        rows: np.ndarray,
+        top_k: int,
+        ids: np.ndarray,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Pick the top_k highest-scoring candidate rows, best first"""
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(k)
+        top = top[np.argsort(-scores[top])]
+        picked = rows[top]
+
+        return {
+            "documents": [documents[i] for i in picked],
+            "metadatas": [metadatas[i] for i in picked],
+            "distances": (1.0 - scores[top]).astype(float).tolist(),
+            "ids": [ids[i] for i in picked],
+        }
@@ -0,0 +1,102 @@
+"""Per-disorder partitioned variant of the in-memory NumPy index"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services.code_hierarchy import CodeHierarchy, normalize_code
+from app.services.numpy_index import NumpyIndex, EMPTY_RESULT
+
+
+class PartitionedIndex(NumpyIndex):
+    """
+    NumPy index split into one contiguous sub-matrix per ``disorder_code``.
+
+    Filters on ``disorder_code`` (``$eq`` / ``$in``) or ``disorder_name`` are
+    resolved to a set of partitions and only those rows are scored; any other
+    where clauses are applied as masks within the selected partitions.
+    Unfiltered queries fall through to the full-matrix search.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.hierarchy = CodeHierarchy([])
+        # code -> (row indices into the full arrays, contiguous sub-matrix)
+        self.partitions: Dict[str, tuple] = {}
+
+    def build(self, ids, documents, metadatas, vectors):
+        super().build(ids, documents, metadatas, vectors)
+
+        codes = np.array(
+            [normalize_code(m.get("disorder_code", "") or "") for m in metadatas],
+            dtype=object,
+        )
+        partitions = {}
+        if self.matrix is not None:
+            for code in set(codes.tolist()):
+                rows = np.flatnonzero(codes == code)
+                partitions[code] = (rows, np.ascontiguousarray(self.matrix[rows]))
+
+        with self._lock:
+            self.hierarchy = CodeHierarchy.from_metadatas(metadatas)
+            self.partitions = partitions
+
+    def _partition_codes(self, where: Dict[str, Any]) -> Tuple[Optional[Set[str]], Set[str]]:
+        """
+        Extract the disorder partition selection from a where clause.
+        Returns (selected codes or None, where-keys consumed by the selection).
+        """
+        selected: Optional[Set[str]] = None
+        consumed: Set[str] = set()
+
+        condition = where.get("disorder_code")
+        if isinstance(condition, dict) and set(condition) == {"$in"}:
+            selected = {normalize_code(c) for c in condition["$in"]}
+        elif isinstance(condition, dict) and set(condition) == {"$eq"}:
+            selected = {normalize_code(condition["$eq"])}
+        elif isinstance(condition, str):
+            selected = {normalize_code(condition)}
+        if selected is not None:
+            consumed.add("disorder_code")
+
+        name = where.get("disorder_name")
+        if isinstance(name, str):
+            by_name = self.hierarchy.resolve_name(name)
+            selected = by_name if selected is None else selected & by_name
+            consumed.add("disorder_name")
+
+        return selected, consumed
+
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        selected, consumed = self._partition_codes(where) if where else (None, set())
+        if selected is None:
+            return super().query_batch(query_embeddings, top_k, where)
+
+        remaining = {key: value for key, value in where.items() if key not in consumed}
+        empty = [dict(EMPTY_RESULT) for _ in query_embeddings]
+
+        with self._lock:
+            parts = [self.partitions[c] for c in selected if c in self.partitions]
+            if not parts or top_k <= 0 or not query_embeddings:
+                return empty
+
+            queries = self._normalize_queries(query_embeddings).T
+            rows = np.concatenate([p[0] for p in parts])
+            scores = np.concatenate([p[1] @ queries for p in parts])
+
+            if remaining:
+                keep = self._mask(remaining)[rows]
+                rows, scores = rows[keep], scores[keep]
+                if rows.size == 0:
+                    return empty
+
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+
+        return [
+            self._top_k(scores[:, i], rows, top_k, ids, documents, metadatas)
+            for i in range(scores.shape[1])
+        ]
@@ -1,16 +1,45 @@
 """RAG pipeline orchestrator — ties together embedding, retrieval, and LLM services"""
+import asyncio
+import hashlib
+import json
 import time
-from typing import Dict, Any, Optional, List
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, Any, Optional, List, Set, Tuple
 
 from app.services.embedding_service import EmbeddingService
 from app.services.retrieval_service import RetrievalService
 from app.services.llm_service import LLMService
-from app.prompts.system_prompt import CLINICAL_SYSTEM_PROMPT
-from app.prompts.query_templates import build_assessment_prompt, build_retrieval_query
+from app.services.assessment_cache import AssessmentCache
+from app.services.context_selection import select_context
+from app.services.chunk_merge import merge_adjacent_chunks
+from app.services.context_packer import ContextPacker
+from app.services.sentence_index import compress_context
+from app.services.json_stream import TopLevelFieldParser
+from app.services.http_client import pool_stats
+from app.services.deadline import Deadline, DeadlineExceeded, within
+from app.services.criterion_table import (
+    CRITERION_QUERIES,
+    CriterionTable,
+    fetch_criteria_rows,
+    index_signature,
+    table_path,
+)
+from app.prompts.system_prompt import CLINICAL_SYSTEM_PROMPT, CLINICAL_SYSTEM_PROMPT_VERSION
+from app.prompts.query_templates import (
+    build_assessment_prompt,
+    build_core_criteria_block,
+    build_retrieval_query,
+    build_retrieval_subqueries,
+)
+from app.config.settings import settings
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Backoff between failed background criterion table rebuilds, doubling per failure
+_CRITERION_RETRY_SECONDS = 30.0
+_CRITERION_RETRY_MAX_SECONDS = 600.0
+
 
 class RAGPipeline:
     """Orchestrates the full RAG pipeline: embed → retrieve → augment → generate"""
@@ -18,7 +47,76 @@ class RAGPipeline:
     def __init__(self):
         self.embedding_service = EmbeddingService()
         self.retrieval_service = RetrievalService()
+        self.retrieval_service.embedding_identity = self.embedding_service.identity
         self.llm_service = LLMService()
+        self.context_packer = ContextPacker(self.llm_service)
+        # Optional in-process symptom extractor, attached at startup when enabled
+        self.nlp_service = None
+
+        self.assessment_cache: Optional[AssessmentCache] = None
+        if settings.assessment_cache_enabled:
+            self.assessment_cache = AssessmentCache(
+                ttl_seconds=settings.assessment_cache_ttl_seconds,
+                max_entries=settings.assessment_cache_max_entries,
+                semantic_enabled=settings.semantic_cache_enabled,
+                semantic_ttl_seconds=settings.semantic_cache_ttl_seconds,
+                semantic_max_distance=settings.semantic_cache_max_distance,
+            )
+            self.retrieval_service.on_index_change(self.assessment_cache.invalidate)
+
+        # Precomputed criterion -> criteria-chunk table, rebuilt after index changes
+        self._criterion_table: Optional[CriterionTable] = None
+        self._criterion_task: Optional[asyncio.Task] = None
+        self._criterion_failures = 0
+        self._criterion_retry_at = 0.0
+        if settings.criterion_pinning_enabled or settings.prompt_cache_layout:
+            self.retrieval_service.on_index_change(self._invalidate_criterion_table)
+        # (criterion table, core criteria block, core chunk IDs) for the
+        # cache-friendly prompt layout, rebuilt when the table changes
+        self._core: Optional[Tuple[Optional[CriterionTable], str, Set[str]]] = None
+
+        # Single-flight: identical concurrent assessments share one pipeline run
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced_calls = 0
+
+    async def assess_text(
+        self,
+        patient_text: str,
+        retrieval_filter: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run in-process NLP symptom extraction, then the RAG pipeline, in one call.
+
+        Saves the backend's separate NLP round trip and the JSON encode/decode
+        of the symptom payload. The NLP phase is reported as ``nlp_ms`` in
+        ``pipeline_metrics`` and included in ``total_ms``.
+        """
+        if self.nlp_service is None or not self.nlp_service.is_ready():
+            raise RuntimeError("In-process NLP is not enabled")
+
+        nlp_start = time.time()
+        nlp_result = await self.nlp_service.extract(patient_text)
+        inputs = self.nlp_service.to_pipeline_inputs(nlp_result)
+        nlp_time = (time.time() - nlp_start) * 1000
+        logger.info(
+            f"In-process NLP extracted {nlp_result['summary']['unique_symptoms']} "
+            f"symptoms in {nlp_time:.0f}ms"
+        )
+
+        result = await self.assess(
+            patient_text=patient_text,
+            symptoms=inputs["symptoms"],
+            metadata=inputs["metadata"],
+            retrieval_filter=retrieval_filter,
+            deadline=deadline,
+        )
+
+        metrics = result["pipeline_metrics"]
+        metrics["nlp_ms"] = round(nlp_time, 1)
+        metrics["total_ms"] = round(metrics["total_ms"] + nlp_time, 1)
+        result["nlp"] = nlp_result
+        return result
 
     async def assess(
         self,
@@ -26,37 +124,432 @@ class RAGPipeline:
         symptoms: Optional[List[Dict[str, Any]]] = None,
         metadata: Optional[Dict[str, Any]] = None,
         retrieval_filter: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
     ) -> Dict[str, Any]:
         """
         Run the full RAG-powered clinical assessment pipeline.
 
+        A request identical to one still in flight (same canonical text,
+        symptoms, metadata and filter) waits for that run instead of starting
+        its own. The run belongs to no single caller: cancelling a waiter
+        leaves it running for the others. It keeps the deadline of the
+        request that started it; a waiter gives up at its own deadline.
+
         Args:
             patient_text: The original patient presentation text
             symptoms: NLP-detected symptoms (from the NLP service)
             metadata: Additional context (duration, functional impairment, etc.)
             retrieval_filter: Optional ChromaDB where filter for targeted retrieval
+            deadline: Optional caller deadline; stages are cancelled with
+                DeadlineExceeded once their share of the time runs out
 
         Returns:
             Complete assessment result with AI narrative, references, and usage stats
         """
+        if not settings.request_coalescing_enabled:
+            return await self._assess(patient_text, symptoms, metadata, retrieval_filter, deadline)
+
+        key = self.request_key(patient_text, symptoms, metadata, retrieval_filter)
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.coalesced_calls += 1
+            logger.info(f"Assessment coalesced with an identical in-flight request ({key[:12]})")
+        else:
+            task = asyncio.ensure_future(
+                self._assess(patient_text, symptoms, metadata, retrieval_filter, deadline)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight_done(key, t))
+
+        if coalesced and deadline is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(task), max(deadline.remaining(), 0.0))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Deadline exceeded waiting for a coalesced request") from None
+        else:
+            result = await asyncio.shield(task)
+        # Callers annotate their result (e.g. nlp_ms), so each gets its own copy
+        return {
+            **result,
+            "pipeline_metrics": {**result["pipeline_metrics"], "coalesced": coalesced},
+        }
+
+    @staticmethod
+    def request_key(
+        patient_text: str,
+        symptoms: Optional[List[Dict[str, Any]]],
+        metadata: Optional[Dict[str, Any]],
+        retrieval_filter: Optional[Dict[str, Any]],
+    ) -> str:
+        """Hash of the canonical assessment input; whitespace in the text is normalised"""
+        canonical = json.dumps(
+            {
+                "text": " ".join(patient_text.split()),
+                "symptoms": symptoms or [],
+                "metadata": metadata or {},
+                "filter": retrieval_filter or {},
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _inflight_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every waiter may have been cancelled; retrieve the error so it is not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def _assess(
+        self,
+        patient_text: str,
+        symptoms: Optional[List[Dict[str, Any]]],
+        metadata: Optional[Dict[str, Any]],
+        retrieval_filter: Optional[Dict[str, Any]],
+        deadline: Optional[Deadline],
+    ) -> Dict[str, Any]:
+        prepared = await self._prepare(
+            patient_text, symptoms, metadata, retrieval_filter, deadline=deadline
+        )
+        if "cached_result" in prepared:
+            return prepared["cached_result"]
+        return await self._generate(prepared, deadline=deadline)
+
+    async def _generate(
+        self, prepared: Dict[str, Any], deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """Steps 6-7: call the LLM with a prepared prompt and assemble the result"""
+        # Step 6: Call LLM
+        prepared["metrics"]["http_pool_saturation"] = round(pool_stats.saturation, 3)
+        llm_start = time.time()
+        llm_response = await within(deadline, "llm", self.llm_service.generate_assessment(
+            system_prompt=CLINICAL_SYSTEM_PROMPT,
+            user_prompt=prepared["user_prompt"],
+            input_tokens=prepared["prompt_tokens"],
+            deadline=deadline,
+        ))
+        llm_time = (time.time() - llm_start) * 1000
+        logger.info(f"LLM assessment generated in {llm_time:.0f}ms")
+        prepared["metrics"]["llm_rate_limit_wait_ms"] = llm_response["rate_limit_wait_ms"]
+
+        # Step 7: Assemble final result
+        return self._finish(prepared, llm_response["result"], llm_response["usage"], llm_time)
+
+    async def assess_stream(
+        self,
+        patient_text: str,
+        symptoms: Optional[List[Dict[str, Any]]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        retrieval_filter: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of ``assess``. Yields events as ``{"event", "data"}``:
+
+        - ``sources``: retrieved source references, as soon as retrieval is done
+        - ``field``: one top-level ClinicalAssessment field (``name``, ``value``)
+          as soon as the model has finished writing it
+        - ``done``: usage, pipeline_metrics and the cache flag
+
+        With a ``deadline``, generation stops with DeadlineExceeded once it
+        passes; fields already sent stay sent.
+        """
+        prepared = await self._prepare(
+            patient_text, symptoms, metadata, retrieval_filter, deadline=deadline
+        )
+
+        cached = prepared.get("cached_result")
+        if cached is not None:
+            yield {"event": "sources", "data": {"sources": cached["sources"]}}
+            for name, value in cached["assessment"].items():
+                yield {"event": "field", "data": {"name": name, "value": value}}
+            yield {"event": "done", "data": {
+                "usage": cached["usage"],
+                "pipeline_metrics": cached["pipeline_metrics"],
+                "cached": True,
+            }}
+            return
+
+        metrics = prepared["metrics"]
+        metrics["time_to_sources_ms"] = round((time.time() - prepared["pipeline_start"]) * 1000, 1)
+        yield {"event": "sources", "data": {"sources": prepared["sources"]}}
+
+        # Step 6: Stream the LLM output, emitting fields as they complete
+        metrics["http_pool_saturation"] = round(pool_stats.saturation, 3)
+        llm_start = time.time()
+        parser: Optional[TopLevelFieldParser] = TopLevelFieldParser()
+        content: List[str] = []
+        emitted = set()
+        usage: Dict[str, Any] = {}
+        # Closed as soon as this generator stops, so the LLM stream and its
+        # token reservation are released on a disconnect or deadline
+        async with aclosing(self.llm_service.stream_assessment(
+            system_prompt=CLINICAL_SYSTEM_PROMPT,
+            user_prompt=prepared["user_prompt"],
+            input_tokens=prepared["prompt_tokens"],
+            deadline=deadline,
+        )) as parts:
+            async for part in parts:
+                if deadline is not None:
+                    deadline.check("the end of the LLM stream")
+                if "usage" in part:
+                    usage = part["usage"]
+                    continue
+                if "rate_limit_wait_ms" in part:
+                    metrics["llm_rate_limit_wait_ms"] = part["rate_limit_wait_ms"]
+                    continue
+                content.append(part["content"])
+                if parser is None:
+                    continue
+                try:
+                    fields = parser.feed(part["content"])
+                except ValueError as e:
+                    # Fall back to parsing the whole response once it has finished
+                    logger.warning(f"Incremental JSON parse failed, buffering the rest: {e}")
+                    parser = None
+                    continue
+                for name, value in fields:
+                    if not emitted:
+                        metrics["time_to_first_field_ms"] = round(
+                            (time.time() - prepared["pipeline_start"]) * 1000, 1
+                        )
+                    emitted.add(name)
+                    yield {"event": "field", "data": {"name": name, "value": value}}
+
+        llm_time = (time.time() - llm_start) * 1000
+        logger.info(f"LLM assessment streamed in {llm_time:.0f}ms")
+
+        # Step 7: Emit anything the incremental parser could not, then wrap up
+        assessment = self.llm_service.parse_content("".join(content))
+        for name, value in assessment.items():
+            if name not in emitted:
+                yield {"event": "field", "data": {"name": name, "value": value}}
+
+        result = self._finish(prepared, assessment, usage, llm_time)
+        yield {"event": "done", "data": {
+            "usage": result["usage"],
+            "pipeline_metrics": result["pipeline_metrics"],
+            "cached": False,
+        }}
+
+    async def assess_batch(
+        self, items: List[Dict[str, Any]], deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        Assess many presentations in one call.
+
+        Retrieval queries for every item are embedded in a few ``embed_batch``
+        calls. Items sharing a retrieval filter are searched together in one
+        vector query. LLM calls then fan out under ``batch_llm_concurrency``.
+        Each item in ``items`` has the ``assess`` keyword arguments. Results
+        come back in input order; a failing item reports its error without
+        failing the batch. Multi-query retrieval is not used in batch mode.
+
+        ``deadline`` covers the whole batch. The shared embedding and
+        retrieval stages raise DeadlineExceeded when they overrun their
+        budget; an item whose LLM call cannot finish in time fails on its own.
+        """
+        batch_start = time.time()
+        count = len(items)
+
+        # Step 1: Retrieval filters and queries for every item
+        inputs = [
+            self._retrieval_inputs(
+                item["patient_text"], item.get("symptoms"), item.get("retrieval_filter")
+            )
+            for item in items
+        ]
+
+        # Step 2: Embed all queries in a few batched calls
+        embed_start = time.time()
+        queries = [query for _, query in inputs]
+        embeddings: List[List[float]] = []
+        embed_calls = 0
+        for start in range(0, count, settings.batch_embed_size):
+            embeddings.extend(await within(deadline, "embed", self.embedding_service.embed_batch(
+                queries[start:start + settings.batch_embed_size], deadline=deadline
+            )))
+            embed_calls += 1
+        embed_time = (time.time() - embed_start) * 1000
+
+        # Step 3: One vector search per distinct retrieval filter
+        retrieval_start = time.time()
+        groups: Dict[str, List[int]] = {}
+        for index, (retrieval_filter, _) in enumerate(inputs):
+            groups.setdefault(repr(sorted((retrieval_filter or {}).items())), []).append(index)
+
+        retrievals: List[Optional[Dict[str, Any]]] = [None] * count
+
+        async def search(indices: List[int]):
+            found = await self.retrieval_service.aquery_batch(
+                [embeddings[i] for i in indices],
+                top_k=self._retrieval_k(),
+                where=inputs[indices[0]][0],
+                query_texts=[queries[i] for i in indices],
+            )
+            for i, result in zip(indices, found):
+                retrievals[i] = result
+
+        await within(deadline, "retrieve", asyncio.gather(*(search(indices) for indices in groups.values())))
+        retrieval_time = (time.time() - retrieval_start) * 1000
+        logger.info(
+            f"Batch of {count}: {embed_calls} embedding calls in {embed_time:.0f}ms, "
+            f"{len(groups)} vector searches in {retrieval_time:.0f}ms"
+        )
+
+        # Steps 4-7 per item, with a cap on concurrent LLM calls
+        llm_slots = asyncio.Semaphore(settings.batch_llm_concurrency)
+
+        async def run_item(index: int) -> Dict[str, Any]:
+            item = items[index]
+            prepared = await self._prepare(
+                item["patient_text"],
+                item.get("symptoms"),
+                item.get("metadata"),
+                inputs[index][0],
+                query_embedding=embeddings[index],
+                retrieval_results=retrievals[index],
+                deadline=deadline,
+            )
+            if "cached_result" in prepared:
+                return prepared["cached_result"]
+            async with llm_slots:
+                if deadline is not None:
+                    # May have run out while waiting for a slot
+                    deadline.check("the LLM call")
+                return await self._generate(prepared, deadline=deadline)
+
+        outcomes = await asyncio.gather(
+            *(run_item(i) for i in range(count)), return_exceptions=True
+        )
+
+        results = []
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+                 "cached_prompt_tokens": 0, "model": self.llm_service.model}
+        failed = cached = 0
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Batch item {index} failed: {outcome}")
+                failed += 1
+                results.append({"index": index, "success": False, "error": str(outcome)})
+                continue
+            cached += bool(outcome.get("cached"))
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cached_prompt_tokens"):
+                usage[key] += outcome["usage"].get(key, 0)
+            results.append({
+                "index": index,
+                "success": True,
+                "data": {
+                    "assessment": outcome["assessment"],
+                    "sources": outcome["sources"],
+                    "usage": outcome["usage"],
+                    "metrics": outcome["pipeline_metrics"],
+                    "cached": outcome.get("cached", False),
+                },
+            })
+
+        total_time = (time.time() - batch_start) * 1000
+        return {
+            "results": results,
+            "usage": usage,
+            "metrics": {
+                "items": count,
+                "succeeded": count - failed,
+                "failed": failed,
+                "cached": cached,
+                "embedding_calls": embed_calls,
+                "embedding_ms": round(embed_time, 1),
+                "vector_searches": len(groups),
+                "retrieval_ms": round(retrieval_time, 1),
+                "total_ms": round(total_time, 1),
+            },
+        }
+
+    async def _prepare(
+        self,
+        patient_text: str,
+        symptoms: Optional[List[Dict[str, Any]]],
+        metadata: Optional[Dict[str, Any]],
+        retrieval_filter: Optional[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None,
+        retrieval_results: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Any]:
+        """
+        Steps 1-5: embed, retrieve, select and pack context, build the prompt.
+        ``query_embedding`` / ``retrieval_results`` skip steps 2 / 3 when the
+        caller already computed them (batch assessment). Steps 2 and 3 run
+        under their budget from ``deadline``.
+        Returns ``{"cached_result": ...}`` on an assessment cache hit.
+        """
         pipeline_start = time.time()
+        await self.retrieval_service.arefresh_if_changed()
+        cache = self.assessment_cache
+        if cache is not None:
+            cache.set_index_version(self.retrieval_service.index_version)
 
         # Step 1: Build retrieval query
-        retrieval_query = build_retrieval_query(patient_text, symptoms)
-        logger.info(f"Retrieval query built ({len(retrieval_query)} chars)")
+        retrieval_filter, retrieval_query = self._retrieval_inputs(
+            patient_text, symptoms, retrieval_filter
+        )
 
-        # Step 2: Embed the query
+        subqueries: List[str] = []
+        if settings.multi_query_enabled and retrieval_results is None:
+            subqueries = build_retrieval_subqueries(
+                patient_text, symptoms, settings.multi_query_max_sentences
+            )
+
+        # Step 2: Embed the query (and any sub-queries) in a single API call
         embed_start = time.time()
-        query_embedding = await self.embedding_service.embed_text(retrieval_query)
+        embed_stats: Dict[str, Any] = {}
+        sub_embeddings: List[List[float]] = []
+        if query_embedding is None:
+            vectors = await within(deadline, "embed", self.embedding_service.embed_batch(
+                [retrieval_query] + subqueries, stats=embed_stats, deadline=deadline
+            ))
+            query_embedding, sub_embeddings = vectors[0], vectors[1:]
         embed_time = (time.time() - embed_start) * 1000
         logger.info(f"Query embedded in {embed_time:.0f}ms")
 
+        metrics = {
+            "embedding_ms": round(embed_time, 1),
+            "embedding_cache_hits": embed_stats.get("cache_hits", 0),
+            "embedding_cache_misses": embed_stats.get("cache_misses", 0),
+            "embedding_cache_hit_rate": round(self.embedding_service.cache_hit_rate(), 3),
+            "embedding_ms_saved": embed_stats.get("ms_saved", 0.0),
+            "embedding_rate_limit_wait_ms": embed_stats.get("rate_limit_wait_ms", 0.0),
+            "embedding_hedged": embed_stats.get("hedged", False),
+            "embedding_batch_callers": embed_stats.get("batch_callers", 0),
+        }
+
+        # Semantic cache: near-identical query with the same detected symptoms
+        symptom_set = AssessmentCache.symptom_set(symptoms)
+        semantic_scope = repr(sorted((retrieval_filter or {}).items()))
+        if cache is not None:
+            cached = cache.get_semantic(query_embedding, symptom_set, semantic_scope)
+            if cached is not None:
+                logger.info("Assessment served from semantic cache")
+                return {"cached_result": self._cached_result(cached, "semantic", metrics, pipeline_start)}
+
         # Step 3: Retrieve relevant DSM-5 chunks
         retrieval_start = time.time()
-        retrieval_results = self.retrieval_service.query(
-            query_embedding=query_embedding,
-            where=retrieval_filter,
-        )
+        if retrieval_results is None and subqueries:
+            retrieval_results = await within(deadline, "retrieve", self.retrieval_service.amulti_query(
+                query_embeddings=[query_embedding] + sub_embeddings,
+                top_k=self._retrieval_k(),
+                where=retrieval_filter,
+                query_texts=[retrieval_query] + subqueries,
+            ))
+        elif retrieval_results is None:
+            retrieval_results = await within(deadline, "retrieve", self.retrieval_service.aquery(
+                query_embedding=query_embedding,
+                top_k=self._retrieval_k(),
+                where=retrieval_filter,
+                query_text=retrieval_query,
+            ))
         retrieval_time = (time.time() - retrieval_start) * 1000
         num_results = len(retrieval_results.get("documents", []))
         logger.info(f"Retrieved {num_results} chunks in {retrieval_time:.0f}ms")
@@ -71,48 +564,342 @@ class RAGPipeline:
                 "id": retrieval_results["ids"][i],
             })
 
-        # Step 5: Build augmented prompt
+        # Step 4a: Pin precomputed criteria chunks for the detected symptoms;
+        # live retrieval only fills the remaining slots
+        pinned: List[Dict[str, Any]] = []
+        if settings.criterion_pinning_enabled and symptoms:
+            table = self._current_criterion_table()
+            if table is not None:
+                pinned = table.pinned(symptoms, query_embedding, settings.criterion_pin_max)
+                pinned_ids = {ctx["id"] for ctx in pinned}
+                retrieved_context = [c for c in retrieved_context if c["id"] not in pinned_ids]
+                num_results = len(retrieved_context)
+
+        # Step 4b: Threshold + MMR over the candidate pool to shrink the prompt
+        num_candidates = num_results
+        context_tokens_saved = 0
+        if settings.context_selection_enabled and retrieved_context:
+            baseline = retrieved_context[:settings.retrieval_top_k]
+            embeddings = await self.retrieval_service.aget_embeddings(
+                [ctx["id"] for ctx in retrieved_context]
+            )
+            retrieved_context = select_context(
+                retrieved_context,
+                embeddings,
+                query_embedding,
+                final_k=max(settings.context_top_k - len(pinned), 0),
+                min_score=settings.retrieval_min_score,
+                lambda_mult=settings.mmr_lambda,
+            )
+            num_results = len(retrieved_context)
+            context_tokens_saved = self._context_tokens(baseline) - self._context_tokens(
+                retrieved_context
+            )
+            logger.info(
+                f"Context selection kept {num_results}/{num_candidates} chunks, "
+                f"saving ~{context_tokens_saved} prompt tokens"
+            )
+        elif pinned:
+            retrieved_context = retrieved_context[:max(settings.retrieval_top_k - len(pinned), 0)]
+        retrieved_context = pinned + retrieved_context
+
+        # Step 5: Pack references into the input-token budget and build the prompt.
+        # Chunks already in the static core criteria block are not repeated
+        core_block, core_ids = self._core_criteria()
+        if core_ids:
+            retrieved_context = [c for c in retrieved_context if c["id"] not in core_ids]
+        chunks_merged, context_tokens_merged = 0, 0
+        if settings.chunk_merge_enabled and len(retrieved_context) > 1:
+            retrieved_context, chunks_merged, context_tokens_merged = self._merge_chunks(
+                retrieved_context
+            )
+        context_tokens_compressed, context_compression_ratio = 0, 1.0
+        if settings.context_compression_enabled and retrieved_context:
+            retrieved_context, context_tokens_compressed, context_compression_ratio = (
+                self._compress_chunks(retrieved_context, query_embedding)
+            )
+        retrieved_context, prompt_tokens = self.context_packer.pack(
+            patient_text=patient_text,
+            retrieved_context=retrieved_context,
+            budget=settings.max_input_tokens,
+            symptoms=symptoms,
+            metadata=metadata,
+        )
+        num_results = len(retrieved_context)
         user_prompt = build_assessment_prompt(
             patient_text=patient_text,
             retrieved_context=retrieved_context,
             detected_symptoms=symptoms,
             metadata=metadata,
+            core_block=core_block,
         )
-
-        # Check token budget and truncate if needed
-        prompt_tokens = self.llm_service.count_tokens(
-            CLINICAL_SYSTEM_PROMPT + user_prompt
+        logger.info(f"Prompt tokens (estimated): {prompt_tokens}")
+        # The same prompt with its compressed references sent whole
+        prompt_tokens_uncompressed = prompt_tokens + sum(
+            ctx["original_tokens"] - self.context_packer.chunk_tokens(ctx)
+            for ctx in retrieved_context
+            if "original_tokens" in ctx
         )
-        logger.info(f"Prompt tokens: {prompt_tokens}")
-
-        # GPT-4o has 128k context; keep plenty of room for output
-        max_input_tokens = 120000
-        if prompt_tokens > max_input_tokens:
-            logger.warning(
-                f"Prompt exceeds token budget ({prompt_tokens} > {max_input_tokens}), "
-                f"truncating context"
+
+        # Build source references for the frontend
+        sources = self._build_sources(retrieved_context)
+        metrics["retrieval_ms"] = round(retrieval_time, 1)
+        metrics["retrieval_queries"] = 1 + len(subqueries)
+        metrics["chunks_retrieved"] = num_results
+        metrics["chunks_candidates"] = num_candidates
+        metrics["chunks_pinned"] = len(pinned)
+        metrics["context_tokens_saved"] = context_tokens_saved
+        metrics["chunks_merged"] = chunks_merged
+        metrics["context_tokens_merged"] = context_tokens_merged
+        metrics["context_tokens_compressed"] = context_tokens_compressed
+        metrics["context_compression_ratio"] = context_compression_ratio
+        metrics["prompt_tokens_estimate"] = prompt_tokens
+        metrics["prompt_tokens_uncompressed"] = prompt_tokens_uncompressed
+
+        # Exact cache: identical prompt under the same system prompt and model
+        exact_key = None
+        if cache is not None:
+            exact_key = AssessmentCache.exact_key(
+                CLINICAL_SYSTEM_PROMPT_VERSION, self.llm_service.model, user_prompt
+            )
+            cached = cache.get_exact(exact_key)
+            if cached is not None:
+                logger.info("Assessment served from exact cache")
+                return {"cached_result": self._cached_result(cached, "exact", metrics, pipeline_start)}
+            cache.record_miss()
+
+        return {
+            "pipeline_start": pipeline_start,
+            "user_prompt": user_prompt,
+            "prompt_tokens": prompt_tokens,
+            "sources": sources,
+            "metrics": metrics,
+            "exact_key": exact_key,
+            "query_embedding": query_embedding,
+            "symptom_set": symptom_set,
+            "semantic_scope": semantic_scope,
+        }
+
+    def _finish(
+        self,
+        prepared: Dict[str, Any],
+        assessment: Dict[str, Any],
+        usage: Dict[str, Any],
+        llm_time: float,
+    ) -> Dict[str, Any]:
+        """Store the assessment in the cache and assemble the response"""
+        cache = self.assessment_cache
+        metrics = prepared["metrics"]
+        sources = prepared["sources"]
+        pipeline_time = (time.time() - prepared["pipeline_start"]) * 1000
+
+        if cache is not None:
+            entry = {
+                "assessment": assessment,
+                "sources": sources,
+                "usage": usage,
+            }
+            cache.put_exact(prepared["exact_key"], entry)
+            cache.put_semantic(
+                prepared["query_embedding"], prepared["symptom_set"], entry, prepared["semantic_scope"]
             )
-            # Truncate the retrieved context portion
-            user_prompt = self.llm_service.truncate_to_token_limit(
-                user_prompt, max_input_tokens - self.llm_service.count_tokens(CLINICAL_SYSTEM_PROMPT)
+
+        cached_prompt_tokens = usage.get("cached_prompt_tokens", 0)
+        metrics.update({
+            "llm_ms": round(llm_time, 1),
+            "total_ms": round(pipeline_time, 1),
+            "assessment_cache": "miss" if cache is not None else "disabled",
+            "cached_prompt_tokens": cached_prompt_tokens,
+            "cached_prompt_ratio": round(
+                cached_prompt_tokens / usage["prompt_tokens"] if usage.get("prompt_tokens") else 0.0, 3
+            ),
+        })
+
+        return {
+            "assessment": assessment,
+            "sources": sources,
+            "usage": usage,
+            "cached": False,
+            "pipeline_metrics": metrics,
+        }
+
+    def _retrieval_inputs(
+        self,
+        patient_text: str,
+        symptoms: Optional[List[Dict[str, Any]]],
+        retrieval_filter: Optional[Dict[str, Any]],
+    ) -> tuple:
+        """Resolve the effective (retrieval filter, retrieval query) for a request"""
+        # Pick disorder partitions from the detected symptoms when no explicit filter
+        if retrieval_filter is None and symptoms and settings.retrieval_auto_partition:
+            retrieval_filter = self.retrieval_service.symptom_filter(symptoms)
+
+        retrieval_query = build_retrieval_query(patient_text, symptoms)
+        logger.info(f"Retrieval query built ({len(retrieval_query)} chars)")
+        return retrieval_filter, retrieval_query
+
+    @staticmethod
+    def _retrieval_k() -> int:
+        if settings.context_selection_enabled:
+            return settings.retrieval_candidate_k
+        return settings.retrieval_top_k
+
+    async def refresh_criterion_table(self) -> CriterionTable:
+        """
+        Load the criterion table saved next to the collection, or rebuild and
+        save it when it was built against a different index.
+        """
+        collection = self.retrieval_service.collection
+        path = table_path(settings.chroma_persist_dir, settings.chroma_collection_name)
+        signature = await asyncio.to_thread(index_signature, collection, self.embedding_service.model)
+
+        table = await asyncio.to_thread(CriterionTable.load, path)
+        if table is None or table.signature != signature:
+            logger.info("Criterion table missing or stale, rebuilding")
+            rows = await asyncio.to_thread(fetch_criteria_rows, collection)
+            hierarchy = await asyncio.to_thread(lambda: self.retrieval_service.code_hierarchy)
+            vectors = await self.embedding_service.embed_batch(list(CRITERION_QUERIES.values()))
+            table = CriterionTable(signature).build(
+                dict(zip(CRITERION_QUERIES, vectors)),
+                rows,
+                hierarchy,
+                per_disorder=settings.criterion_chunks_per_disorder,
             )
+            await asyncio.to_thread(table.save, path)
 
-        # Step 6: Call LLM
-        llm_start = time.time()
-        llm_response = await self.llm_service.generate_assessment(
-            system_prompt=CLINICAL_SYSTEM_PROMPT,
-            user_prompt=user_prompt,
+        self._criterion_table = table
+        return table
+
+    def _invalidate_criterion_table(self, index_version: str):
+        self._criterion_table = None
+        # A new index deserves a fresh attempt even after failures
+        self._criterion_failures = 0
+        self._criterion_retry_at = 0.0
+
+    def _current_criterion_table(self) -> Optional[CriterionTable]:
+        """
+        The loaded table. When there is none, schedules one background
+        rebuild at a time, backing off after failed rebuilds.
+        """
+        if (
+            self._criterion_table is None
+            and (self._criterion_task is None or self._criterion_task.done())
+            and time.monotonic() >= self._criterion_retry_at
+        ):
+            self._criterion_task = asyncio.create_task(self.refresh_criterion_table())
+            self._criterion_task.add_done_callback(self._criterion_task_done)
+        return self._criterion_table
+
+    def _criterion_task_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        if task.exception() is None:
+            self._criterion_failures = 0
+            return
+        self._criterion_failures += 1
+        delay = min(
+            _CRITERION_RETRY_SECONDS * 2 ** (self._criterion_failures - 1),
+            _CRITERION_RETRY_MAX_SECONDS,
+        )
+        self._criterion_retry_at = time.monotonic() + delay
+        logger.warning(
+            f"Background criterion table rebuild failed ({task.exception()}); "
+            f"next attempt in {delay:.0f}s"
         )
-        llm_time = (time.time() - llm_start) * 1000
-        logger.info(f"LLM assessment generated in {llm_time:.0f}ms")
 
-        # Step 7: Assemble final result
-        pipeline_time = (time.time() - pipeline_start) * 1000
+    def _core_criteria(self) -> Tuple[Optional[str], Set[str]]:
+        """
+        Static core criteria block for the cache-friendly prompt layout and
+        the chunk IDs it contains. Uses the criterion table's MDD criteria
+        chunks (canonical order, within PROMPT_CORE_MAX_TOKENS) and falls back
+        to the criterion summaries until the table is available.
+        """
+        if not settings.prompt_cache_layout:
+            return None, set()
+        table = self._current_criterion_table()
+        if self._core is None or self._core[0] is not table:
+            chunks: List[Dict[str, Any]] = []
+            budget = settings.prompt_core_max_tokens
+            for ctx in table.core_chunks() if table is not None else []:
+                cost = self.context_packer.reference_tokens(ctx)
+                if cost > budget:
+                    break
+                chunks.append(ctx)
+                budget -= cost
+            if not chunks:
+                summary = "\n".join(
+                    f"Criterion {code}: {query.split(': ', 1)[-1]}"
+                    for code, query in CRITERION_QUERIES.items()
+                )
+                chunks = [{
+                    "id": "",
+                    "document": "Major Depressive Disorder, Criterion A (five or more "
+                                "during the same 2-week period):\n" + summary,
+                    "metadata": {},
+                }]
+            block = build_core_criteria_block(chunks)
+            self._core = (table, block, {c["id"] for c in chunks if c["id"]})
+            self.context_packer.set_core_block(block)
+            logger.info(f"Prompt core criteria block: {len(self._core[2])} chunks")
+        return self._core[1], self._core[2]
 
-        # Build source references for the frontend
+    def _merge_chunks(
+        self, retrieved_context: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], int, int]:
+        """
+        Coalesce neighbouring chunks of the same section so their shared
+        overlap appears once. Returns (context, chunks absorbed, prompt tokens removed).
+        """
+        before = sum(self.context_packer.reference_tokens(ctx) for ctx in retrieved_context)
+        merged = merge_adjacent_chunks(retrieved_context)
+        if len(merged) == len(retrieved_context):
+            return retrieved_context, 0, 0
+        for ctx in merged:
+            if "merged_ids" in ctx and not ctx["metadata"].get("token_count"):
+                # Members ingested without token counts
+                ctx["metadata"]["token_count"] = self.llm_service.count_tokens(ctx["document"])
+        removed = before - sum(self.context_packer.reference_tokens(ctx) for ctx in merged)
+        absorbed = len(retrieved_context) - len(merged)
+        logger.info(f"Merged {absorbed} overlapping chunks, removing ~{removed} prompt tokens")
+        return merged, absorbed, removed
+
+    def _compress_chunks(
+        self, retrieved_context: List[Dict[str, Any]], query_embedding: List[float]
+    ) -> Tuple[List[Dict[str, Any]], int, float]:
+        """
+        Reduce references to their sentences closest to the query; each
+        compressed reference keeps its full size in ``original_tokens``.
+        Returns (context, chunk tokens removed, compressed / original tokens).
+        """
+        index = self.retrieval_service.sentence_index
+        if index is None:
+            return retrieved_context, 0, 1.0
+        before = self._context_tokens(retrieved_context)
+        compressed = compress_context(
+            retrieved_context,
+            index,
+            query_embedding,
+            budget=settings.context_compression_chunk_tokens,
+            chunk_tokens=self.context_packer.chunk_tokens,
+        )
+        for original, ctx in zip(retrieved_context, compressed):
+            if ctx is not original:
+                ctx["original_tokens"] = self.context_packer.chunk_tokens(original)
+        after = self._context_tokens(compressed)
+        ratio = round(after / before, 3) if before else 1.0
+        logger.info(f"Context compression: {before} -> {after} chunk tokens (ratio {ratio})")
+        return compressed, before - after, ratio
+
+    def _context_tokens(self, retrieved_context: List[Dict[str, Any]]) -> int:
+        return sum(self.context_packer.chunk_tokens(ctx) for ctx in retrieved_context)
+
+    def _build_sources(self, retrieved_context: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Build source references for the frontend from retrieved chunks"""
         sources = []
         for ctx in retrieved_context:
             meta = ctx["metadata"]
+            # Compressed references still cite and quote the original chunk
+            document = ctx.get("original_document", ctx["document"])
             sources.append({
                 "section": meta.get("section_title", "Unknown"),
                 "disorder": meta.get("disorder_name", ""),
@@ -120,22 +907,38 @@ class RAGPipeline:
                 "pages": meta.get("page_range", ""),
                 "type": meta.get("section_type", ""),
                 "relevance_score": round(max(0, 1 - ctx["distance"]), 3),
-                "excerpt": ctx["document"][:200] + "..."
-                if len(ctx["document"]) > 200
-                else ctx["document"],
+                "excerpt": document[:200] + "..." if len(document) > 200 else document,
             })
+        return sources
 
+    def _cached_result(
+        self,
+        cached: Dict[str, Any],
+        tier: str,
+        metrics: Dict[str, Any],
+        pipeline_start: float,
+    ) -> Dict[str, Any]:
+        """Build a response from a cached assessment; no tokens are spent on this request"""
+        metrics.setdefault("retrieval_ms", 0.0)
+        metrics.update({
+            "llm_ms": 0.0,
+            "total_ms": round((time.time() - pipeline_start) * 1000, 1),
+            "chunks_retrieved": len(cached["sources"]),
+            "assessment_cache": tier,
+        })
         return {
-            "assessment": llm_response["result"],
-            "sources": sources,
-            "usage": llm_response["usage"],
-            "pipeline_metrics": {
-                "embedding_ms": round(embed_time, 1),
-                "retrieval_ms": round(retrieval_time, 1),
-                "llm_ms": round(llm_time, 1),
-                "total_ms": round(pipeline_time, 1),
-                "chunks_retrieved": num_results,
+            "assessment": cached["assessment"],
+            "sources": cached["sources"],
+            "usage": {
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "cached_prompt_tokens": 0,
+                "model": cached["usage"].get("model", self.llm_service.model),
             },
+            "cached": True,
+            "cache_tier": tier,
+            "pipeline_metrics": metrics,
         }
 
     def is_ready(self) -> bool:
@@ -0,0 +1,187 @@
+"""Client-side request and token rate limiting for OpenAI calls"""
+import asyncio
+import re
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# OpenAI reset durations look like "1s", "6m0s", "20ms", "1h2m3.5s"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value: Optional[str]) -> float:
+    """Seconds in an x-ratelimit-reset-* header (0.0 if absent or unparseable)"""
+    if not value:
+        return 0.0
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return 0.0
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+class _Bucket:
+    """Per-minute token bucket refilled continuously. Capacity 0 means unlimited."""
+
+    def __init__(self, per_minute: int):
+        self.configured = per_minute
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.capacity > 0:
+            rate = self.capacity / 60.0
+            self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def clamp(self, amount: float) -> float:
+        # A request larger than the whole bucket would otherwise wait forever
+        return min(amount, self.capacity) if self.capacity > 0 else amount
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken"""
+        if self.capacity <= 0:
+            return 0.0
+        deficit = self.clamp(amount) - self.level
+        return deficit / (self.capacity / 60.0) if deficit > 0 else 0.0
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self.level -= self.clamp(amount)
+
+    def observe(self, limit: Optional[int], remaining: Optional[int]):
+        """Adopt the server's limit (unless configured lower) and remaining quota"""
+        if limit:
+            capacity = float(min(limit, self.configured) if self.configured else limit)
+            if self.capacity <= 0:
+                self.level = capacity
+            self.capacity = capacity
+        if remaining is not None and self.capacity > 0:
+            self.level = min(self.level, float(remaining))
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets for one model.
+
+    Callers reserve a request and their estimated tokens with ``acquire``
+    before each API call (retries included) and wait in FIFO order until
+    both buckets have room. Chat calls reserve the prompt plus ``max_tokens``,
+    as the API does; ``reconcile`` returns the unused part once the billed
+    usage is known. Limits come from settings and, when those are
+    0 or higher than the account allows, from x-ratelimit-* response
+    headers. A 429 pauses every caller until the server's reset time
+    instead of letting each retry back off on its own.
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self._lock = asyncio.Lock()
+        self._paused_until = 0.0
+        self.waiting = 0
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait for capacity for one request of ``tokens`` tokens; returns ms waited"""
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            # asyncio.Lock wakes waiters in arrival order, so a large request
+            # at the head of the queue is not starved by smaller ones
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    delay = max(
+                        self._paused_until - now,
+                        self.requests.delay(1),
+                        self.tokens.delay(tokens),
+                    )
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+        finally:
+            self.waiting -= 1
+
+        waited_ms = (time.monotonic() - start) * 1000
+        if waited_ms >= 1000:
+            logger.info(
+                f"{self.name}: waited {waited_ms:.0f}ms for rate limit "
+                f"({self.waiting} still queued)"
+            )
+        return waited_ms
+
+    def reconcile(self, reserved: int, actual: int):
+        """Charge the difference between the reserved estimate and billed tokens"""
+        if self.tokens.capacity > 0:
+            self.tokens.refill(time.monotonic())
+            self.tokens.level -= actual - reserved
+
+    def observe_headers(self, headers: Mapping[str, str]):
+        """Sync limits and remaining quota from an API response's headers"""
+        self.requests.observe(
+            _header_int(headers, "x-ratelimit-limit-requests"),
+            _header_int(headers, "x-ratelimit-remaining-requests"),
+        )
+        self.tokens.observe(
+            _header_int(headers, "x-ratelimit-limit-tokens"),
+            _header_int(headers, "x-ratelimit-remaining-tokens"),
+        )
+
+    def on_rate_limited(self, headers: Mapping[str, str]):
+        """Pause all callers after a 429 until the server says quota is back"""
+        self.observe_headers(headers)
+        retry_after_ms = _header_int(headers, "retry-after-ms")
+        pauses = [
+            retry_after_ms / 1000 if retry_after_ms is not None else 0.0,
+            parse_reset(headers.get("retry-after")),
+        ]
+        if _header_int(headers, "x-ratelimit-remaining-requests") == 0:
+            pauses.append(parse_reset(headers.get("x-ratelimit-reset-requests")))
+        if _header_int(headers, "x-ratelimit-remaining-tokens") == 0:
+            pauses.append(parse_reset(headers.get("x-ratelimit-reset-tokens")))
+        pause = max(pauses) or 1.0
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        logger.warning(f"{self.name}: rate limited by the API, pausing {pause:.1f}s")
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+
+
+def get_limiter(kind: str, model: str) -> Optional[RateLimiter]:
+    """
+    Process-wide limiter for ``kind`` ("chat" or "embedding") and model,
+    shared by every service instance. None when rate limiting is disabled.
+    """
+    if not settings.rate_limit_enabled:
+        return None
+    key = (kind, model)
+    if key not in _limiters:
+        if kind == "chat":
+            rpm, tpm = settings.chat_rpm_limit, settings.chat_tpm_limit
+        else:
+            rpm, tpm = settings.embedding_rpm_limit, settings.embedding_tpm_limit
+        _limiters[key] = RateLimiter(f"{kind}:{model}", rpm=rpm, tpm=tpm)
+    return _limiters[key]
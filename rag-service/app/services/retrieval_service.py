@@ -1,20 +1,68 @@
 """ChromaDB retrieval service for DSM-5 vector search"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import chromadb
+import numpy as np
 from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 
 from app.config.settings import settings
+from app.services.numpy_index import NumpyIndex, UnsupportedFilterError
+from app.services.partitioned_index import PartitionedIndex
+from app.services.code_hierarchy import CodeHierarchy
+from app.services.bm25_index import BM25Index, index_path, reciprocal_rank_fusion
+from app.services import sentence_index
+from app.services.criterion_table import table_path
+from app.services.embedding_providers import EmbeddingMismatchError
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
 class RetrievalService:
-    """Manages ChromaDB collection and performs similarity search"""
+    """
+    Manages ChromaDB collection and performs similarity search.
+
+    ChromaDB's embedded client does blocking SQLite/HNSW work, so async
+    callers should use ``aquery``, which runs the search on a dedicated,
+    bounded thread pool instead of the event loop.
+    """
 
     def __init__(self):
         self._client = None
         self._collection = None
+        self._write_generation = 0
+        self._index_listeners: List[Callable[[str], None]] = []
+        # Document count is cached and invalidated on writes instead of
+        # calling collection.count() on every query
+        self._doc_count: Optional[int] = None
+        self._count_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.retrieval_workers,
+            thread_name_prefix="retrieval",
+        )
+        # Optional in-memory read path (RETRIEVAL_BACKEND=numpy|partitioned)
+        self.backend = settings.retrieval_backend
+        self._numpy_index: Optional[NumpyIndex] = None
+        self._numpy_lock = threading.Lock()
+        self._code_hierarchy: Optional[CodeHierarchy] = None
+        # Sparse lexical index for hybrid retrieval (HYBRID_RETRIEVAL=true)
+        self._bm25_index: Optional[BM25Index] = None
+        self._bm25_lock = threading.Lock()
+        # Sentence embeddings for context compression (CONTEXT_COMPRESSION_ENABLED=true)
+        self._sentence_index: Optional[sentence_index.SentenceIndex] = None
+        self._sentence_index_loaded = False
+        self._sentence_lock = threading.Lock()
+        # Embedding provider/model/dimensions; recorded on new collections and
+        # checked against existing ones (set by the owner of the embedding service)
+        self.embedding_identity: Optional[Dict[str, Any]] = None
+        # Fingerprint of the persisted index, compared on the refresh path to
+        # notice re-ingestion by another process
+        self._stored_marker: Optional[Tuple[Any, ...]] = None
+        self._marker_checked_at: Optional[float] = None
 
     @property
     def client(self) -> chromadb.ClientAPI:
@@ -29,36 +77,341 @@ class RetrievalService:
     @property
     def collection(self) -> chromadb.Collection:
         if self._collection is None:
-            self._collection = self.client.get_or_create_collection(
+            collection = self.client.get_or_create_collection(
                 name=settings.chroma_collection_name,
-                metadata={"hnsw:space": "cosine"},
+                metadata={"hnsw:space": "cosine", **(self.embedding_identity or {})},
             )
+            self._check_embedding_identity(collection)
+            self._collection = collection
             logger.info(
                 f"ChromaDB collection '{settings.chroma_collection_name}' loaded "
-                f"with {self._collection.count()} documents"
+                f"with {self.document_count} documents"
             )
         return self._collection
 
+    def _check_embedding_identity(self, collection):
+        """Reject a collection whose vectors came from a different embedding model"""
+        if not self.embedding_identity:
+            return
+        recorded = collection.metadata or {}
+        if "embedding_model" not in recorded:
+            logger.warning(
+                f"Collection '{collection.name}' has no embedding metadata; assuming it "
+                f"matches {self.embedding_identity['embedding_model']}"
+            )
+            return
+        mismatched = {
+            key: (recorded.get(key), value)
+            for key, value in self.embedding_identity.items()
+            if recorded.get(key) != value
+        }
+        if mismatched:
+            details = ", ".join(f"{k}: index={a!r} service={b!r}" for k, (a, b) in mismatched.items())
+            raise EmbeddingMismatchError(
+                f"Collection '{collection.name}' was built with a different embedding "
+                f"model ({details}). Re-ingest with the current provider or switch back."
+            )
+
+    @property
+    def document_count(self) -> int:
+        """Cached collection size; refreshed only after writes or ``refresh_count``"""
+        if self._doc_count is None:
+            with self._count_lock:
+                if self._doc_count is None:
+                    self._doc_count = self.collection.count()
+        return self._doc_count
+
+    def refresh_count(self) -> int:
+        """Drop the cached count and re-read it from ChromaDB"""
+        self._doc_count = None
+        return self.document_count
+
+    @property
+    def index_version(self) -> str:
+        """
+        Identifier that changes whenever the indexed content changes:
+        a new collection, a different document count, or a local write.
+        """
+        try:
+            collection = self.collection
+            return f"{collection.id}:{self.document_count}:{self._write_generation}"
+        except Exception:
+            return f"unavailable:{self._write_generation}"
+
+    def on_index_change(self, callback: Callable[[str], None]):
+        """Register a callback invoked with the new index version after writes"""
+        self._index_listeners.append(callback)
+
+    @property
+    def uses_memory_index(self) -> bool:
+        return self.backend in ("numpy", "partitioned")
+
+    @property
+    def numpy_index(self) -> NumpyIndex:
+        """In-memory index, (re)loaded from the collection on first use after a write"""
+        if self._numpy_index is None:
+            with self._numpy_lock:
+                if self._numpy_index is None:
+                    index = PartitionedIndex() if self.backend == "partitioned" else NumpyIndex()
+                    index.load(self.collection)
+                    self._numpy_index = index
+        return self._numpy_index
+
+    def load_index(self):
+        """Eagerly build the configured in-memory read path (call at startup)"""
+        self.check_stored_index()
+        if self.uses_memory_index:
+            _ = self.numpy_index
+        _ = self.code_hierarchy
+        if settings.hybrid_retrieval:
+            _ = self.bm25_index
+        if settings.context_compression_enabled:
+            _ = self.sentence_index
+
+    @property
+    def bm25_index(self) -> BM25Index:
+        """
+        BM25 index stored next to the Chroma collection. Built at ingestion;
+        rebuilt from the collection here if missing or out of date.
+        """
+        if self._bm25_index is None:
+            with self._bm25_lock:
+                if self._bm25_index is None:
+                    path = index_path(settings.chroma_persist_dir, settings.chroma_collection_name)
+                    index = BM25Index.load(path)
+                    current_ids = self.collection.get(include=[])["ids"]
+                    if index is None or set(index.ids) != set(current_ids):
+                        logger.info("BM25 index missing or stale, rebuilding from collection")
+                        data = self.collection.get(include=["documents"])
+                        index = BM25Index(k1=settings.bm25_k1, b=settings.bm25_b).build(
+                            data["ids"], data["documents"]
+                        )
+                        index.save(path)
+                    self._bm25_index = index
+        return self._bm25_index
+
+    @property
+    def sentence_index(self) -> Optional[sentence_index.SentenceIndex]:
+        """
+        Sentence index stored next to the Chroma collection, or None if it
+        was never built (re-ingest with --sentence-index to create it) or was
+        embedded with a different model. Entries are keyed by chunk ID, which
+        includes a content hash, so chunks added or changed since ingestion
+        are simply not compressed.
+        """
+        if not self._sentence_index_loaded:
+            with self._sentence_lock:
+                if not self._sentence_index_loaded:
+                    path = sentence_index.index_path(
+                        settings.chroma_persist_dir, settings.chroma_collection_name
+                    )
+                    index = sentence_index.SentenceIndex.load(path)
+                    if index is None:
+                        logger.warning(f"No sentence index at {path}; context compression disabled")
+                    elif not self._sentence_index_matches(index):
+                        index = None
+                    self._sentence_index = index
+                    self._sentence_index_loaded = True
+        return self._sentence_index
+
+    def _sentence_index_matches(self, index: "sentence_index.SentenceIndex") -> bool:
+        """Whether the sentence vectors share the service's embedding space"""
+        if not self.embedding_identity:
+            return True
+        if not index.identity:
+            dims = self.embedding_identity.get("embedding_dimensions")
+            if index.size and dims and index.vectors.shape[1] != dims:
+                logger.warning(
+                    f"Sentence index has {index.vectors.shape[1]}-d vectors, service uses "
+                    f"{dims}-d; context compression disabled until re-ingestion"
+                )
+                return False
+            logger.warning("Sentence index has no embedding metadata; assuming it matches")
+            return True
+        if index.identity != self.embedding_identity:
+            logger.warning(
+                f"Sentence index was embedded with {index.identity}, service uses "
+                f"{self.embedding_identity}; context compression disabled until re-ingestion"
+            )
+            return False
+        return True
+
+    @property
+    def code_hierarchy(self) -> CodeHierarchy:
+        """Disorder code prefix hierarchy over the codes present in the collection"""
+        if self._code_hierarchy is None:
+            index = self._numpy_index
+            if isinstance(index, PartitionedIndex):
+                self._code_hierarchy = index.hierarchy
+            else:
+                metadatas = self.collection.get(include=["metadatas"])["metadatas"]
+                self._code_hierarchy = CodeHierarchy.from_metadatas(metadatas)
+        return self._code_hierarchy
+
+    def disorder_filter(self, code_prefix: str) -> Dict[str, Any]:
+        """
+        Build a where filter matching every indexed code under an ICD prefix,
+        e.g. "F32" matches "F32", "F32.1", ... and "F3" matches all F3x codes.
+        Blocking on first use after a refresh; async callers use ``adisorder_filter``.
+        """
+        codes = sorted(self.code_hierarchy.resolve([code_prefix]))
+        if not codes:
+            # Nothing indexed under this prefix; keep the exact match so the
+            # query returns no results rather than searching everything
+            return {"disorder_code": code_prefix}
+        if len(codes) == 1:
+            return {"disorder_code": codes[0]}
+        return {"disorder_code": {"$in": codes}}
+
+    async def adisorder_filter(self, code_prefix: str) -> Dict[str, Any]:
+        """``disorder_filter``, building the code hierarchy on the retrieval pool if needed"""
+        if self._code_hierarchy is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self.disorder_filter, code_prefix)
+        return self.disorder_filter(code_prefix)
+
+    def symptom_filter(self, symptoms: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Where filter selecting the disorder partitions relevant to detected symptoms"""
+        codes = sorted(self.code_hierarchy.codes_for_symptoms(symptoms))
+        if not codes:
+            return None
+        return {"disorder_code": {"$in": codes}}
+
+    def _index_files(self) -> List[str]:
+        """Side files written next to the collection at ingestion"""
+        persist_dir, name = settings.chroma_persist_dir, settings.chroma_collection_name
+        return [
+            index_path(persist_dir, name),
+            sentence_index.index_path(persist_dir, name),
+            table_path(persist_dir, name),
+        ]
+
+    def _read_stored_marker(self) -> Tuple[Any, ...]:
+        """
+        Collection ID and size as stored by ChromaDB plus the mtimes of the
+        ingestion side files. Re-ingestion creates a new collection and
+        rewrites the side files, so the marker changes even when another
+        process did the writing.
+        """
+        try:
+            stored = self.client.get_collection(settings.chroma_collection_name)
+            identity: Tuple[Any, ...] = (str(stored.id), stored.count())
+        except Exception:
+            identity = (None, 0)
+        mtimes = tuple(
+            os.path.getmtime(path) if os.path.exists(path) else 0.0
+            for path in self._index_files()
+        )
+        return identity + mtimes
+
+    def check_stored_index(self) -> bool:
+        """
+        Compare the persisted index with the one the in-memory caches were
+        built from, and drop those caches (count, in-memory matrix, BM25,
+        code hierarchy, sentence index and listeners' state) if it changed.
+        Blocking; async callers use ``arefresh_if_changed``.
+        """
+        marker = self._read_stored_marker()
+        previous, self._stored_marker = self._stored_marker, marker
+        if previous is None or previous == marker:
+            return False
+        logger.info("Persisted index changed (re-ingestion?); reloading in-memory indexes")
+        self._collection = None
+        self._notify_index_change()
+        self._stored_marker = marker
+        return True
+
+    async def arefresh_if_changed(self, force: bool = False) -> bool:
+        """
+        ``check_stored_index`` on the retrieval pool, at most once per
+        INDEX_REFRESH_INTERVAL_SECONDS unless ``force`` (the health check).
+        """
+        interval = settings.index_refresh_interval_seconds
+        now = time.monotonic()
+        if not force and (
+            interval <= 0
+            or (self._marker_checked_at is not None and now - self._marker_checked_at < interval)
+        ):
+            return False
+        self._marker_checked_at = now
+        loop = asyncio.get_running_loop()
+        changed = await loop.run_in_executor(self._executor, self.check_stored_index)
+        if changed:
+            # Rebuilt here so request handlers never read the whole collection
+            await loop.run_in_executor(self._executor, lambda: self.code_hierarchy)
+        return changed
+
+    def _notify_index_change(self):
+        # Our own write: take a fresh baseline instead of reporting it again
+        self._stored_marker = None
+        self._doc_count = None
+        self._numpy_index = None
+        self._code_hierarchy = None
+        self._bm25_index = None
+        self._sentence_index_loaded = False
+        self._write_generation += 1
+        version = self.index_version
+        for callback in self._index_listeners:
+            try:
+                callback(version)
+            except Exception as e:
+                logger.warning(f"Index change listener failed: {e}")
+
+    def _plan(self, top_k: Optional[int]) -> Optional[tuple]:
+        """Resolve (k, hybrid candidate pool size), or None when the collection is empty"""
+        k = top_k or settings.retrieval_top_k
+        doc_count = self.document_count
+
+        if doc_count == 0:
+            logger.warning("ChromaDB collection is empty — no documents to search")
+            return None
+
+        # Clamp k to available document count
+        k = min(k, doc_count)
+        pool = min(max(k, settings.hybrid_candidate_pool), doc_count)
+        return k, pool
+
+    def _use_hybrid(self, query_text: Optional[str], where_document) -> bool:
+        return bool(settings.hybrid_retrieval and query_text and not where_document)
+
     def query(
         self,
         query_embedding: List[float],
         top_k: int = None,
         where: Optional[Dict[str, Any]] = None,
         where_document: Optional[Dict[str, Any]] = None,
+        query_text: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Query the collection by embedding vector.
+        With hybrid retrieval enabled and ``query_text`` given, BM25 results
+        are fused with the vector results by reciprocal-rank fusion.
         Returns documents, metadatas, distances, and ids.
         """
-        k = top_k or settings.retrieval_top_k
-        doc_count = self.collection.count()
-
-        if doc_count == 0:
-            logger.warning("ChromaDB collection is empty — no documents to search")
+        plan = self._plan(top_k)
+        if plan is None:
             return {"documents": [], "metadatas": [], "distances": [], "ids": []}
+        k, pool = plan
 
-        # Clamp k to available document count
-        k = min(k, doc_count)
+        if self._use_hybrid(query_text, where_document):
+            vector = self._vector_query(query_embedding, pool, where)
+            lexical = self.bm25_index.search(query_text, pool)
+            return self._fuse(vector, lexical, query_embedding, k, where)
+
+        return self._vector_query(query_embedding, k, where, where_document)
+
+    def _vector_query(
+        self,
+        query_embedding: List[float],
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        if self.uses_memory_index and not where_document:
+            try:
+                return self.numpy_index.query(query_embedding, k, where)
+            except UnsupportedFilterError as e:
+                logger.debug(f"{e}; falling back to ChromaDB")
 
         query_params = {
             "query_embeddings": [query_embedding],
@@ -79,10 +432,240 @@ class RetrievalService:
             "ids": results["ids"][0] if results["ids"] else [],
         }
 
+    def _fetch_candidates(
+        self,
+        chunk_ids: List[str],
+        query_embedding: List[float],
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, tuple]:
+        """Fetch chunks by ID (honouring ``where``) with their distance to the query"""
+        if self.uses_memory_index:
+            try:
+                return self.numpy_index.lookup(chunk_ids, query_embedding, where)
+            except UnsupportedFilterError:
+                pass
+
+        params = {"ids": chunk_ids, "include": ["documents", "metadatas", "embeddings"]}
+        if where:
+            params["where"] = where
+        data = self.collection.get(**params)
+        if not data["ids"]:
+            return {}
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        distances = 1.0 - vectors @ query
+
+        return {
+            chunk_id: (doc, meta, float(dist))
+            for chunk_id, doc, meta, dist in zip(
+                data["ids"], data["documents"], data["metadatas"], distances
+            )
+        }
+
+    def _fuse(
+        self,
+        vector: Dict[str, Any],
+        lexical: List[tuple],
+        query_embedding: List[float],
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Merge vector and BM25 rankings with reciprocal-rank fusion"""
+        known = {
+            chunk_id: (doc, meta, dist)
+            for chunk_id, doc, meta, dist in zip(
+                vector["ids"], vector["documents"], vector["metadatas"], vector["distances"]
+            )
+        }
+
+        lexical_ids = [chunk_id for chunk_id, _ in lexical]
+        missing = [chunk_id for chunk_id in lexical_ids if chunk_id not in known]
+        if missing:
+            known.update(self._fetch_candidates(missing, query_embedding, where))
+        # Lexical hits excluded by the where filter are dropped here
+        lexical_ids = [chunk_id for chunk_id in lexical_ids if chunk_id in known]
+
+        fused = reciprocal_rank_fusion([vector["ids"], lexical_ids], k=settings.rrf_k)[:k]
+
+        result = {"documents": [], "metadatas": [], "distances": [], "ids": []}
+        for chunk_id, _ in fused:
+            doc, meta, dist = known[chunk_id]
+            result["documents"].append(doc)
+            result["metadatas"].append(meta)
+            result["distances"].append(dist)
+            result["ids"].append(chunk_id)
+        return result
+
+    def get_embeddings(self, chunk_ids: List[str]) -> np.ndarray:
+        """Stored embeddings for the given chunk IDs, as a float32 matrix in input order"""
+        if not chunk_ids:
+            dims = (self.embedding_identity or {}).get(
+                "embedding_dimensions", settings.embedding_dimensions
+            )
+            return np.zeros((0, dims), dtype=np.float32)
+        if self.uses_memory_index:
+            return self.numpy_index.vectors_for(chunk_ids)
+
+        data = self.collection.get(ids=chunk_ids, include=["embeddings"])
+        by_id = dict(zip(data["ids"], data["embeddings"]))
+        return np.asarray([by_id[i] for i in chunk_ids], dtype=np.float32)
+
+    async def aget_embeddings(self, chunk_ids: List[str]) -> np.ndarray:
+        """Async ``get_embeddings`` on the retrieval thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.get_embeddings, chunk_ids)
+
+    async def aquery(
+        self,
+        query_embedding: List[float],
+        top_k: int = None,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        query_text: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Async ``query``: runs the blocking search on the retrieval thread pool.
+        In hybrid mode the vector and BM25 searches run concurrently.
+        """
+        loop = asyncio.get_running_loop()
+
+        if not self._use_hybrid(query_text, where_document):
+            return await loop.run_in_executor(
+                self._executor,
+                lambda: self.query(query_embedding, top_k, where, where_document),
+            )
+
+        if self._doc_count is None:
+            # Needs collection.count(); keep it off the event loop
+            plan = await loop.run_in_executor(self._executor, self._plan, top_k)
+        else:
+            plan = self._plan(top_k)
+        if plan is None:
+            return {"documents": [], "metadatas": [], "distances": [], "ids": []}
+        k, pool = plan
+
+        vector, lexical = await asyncio.gather(
+            loop.run_in_executor(
+                self._executor, lambda: self._vector_query(query_embedding, pool, where)
+            ),
+            loop.run_in_executor(
+                self._executor, lambda: self.bm25_index.search(query_text, pool)
+            ),
+        )
+        return await loop.run_in_executor(
+            self._executor,
+            lambda: self._fuse(vector, lexical, query_embedding, k, where),
+        )
+
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = None,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Vector search for many query embeddings sharing one where filter.
+        ChromaDB receives them in a single ``query`` call; the in-memory
+        index scores them in one matrix product.
+        Returns one flattened result per query, in input order.
+        """
+        plan = self._plan(top_k)
+        if plan is None or not query_embeddings:
+            return [{"documents": [], "metadatas": [], "distances": [], "ids": []} for _ in query_embeddings]
+        k, _ = plan
+
+        if self.uses_memory_index:
+            try:
+                return self.numpy_index.query_batch(query_embeddings, k, where)
+            except UnsupportedFilterError as e:
+                logger.debug(f"{e}; falling back to ChromaDB")
+
+        query_params = {"query_embeddings": query_embeddings, "n_results": k}
+        if where:
+            query_params["where"] = where
+        results = self.collection.query(**query_params)
+
+        return [
+            {
+                "documents": results["documents"][i],
+                "metadatas": results["metadatas"][i],
+                "distances": results["distances"][i],
+                "ids": results["ids"][i],
+            }
+            for i in range(len(query_embeddings))
+        ]
+
+    async def aquery_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = None,
+        where: Optional[Dict[str, Any]] = None,
+        query_texts: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Async ``query_batch`` on the retrieval thread pool. In hybrid mode each
+        query also needs its BM25 leg, so queries run concurrently via ``aquery``.
+        """
+        if query_texts and self._use_hybrid(query_texts[0], None):
+            return list(await asyncio.gather(*(
+                self.aquery(query_embedding=embedding, top_k=top_k, where=where, query_text=text)
+                for embedding, text in zip(query_embeddings, query_texts)
+            )))
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: self.query_batch(query_embeddings, top_k, where)
+        )
+
+    async def amulti_query(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = None,
+        where: Optional[Dict[str, Any]] = None,
+        query_texts: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run one search per query embedding concurrently and fuse the rankings
+        with reciprocal-rank fusion, deduplicated by chunk ID. Each chunk keeps
+        its smallest distance to any of the queries.
+        """
+        texts = query_texts or [None] * len(query_embeddings)
+        results = await asyncio.gather(*(
+            self.aquery(query_embedding=embedding, top_k=top_k, where=where, query_text=text)
+            for embedding, text in zip(query_embeddings, texts)
+        ))
+
+        known: Dict[str, tuple] = {}
+        for result in results:
+            for chunk_id, doc, meta, dist in zip(
+                result["ids"], result["documents"], result["metadatas"], result["distances"]
+            ):
+                if chunk_id not in known or dist < known[chunk_id][2]:
+                    known[chunk_id] = (doc, meta, dist)
+
+        k = top_k or settings.retrieval_top_k
+        fused = reciprocal_rank_fusion([r["ids"] for r in results], k=settings.rrf_k)[:k]
+
+        merged = {"documents": [], "metadatas": [], "distances": [], "ids": []}
+        for chunk_id, _ in fused:
+            doc, meta, dist = known[chunk_id]
+            merged["documents"].append(doc)
+            merged["metadatas"].append(meta)
+            merged["distances"].append(dist)
+            merged["ids"].append(chunk_id)
+        return merged
+
+    def shutdown(self):
+        """Stop the retrieval thread pool"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the current collection"""
         try:
-            count = self.collection.count()
+            count = self.refresh_count()
             return {
                 "collection_name": settings.chroma_collection_name,
                 "document_count": count,
@@ -114,19 +697,23 @@ class RetrievalService:
             metadatas=metadatas,
         )
         logger.info(f"Added {len(ids)} documents to collection")
+        self._notify_index_change()
 
     def delete_collection(self):
         """Delete the entire collection for re-ingestion"""
         try:
             self.client.delete_collection(settings.chroma_collection_name)
             self._collection = None
+            self._numpy_index = None
+            self._code_hierarchy = None
             logger.info(f"Deleted collection '{settings.chroma_collection_name}'")
+            self._notify_index_change()
         except Exception as e:
             logger.warning(f"Could not delete collection: {e}")
 
     def is_ready(self) -> bool:
         """Check if the collection exists and has documents"""
         try:
-            return self.collection.count() > 0
+            return self.document_count > 0
         except Exception:
             return False
@@ -0,0 +1,271 @@
+"""Per-sentence embeddings of every chunk for query-focused context compression"""
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+# Shorter pieces (list markers, headings, "Criterion A.") stay with the next sentence
+MIN_SENTENCE_CHARS = 25
+# Marks text dropped between kept sentences
+GAP_MARKER = " [...] "
+_GAP_TOKENS = 3
+
+
+def index_path(persist_dir: str, collection_name: str) -> str:
+    """Location of the sentence index stored next to the Chroma collection"""
+    return os.path.join(persist_dir, f"{collection_name}_sentences.npz")
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the sentences in ``text``, whitespace trimmed"""
+    spans = []
+    pending: Optional[int] = None
+    last_end = 0
+    start = 0
+    breaks = [(m.start(), m.end()) for m in _SENTENCE_BREAK.finditer(text)]
+    for end, next_start in breaks + [(len(text), len(text))]:
+        piece = text[start:end]
+        s = start + len(piece) - len(piece.lstrip())
+        e = end - (len(piece) - len(piece.rstrip()))
+        start = next_start
+        if e <= s:
+            continue
+        if pending is not None:
+            s, pending = pending, None
+        last_end = e
+        if e - s < MIN_SENTENCE_CHARS:
+            pending = s
+            continue
+        spans.append((s, e))
+    if pending is not None:
+        if spans:
+            spans[-1] = (spans[-1][0], last_end)
+        else:
+            spans.append((pending, last_end))
+    return spans
+
+
+class SentenceIndex:
+    """
+    Sentence spans, token counts and unit-normalised embeddings for every
+    chunk, stored in CSR form like the BM25 index:
+
+    - ``offsets[r]:offsets[r + 1]`` slices ``starts`` / ``ends`` / ``tokens`` /
+      ``vectors`` for the chunk in row ``r`` of ``ids``
+    - ``chunk_starts[r]``: the chunk's ``char_start`` in its section (-1 if
+      unknown), so sentences of merged chunks can be placed in the merged text
+
+    Built at ingestion so compressing a request's context needs no
+    embedding calls, only one matrix-vector product. ``identity`` records
+    the embedding provider, model and dimensions of ``vectors``.
+    """
+
+    def __init__(self, identity: Optional[Dict[str, Any]] = None):
+        self.identity: Dict[str, Any] = dict(identity or {})
+        self.ids: List[str] = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.chunk_starts = np.zeros(0, dtype=np.int32)
+        self.starts = np.zeros(0, dtype=np.int32)
+        self.ends = np.zeros(0, dtype=np.int32)
+        self.tokens = np.zeros(0, dtype=np.int32)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._rows: Dict[str, int] = {}
+
+    @property
+    def size(self) -> int:
+        return int(self.starts.shape[0])
+
+    def build(
+        self,
+        ids: List[str],
+        documents: List[str],
+        chunk_starts: List[int],
+        embed: Callable[[List[str]], List[List[float]]],
+        count_tokens: Callable[[str], int],
+        batch_size: int = 256,
+    ) -> "SentenceIndex":
+        """Split every document into sentences and embed them in batches"""
+        offsets = [0]
+        starts: List[int] = []
+        ends: List[int] = []
+        texts: List[str] = []
+        for document in documents:
+            for s, e in split_sentences(document):
+                starts.append(s)
+                ends.append(e)
+                texts.append(document[s:e])
+            offsets.append(len(starts))
+
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(embed(texts[i:i + batch_size]))
+
+        self.ids = list(ids)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.chunk_starts = np.asarray(chunk_starts, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+        self.tokens = np.asarray([count_tokens(t) for t in texts], dtype=np.int32)
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        norms = np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self.vectors = matrix / norms
+        self._index_rows()
+        return self
+
+    def _index_rows(self):
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+
+    def sentence_rows(self, chunk_id: str) -> Optional[Tuple[int, int, int]]:
+        """(first sentence, end, chunk char_start) for a chunk; None if not indexed"""
+        row = self._rows.get(chunk_id)
+        if row is None:
+            return None
+        return int(self.offsets[row]), int(self.offsets[row + 1]), int(self.chunk_starts[row])
+
+    def compress(
+        self,
+        ctx: Dict[str, Any],
+        scores: np.ndarray,
+        rows: List[Tuple[int, int]],
+        budget: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        ``ctx`` reduced to its best-scoring sentences within ``budget`` tokens,
+        kept in document order. ``rows`` are (sentence index, offset into the
+        context's text) pairs aligned with ``scores``. None if nothing changes.
+        """
+        document = ctx["document"]
+        kept: List[Tuple[int, int]] = []
+        used = 0
+        for i in np.argsort(-scores, kind="stable"):
+            sentence, shift = rows[i]
+            cost = int(self.tokens[sentence]) + _GAP_TOKENS
+            if kept and used + cost > budget:
+                continue
+            start = int(self.starts[sentence]) + shift
+            end = int(self.ends[sentence]) + shift
+            if start < 0 or end > len(document):
+                return None
+            kept.append((start, end))
+            used += cost
+
+        pieces: List[str] = []
+        last_end = 0
+        for start, end in sorted(kept):
+            if start < last_end:
+                # Same text seen through both members of a merged span
+                continue
+            if pieces and start > last_end and document[last_end:start].strip():
+                pieces.append(GAP_MARKER)
+            elif pieces:
+                pieces.append(document[last_end:start])
+            pieces.append(document[start:end])
+            last_end = end
+        text = "".join(pieces)
+        if len(text) >= len(document.strip()):
+            return None
+        return {
+            **ctx,
+            "document": text,
+            "original_document": document,
+            "metadata": {**ctx["metadata"], "token_count": used},
+        }
+
+    # --- Persistence ---
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            offsets=self.offsets,
+            chunk_starts=self.chunk_starts,
+            starts=self.starts,
+            ends=self.ends,
+            tokens=self.tokens,
+            vectors=self.vectors,
+            meta=np.frombuffer(
+                json.dumps({"ids": self.ids, "identity": self.identity}).encode(),
+                dtype=np.uint8,
+            ),
+        )
+        os.replace(tmp_path, path)
+        logger.info(f"Sentence index saved: {len(self.ids)} chunks, {self.size} sentences -> {path}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SentenceIndex"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode())
+            index = cls(identity=meta.get("identity"))
+            index.ids = meta["ids"]
+            index.offsets = data["offsets"]
+            index.chunk_starts = data["chunk_starts"]
+            index.starts = data["starts"]
+            index.ends = data["ends"]
+            index.tokens = data["tokens"]
+            index.vectors = data["vectors"]
+        index._index_rows()
+        return index
+
+
+def compress_context(
+    retrieved_context: List[Dict[str, Any]],
+    index: SentenceIndex,
+    query_embedding: List[float],
+    budget: int,
+    chunk_tokens: Callable[[Dict[str, Any]], int],
+) -> List[Dict[str, Any]]:
+    """
+    Keep the sentences of each reference most similar to the query, up to
+    ``budget`` tokens per reference. Every sentence is scored with a single
+    matrix-vector product. References within budget, or whose chunks are
+    not in the index, are left whole; IDs and metadata are unchanged so
+    sources still cite the original chunks.
+    """
+    plans = []
+    sentence_ids: List[int] = []
+    for position, ctx in enumerate(retrieved_context):
+        if chunk_tokens(ctx) <= budget:
+            continue
+        base = int((ctx.get("metadata") or {}).get("char_start", -1))
+        rows: List[Tuple[int, int]] = []
+        for chunk_id in ctx.get("merged_ids") or [ctx["id"]]:
+            found = index.sentence_rows(chunk_id)
+            if found is None:
+                rows = []
+                break
+            first, end, chunk_start = found
+            if "merged_ids" in ctx and (chunk_start < 0 or base < 0):
+                rows = []
+                break
+            # Sentences of a merged member are shifted to its place in the merged text
+            shift = chunk_start - base if "merged_ids" in ctx else 0
+            rows.extend((sentence, shift) for sentence in range(first, end))
+        if rows:
+            plans.append((position, len(sentence_ids), rows))
+            sentence_ids.extend(sentence for sentence, _ in rows)
+
+    if not plans:
+        return retrieved_context
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    scores = index.vectors[np.asarray(sentence_ids, dtype=np.int64)] @ query
+
+    compressed = list(retrieved_context)
+    for position, offset, rows in plans:
+        reduced = index.compress(
+            retrieved_context[position], scores[offset:offset + len(rows)], rows, budget
+        )
+        if reduced is not None:
+            compressed[position] = reduced
+    return compressed
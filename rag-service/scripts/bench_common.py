@@ -0,0 +1,60 @@
+"""Shared helpers for the retrieval benchmark scripts"""
+import random
+import tempfile
+from typing import List
+
+
+def random_vector(dim: int) -> List[float]:
+    return [random.gauss(0.0, 1.0) for _ in range(dim)]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def use_synthetic_collection(settings):
+    """Point settings at a throwaway ChromaDB directory for synthetic benchmarks"""
+    settings.chroma_persist_dir = tempfile.mkdtemp(prefix="bench_chroma_")
+    settings.chroma_collection_name = "bench"
+
+
+_WORDS = (
+    "depressed mood anhedonia interest pleasure weight appetite insomnia hypersomnia "
+    "psychomotor agitation retardation fatigue energy worthlessness guilt concentration "
+    "indecisiveness suicidal ideation criterion episode disorder specifier severity "
+    "remission anxiety panic manic hypomanic bipolar trauma adjustment duration weeks "
+    "impairment social occupational functioning clinical significant distress"
+).split()
+
+
+def random_text(n_words: int = 120) -> str:
+    """DSM-flavoured filler text so lexical benchmarks have realistic postings"""
+    words = [random.choice(_WORDS) for _ in range(n_words)]
+    words.append(random.choice(["F32", "F32.1", "F33.1", "F41.1", "F31"]))
+    words.append(f"Criterion {random.choice('ABCDE')}{random.randint(1, 9)}")
+    return " ".join(words)
+
+
+def fill_synthetic_collection(service, n: int, dim: int, batch_size: int = 500):
+    """Add n random vectors with DSM-like metadata to the service's collection"""
+    codes = ["F32", "F32.1", "F33.1", "F41.1", "F31", "F43.10", ""]
+    section_types = ["diagnostic_criteria", "diagnostic_features", "differential_diagnosis", "general"]
+    print(f"Building synthetic collection with {n} vectors ({dim} dims)...")
+    for start in range(0, n, batch_size):
+        count = min(batch_size, n - start)
+        service.add_documents(
+            ids=[f"syn_{start + i}" for i in range(count)],
+            documents=[random_text() for _ in range(count)],
+            embeddings=[random_vector(dim) for _ in range(count)],
+            metadatas=[
+                {
+                    "disorder_code": random.choice(codes),
+                    "section_type": random.choice(section_types),
+                }
+                for _ in range(count)
+            ],
+        )
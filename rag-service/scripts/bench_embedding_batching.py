@@ -0,0 +1,118 @@
+"""
+Embedding micro-batching benchmark
+Fires N concurrent single-query embeddings through EmbeddingService with
+micro-batching off and on, and reports provider calls and p50/p99 latency.
+
+The default "simulated" provider adds a fixed per-call latency plus a small
+per-input cost to deterministic hashing vectors, like a remote API. Use
+--provider openai (with OPENAI_BASE_URL pointing at scripts/mock_openai.py
+or the real API) to measure against an HTTP endpoint.
+
+Usage:
+    python scripts/bench_embedding_batching.py
+    python scripts/bench_embedding_batching.py --concurrency 200 --window-ms 10 --max-size 128
+    python scripts/bench_embedding_batching.py --provider openai --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List, Tuple
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_common import percentile, random_text  # noqa: E402
+
+
+def simulated_provider(call_ms: float, per_input_ms: float):
+    """Hashing vectors behind a remote-API-like latency"""
+    from app.services.embedding_providers import HashingEmbeddingProvider
+
+    class SimulatedRemoteProvider(HashingEmbeddingProvider):
+        async def embed(self, texts, stats=None, deadline=None):
+            await asyncio.sleep((call_ms + per_input_ms * len(texts)) / 1000)
+            return self._encode(texts)
+
+    return SimulatedRemoteProvider()
+
+
+async def run_round(service, queries: List[str], concurrency: int) -> Tuple[List[float], float]:
+    """Embed ``queries`` with at most ``concurrency`` in flight; returns latencies and wall time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(text: str):
+        async with semaphore:
+            start = time.perf_counter()
+            await service.embed_text(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in queries))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding micro-batching under concurrency")
+    parser.add_argument("--provider", choices=["simulated", "openai"], default="simulated")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent requests (default: 50)")
+    parser.add_argument("--requests", type=int, default=500, help="Total requests per run (default: 500)")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Fraction of repeated texts (default: 0.1)")
+    parser.add_argument("--window-ms", type=float, default=5.0, help="Batching window (default: 5)")
+    parser.add_argument("--max-size", type=int, default=64, help="Max texts per batch (default: 64)")
+    parser.add_argument("--call-ms", type=float, default=80.0, help="Simulated per-call latency (default: 80)")
+    parser.add_argument(
+        "--per-input-ms",
+        type=float,
+        default=0.5,
+        help="Simulated extra latency per input text (default: 0.5)",
+    )
+    args = parser.parse_args()
+
+    from app.config.settings import settings
+    from app.services.embedding_providers import create_provider
+    from app.services.embedding_service import EmbeddingService
+
+    # Measure the provider path only; repeated texts would otherwise be cache hits
+    settings.embedding_cache_enabled = False
+    settings.embedding_batch_window_ms = args.window_ms
+    settings.embedding_batch_max_size = args.max_size
+
+    unique = [random_text(40) for _ in range(args.requests)]
+    repeats = int(args.requests * args.duplicates)
+    queries = unique[: args.requests - repeats] + unique[:repeats]
+
+    print(
+        f"{args.requests} single-query embeddings, {args.concurrency} concurrent, "
+        f"{repeats} repeated texts, provider={args.provider}\n"
+    )
+    results = {}
+    for batching in (False, True):
+        settings.embedding_microbatch_enabled = batching
+        provider = (
+            simulated_provider(args.call_ms, args.per_input_ms)
+            if args.provider == "simulated"
+            else create_provider("openai")
+        )
+        service = EmbeddingService(provider)
+        try:
+            latencies, wall = asyncio.run(run_round(service, queries, args.concurrency))
+        finally:
+            service.close()
+        label = f"batching (window {args.window_ms:g}ms, max {args.max_size})" if batching else "no batching"
+        results[batching] = service._api_calls
+        print(
+            f"  {label:<34} API calls {service._api_calls:5d} | "
+            f"p50 {percentile(latencies, 50):8.1f}ms | "
+            f"p99 {percentile(latencies, 99):8.1f}ms | "
+            f"{len(queries) / wall:8.1f} req/s"
+        )
+
+    if results[True]:
+        print(f"\nAPI call reduction: {results[False] / results[True]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
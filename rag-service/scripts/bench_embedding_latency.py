@@ -0,0 +1,71 @@
+"""
+Query-embedding latency benchmark
+Times single-query embeddings through each embedding provider (no cache) and
+reports p50/p99, so the local CPU backend can be compared with the OpenAI API.
+
+Usage:
+    python scripts/bench_embedding_latency.py
+    python scripts/bench_embedding_latency.py --providers local openai --queries 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_common import percentile, random_text  # noqa: E402
+
+
+async def time_provider(provider, queries: List[str], warmup: int = 5) -> List[float]:
+    for text in queries[:warmup]:
+        await provider.embed([text])
+    latencies = []
+    for text in queries:
+        start = time.perf_counter()
+        await provider.embed([text])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query-embedding latency per provider")
+    parser.add_argument(
+        "--providers",
+        nargs="+",
+        choices=["openai", "local", "hashing"],
+        default=None,
+        help="Providers to compare (default: local, hashing, plus openai if OPENAI_API_KEY is set)",
+    )
+    parser.add_argument("--queries", type=int, default=100, help="Queries per provider (default: 100)")
+    parser.add_argument("--words", type=int, default=40, help="Words per query (default: 40)")
+    args = parser.parse_args()
+
+    from app.config.settings import settings
+    from app.services.embedding_providers import create_provider
+
+    names = args.providers or ["local", "hashing"] + (["openai"] if settings.openai_api_key else [])
+    queries = [random_text(args.words) for _ in range(args.queries)]
+
+    print(f"{args.queries} single-query embeddings per provider, ~{args.words} words each\n")
+    for name in names:
+        provider = create_provider(name)
+        try:
+            latencies = asyncio.run(time_provider(provider, queries))
+        except Exception as e:
+            print(f"  {name:<8} failed: {e}")
+            continue
+        finally:
+            provider.close()
+        print(
+            f"  {name:<8} {provider.model} ({provider.dimensions}d): "
+            f"p50 {percentile(latencies, 50):8.2f}ms | "
+            f"p99 {percentile(latencies, 99):8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Event-loop lag benchmark for retrieval
+Runs concurrent retrievals against ChromaDB while a heartbeat task measures
+how late the event loop wakes it up. Compares the blocking
+RetrievalService.query (called directly on the loop, as before) with
+RetrievalService.aquery (dedicated thread pool).
+
+Uses the configured collection, or a throwaway synthetic one with --synthetic.
+
+Usage:
+    python scripts/bench_event_loop_lag.py
+    python scripts/bench_event_loop_lag.py --synthetic 3000 --concurrency 32 --queries 400
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_common import (  # noqa: E402
+    fill_synthetic_collection,
+    percentile,
+    random_vector,
+    use_synthetic_collection,
+)
+
+
+async def heartbeat(lags: List[float], stop: asyncio.Event, interval: float = 0.001):
+    """Sleep for a fixed interval and record how late each wake-up is (ms)"""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, (time.perf_counter() - expected) * 1000))
+
+
+async def run_mode(service, mode: str, queries: List[List[float]], concurrency: int):
+    lags: List[float] = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(vector):
+        async with semaphore:
+            if mode == "blocking":
+                service.query(query_embedding=vector)
+                # Yield so other coroutines (and the heartbeat) get a turn
+                await asyncio.sleep(0)
+            else:
+                await service.aquery(query_embedding=vector)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(v) for v in queries))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await beat
+
+    print(f"\n  [{mode}]")
+    print(f"    Throughput: {len(queries) / elapsed:.1f} queries/s ({elapsed:.2f}s total)")
+    print(f"    Loop lag p50: {percentile(lags, 50):.2f}ms")
+    print(f"    Loop lag p99: {percentile(lags, 99):.2f}ms")
+    print(f"    Loop lag max: {max(lags) if lags else 0.0:.2f}ms")
+    print(f"    Mean lag: {statistics.mean(lags) if lags else 0.0:.2f}ms over {len(lags)} heartbeats")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure event-loop lag during retrieval")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent queries (default: 16)")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Build a temporary collection with N random vectors instead of using the configured one",
+    )
+    args = parser.parse_args()
+
+    from app.config.settings import settings
+
+    if args.synthetic:
+        use_synthetic_collection(settings)
+
+    from app.services.retrieval_service import RetrievalService
+
+    service = RetrievalService()
+    dim = settings.embedding_dimensions
+
+    if args.synthetic:
+        fill_synthetic_collection(service, args.synthetic, dim)
+
+    if service.document_count == 0:
+        print("Error: collection is empty. Ingest first or pass --synthetic N")
+        sys.exit(1)
+
+    print(f"Collection: {service.document_count} documents")
+    print(f"Queries: {args.queries}, concurrency: {args.concurrency}, "
+          f"retrieval workers: {settings.retrieval_workers}")
+
+    queries = [random_vector(dim) for _ in range(args.queries)]
+
+    # Warm up HNSW index loading before measuring
+    service.query(query_embedding=queries[0])
+
+    asyncio.run(run_mode(service, "blocking", queries, args.concurrency))
+    asyncio.run(run_mode(service, "executor", queries, args.concurrency))
+
+    service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Hybrid retrieval latency benchmark
+Times vector-only RetrievalService.aquery against hybrid BM25 + vector
+retrieval with reciprocal-rank fusion over the same collection, and reports
+how much the lexical leg adds.
+
+Usage:
+    python scripts/bench_hybrid_retrieval.py
+    python scripts/bench_hybrid_retrieval.py --synthetic 3000 --backend numpy
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_common import (  # noqa: E402
+    fill_synthetic_collection,
+    percentile,
+    random_text,
+    random_vector,
+    use_synthetic_collection,
+)
+
+
+async def time_queries(service, queries, hybrid: bool) -> List[float]:
+    from app.config.settings import settings
+
+    settings.hybrid_retrieval = hybrid
+    latencies = []
+    for vector, text in queries:
+        start = time.perf_counter()
+        await service.aquery(query_embedding=vector, query_text=text)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid BM25 + vector retrieval")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries (default: 200)")
+    parser.add_argument(
+        "--backend",
+        choices=["chroma", "numpy", "partitioned"],
+        default=None,
+        help="Vector backend (default: settings)",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Build a temporary collection with N random chunks instead of using the configured one",
+    )
+    args = parser.parse_args()
+
+    from app.config.settings import settings
+
+    if args.synthetic:
+        use_synthetic_collection(settings)
+    if args.backend:
+        settings.retrieval_backend = args.backend
+
+    from app.services.retrieval_service import RetrievalService
+
+    service = RetrievalService()
+    dim = settings.embedding_dimensions
+    if args.synthetic:
+        fill_synthetic_collection(service, args.synthetic, dim)
+
+    if service.document_count == 0:
+        print("Error: collection is empty. Ingest first or pass --synthetic N")
+        sys.exit(1)
+
+    settings.hybrid_retrieval = True
+    service.load_index()
+    print(f"Collection: {service.document_count} documents, backend: {service.backend}")
+    print(f"BM25 index: {service.bm25_index.size} docs, {len(service.bm25_index.vocab)} terms")
+
+    queries = [(random_vector(dim), random_text(60)) for _ in range(args.queries)]
+
+    async def run():
+        await time_queries(service, queries[:5], hybrid=True)  # warm up
+        vector_lat = await time_queries(service, queries, hybrid=False)
+        hybrid_lat = await time_queries(service, queries, hybrid=True)
+        return vector_lat, hybrid_lat
+
+    vector_lat, hybrid_lat = asyncio.run(run())
+
+    for label, latencies in (("vector", vector_lat), ("hybrid", hybrid_lat)):
+        print(
+            f"  {label:<7} p50 {percentile(latencies, 50):7.2f}ms | "
+            f"p95 {percentile(latencies, 95):7.2f}ms | "
+            f"p99 {percentile(latencies, 99):7.2f}ms"
+        )
+    print(f"  Hybrid overhead at p50: {percentile(hybrid_lat, 50) - percentile(vector_lat, 50):+.2f}ms")
+
+    service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
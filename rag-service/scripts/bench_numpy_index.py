@@ -0,0 +1,113 @@
+"""
+NumPy index vs ChromaDB retrieval benchmark
+Times RetrievalService queries through ChromaDB (HNSW + SQLite) and through the
+in-memory NumPy exact-search index over the same collection, with and without
+a metadata filter, and reports top-k overlap between the two.
+
+Usage:
+    python scripts/bench_numpy_index.py
+    python scripts/bench_numpy_index.py --synthetic 3000 --queries 500
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_common import (  # noqa: E402
+    fill_synthetic_collection,
+    percentile,
+    random_vector,
+    use_synthetic_collection,
+)
+
+
+def time_queries(service, backend: str, queries: List[List[float]], where=None):
+    service.backend = backend
+    latencies = []
+    results = []
+    for vector in queries:
+        start = time.perf_counter()
+        results.append(service.query(query_embedding=vector, where=where))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+def report(label: str, latencies: List[float]):
+    print(
+        f"    {label:<8} p50 {percentile(latencies, 50):7.3f}ms | "
+        f"p95 {percentile(latencies, 95):7.3f}ms | "
+        f"p99 {percentile(latencies, 99):7.3f}ms | "
+        f"mean {sum(latencies) / len(latencies):7.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NumPy index against ChromaDB")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries (default: 200)")
+    parser.add_argument("--top-k", type=int, default=None, help="Results per query (default: settings)")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Build a temporary collection with N random vectors instead of using the configured one",
+    )
+    parser.add_argument(
+        "--filter-code",
+        default="F32",
+        help="disorder_code value for the filtered run (default: F32)",
+    )
+    args = parser.parse_args()
+
+    from app.config.settings import settings
+
+    if args.synthetic:
+        use_synthetic_collection(settings)
+    if args.top_k:
+        settings.retrieval_top_k = args.top_k
+
+    from app.services.retrieval_service import RetrievalService
+
+    service = RetrievalService()
+    dim = settings.embedding_dimensions
+    if args.synthetic:
+        fill_synthetic_collection(service, args.synthetic, dim)
+
+    if service.document_count == 0:
+        print("Error: collection is empty. Ingest first or pass --synthetic N")
+        sys.exit(1)
+
+    load_start = time.perf_counter()
+    index_size = service.numpy_index.size
+    load_ms = (time.perf_counter() - load_start) * 1000
+    print(f"Collection: {service.document_count} documents, top_k={settings.retrieval_top_k}")
+    print(f"NumPy index load: {index_size} vectors in {load_ms:.0f}ms")
+
+    queries = [random_vector(dim) for _ in range(args.queries)]
+    time_queries(service, "chroma", queries[:5])  # warm up HNSW
+
+    for label, where in (("unfiltered", None), (f"disorder_code={args.filter_code}", {"disorder_code": args.filter_code})):
+        chroma_lat, chroma_res = time_queries(service, "chroma", queries, where)
+        numpy_lat, numpy_res = time_queries(service, "numpy", queries, where)
+
+        overlaps = []
+        for a, b in zip(chroma_res, numpy_res):
+            if b["ids"]:
+                overlaps.append(len(set(a["ids"]) & set(b["ids"])) / len(b["ids"]))
+
+        print(f"\n  [{label}]")
+        report("chroma", chroma_lat)
+        report("numpy", numpy_lat)
+        speedup = percentile(chroma_lat, 50) / max(percentile(numpy_lat, 50), 1e-6)
+        print(f"    p50 speedup: {speedup:.1f}x")
+        if overlaps:
+            print(f"    top-k overlap with exact search: {sum(overlaps) / len(overlaps):.1%}")
+
+    service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
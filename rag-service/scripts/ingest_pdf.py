@@ -7,6 +7,7 @@ Usage:
     python scripts/ingest_pdf.py --pdf /path/to/DSM-5-TR.pdf
     python scripts/ingest_pdf.py --pdf /path/to/DSM-5-TR.pdf --dry-run
     python scripts/ingest_pdf.py --pdf /path/to/DSM-5-TR.pdf --collection dsm5 --chunk-size 800
+    python scripts/ingest_pdf.py --pdf /path/to/DSM-5-TR.pdf --sentence-index
 """
 import argparse
 import hashlib
@@ -244,6 +245,11 @@ def chunk_text(
     2. Heading detection (uppercase lines, bold markers)
     3. Paragraph boundaries
     4. Size limits with overlap
+
+    Each chunk records its section (``section_index``), its position in the
+    document (``chunk_index``) and its character span in the section's text
+    (``char_start``/``char_end``), so the pipeline can merge neighbouring
+    retrieved chunks and drop their shared overlap.
     """
     chunks = []
 
@@ -291,51 +297,64 @@ def chunk_text(
     print(f"Identified {len(sections)} sections from page content")
 
     # Now chunk each section to the target size
-    for section in sections:
+    for section_index, section in enumerate(sections):
         text = section["text"].strip()
         if not text:
             continue
 
-        # If section fits in one chunk, keep it whole
-        if len(text) <= chunk_size * 1.5:
+        def add_chunk(chunk: str, start: int, start_page: int):
+            # Offsets index the section text the chunk was cut from
+            stripped = chunk.strip()
+            start += len(chunk) - len(chunk.lstrip())
             chunks.append({
-                "text": text,
+                "text": stripped,
                 "section_title": section["title"],
-                "page_range": f"{section['start_page']}-{section['end_page']}",
+                "page_range": f"{start_page}-{section['end_page']}",
+                "section_index": section_index,
+                "char_start": start,
+                "char_end": start + len(stripped),
             })
+
+        # If section fits in one chunk, keep it whole
+        if len(text) <= chunk_size * 1.5:
+            add_chunk(text, 0, section["start_page"])
             continue
 
-        # Split into paragraphs
+        # Split into paragraphs; chunks are spans of the paragraphs rejoined
+        # with blank lines, which is also the text their offsets refer to
         paragraphs = re.split(r"\n\s*\n", text)
         current_chunk = ""
+        chunk_start = 0
+        position = 0  # end of the last paragraph in the rejoined section text
         chunk_start_page = section["start_page"]
 
         for para in paragraphs:
             para = para.strip()
             if not para:
                 continue
+            para_start = position + 2 if position else 0
+            position = para_start + len(para)
 
             # If adding this paragraph would exceed chunk_size
             if len(current_chunk) + len(para) > chunk_size and current_chunk:
-                chunks.append({
-                    "text": current_chunk.strip(),
-                    "section_title": section["title"],
-                    "page_range": f"{chunk_start_page}-{section['end_page']}",
-                })
+                add_chunk(current_chunk, chunk_start, chunk_start_page)
 
                 # Start new chunk with overlap from the end of the previous chunk
                 overlap_text = current_chunk[-chunk_overlap:] if len(current_chunk) > chunk_overlap else current_chunk
+                chunk_start = para_start - 2 - len(overlap_text)
                 current_chunk = overlap_text + "\n\n" + para
+            elif current_chunk:
+                current_chunk += "\n\n" + para
             else:
-                current_chunk += "\n\n" + para if current_chunk else para
+                chunk_start = para_start
+                current_chunk = para
 
         # Save remaining text
         if current_chunk.strip():
-            chunks.append({
-                "text": current_chunk.strip(),
-                "section_title": section["title"],
-                "page_range": f"{chunk_start_page}-{section['end_page']}",
-            })
+            add_chunk(current_chunk, chunk_start, chunk_start_page)
+
+    for chunk_index, chunk in enumerate(chunks):
+        chunk["chunk_index"] = chunk_index
 
     print(f"Created {len(chunks)} chunks")
     return chunks
@@ -365,15 +384,41 @@ def enrich_chunks_with_metadata(chunks: List[Dict[str, Any]]) -> List[Dict[str,
     return chunks
 
 
+def _token_encoder():
+    """Tokenizer of the configured chat model"""
+    import tiktoken
+    from app.config.settings import settings
+
+    try:
+        return tiktoken.encoding_for_model(settings.openai_model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_chunk_tokens(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Store each chunk's token count so the pipeline can pack prompts to the
+    input budget without re-encoding retrieved text on every request.
+    """
+    encoder = _token_encoder()
+    for chunk in chunks:
+        chunk["token_count"] = len(encoder.encode(chunk["text"]))
+    return chunks
+
+
 def ingest_to_chromadb(
     chunks: List[Dict[str, Any]],
     collection_name: str = "dsm5",
     chroma_persist_dir: str = "/data/chroma_db",
     batch_size: int = 50,
+    build_sentence_index: Optional[bool] = None,
 ):
     """
     Generate embeddings and store chunks in ChromaDB.
     Uses the EmbeddingService for OpenAI embeddings.
+    The per-sentence index for context compression embeds every sentence
+    again, so it is only built when ``build_sentence_index`` is set or,
+    when that is None, CONTEXT_COMPRESSION_ENABLED is on.
     """
     from app.services.embedding_service import EmbeddingService
     from app.services.retrieval_service import RetrievalService
@@ -385,6 +430,8 @@ def ingest_to_chromadb(
 
     embedding_service = EmbeddingService()
     retrieval_service = RetrievalService()
+    # Recorded on the new collection so the service rejects a different model
+    retrieval_service.embedding_identity = embedding_service.identity
 
     # Delete existing collection for clean re-ingestion
     retrieval_service.delete_collection()
@@ -394,7 +441,8 @@ def ingest_to_chromadb(
     total = len(chunks)
     print(f"\nIngesting {total} chunks into ChromaDB collection '{collection_name}'")
     print(f"Persist directory: {chroma_persist_dir}")
-    print(f"Embedding model: {settings.embedding_model}")
+    print(f"Embedding model: {embedding_service.model} "
+          f"({embedding_service.provider.name}, {embedding_service.dimensions} dims)")
     print()
 
     for i in range(0, total, batch_size):
@@ -413,6 +461,11 @@ def ingest_to_chromadb(
                 "disorder_code": c.get("disorder_code", ""),
                 "section_type": c.get("section_type", "general"),
                 "page_range": c.get("page_range", ""),
+                "token_count": c.get("token_count", 0),
+                "section_index": c.get("section_index", -1),
+                "chunk_index": c.get("chunk_index", -1),
+                "char_start": c.get("char_start", -1),
+                "char_end": c.get("char_end", -1),
             }
             for c in batch
         ]
@@ -430,6 +483,65 @@ def ingest_to_chromadb(
 
         print(f"    ✓ Batch {batch_num} stored successfully")
 
+    # Build the sparse BM25 index next to the collection for hybrid retrieval
+    from app.services.bm25_index import BM25Index, index_path
+
+    print("\n  Building BM25 lexical index...")
+    bm25 = BM25Index(k1=settings.bm25_k1, b=settings.bm25_b).build(
+        [c["id"] for c in chunks],
+        [c["text"] for c in chunks],
+    )
+    bm25_path = index_path(chroma_persist_dir, collection_name)
+    bm25.save(bm25_path)
+    print(f"    ✓ BM25 index: {len(bm25.vocab)} terms -> {bm25_path}")
+
+    # Embed every chunk sentence once for query-focused context compression
+    from app.services import sentence_index
+
+    if build_sentence_index is None:
+        build_sentence_index = settings.context_compression_enabled
+    sentences_path = sentence_index.index_path(chroma_persist_dir, collection_name)
+    if build_sentence_index:
+        print("\n  Embedding chunk sentences for context compression...")
+        encoder = _token_encoder()
+        sentences = sentence_index.SentenceIndex(identity=embedding_service.identity).build(
+            [c["id"] for c in chunks],
+            [c["text"] for c in chunks],
+            [c.get("char_start", -1) for c in chunks],
+            embed=embedding_service.embed_batch_sync,
+            count_tokens=lambda text: len(encoder.encode(text)),
+        )
+        sentences.save(sentences_path)
+        print(f"    ✓ Sentence index: {sentences.size} sentences -> {sentences_path}")
+    else:
+        # An index from an earlier ingestion no longer matches the collection
+        if os.path.exists(sentences_path):
+            os.remove(sentences_path)
+        print("\n  Skipping sentence index (--sentence-index or CONTEXT_COMPRESSION_ENABLED=true)")
+
+    # Precompute the criterion -> criteria-chunk table used for pinning
+    from app.services.criterion_table import (
+        CRITERION_QUERIES,
+        CriterionTable,
+        fetch_criteria_rows,
+        index_signature,
+        table_path,
+    )
+
+    print("\n  Building criterion table...")
+    criterion_vectors = embedding_service.embed_batch_sync(list(CRITERION_QUERIES.values()))
+    table = CriterionTable(
+        index_signature(retrieval_service.collection, embedding_service.model)
+    ).build(
+        dict(zip(CRITERION_QUERIES, criterion_vectors)),
+        fetch_criteria_rows(retrieval_service.collection),
+        retrieval_service.code_hierarchy,
+        per_disorder=settings.criterion_chunks_per_disorder,
+    )
+    criteria_path = table_path(chroma_persist_dir, collection_name)
+    table.save(criteria_path)
+    print(f"    ✓ Criterion table: {table.size} chunks -> {criteria_path}")
+
     final_count = retrieval_service.collection.count()
     print(f"\n✓ Ingestion complete! {final_count} documents in collection '{collection_name}'")
     return final_count
@@ -477,6 +589,13 @@ def main():
         default=50,
         help="Batch size for embedding generation (default: 50)",
     )
+    parser.add_argument(
+        "--sentence-index",
+        action="store_true",
+        default=None,
+        help="Embed every chunk sentence for context compression "
+             "(default: only when CONTEXT_COMPRESSION_ENABLED is set)",
+    )
 
     args = parser.parse_args()
 
@@ -504,6 +623,7 @@ def main():
     print("STEP 3: Enriching chunks with metadata")
     print("=" * 60)
     chunks = enrich_chunks_with_metadata(chunks)
+    chunks = count_chunk_tokens(chunks)
 
     # Print stats
     disorder_counts = {}
@@ -517,6 +637,7 @@ def main():
     print(f"\nChunk statistics:")
     print(f"  Total chunks: {len(chunks)}")
     print(f"  Avg chunk size: {sum(len(c['text']) for c in chunks) / len(chunks):.0f} chars")
+    print(f"  Avg chunk tokens: {sum(c['token_count'] for c in chunks) / len(chunks):.0f}")
     print(f"\n  By disorder:")
     for disorder, count in sorted(disorder_counts.items(), key=lambda x: -x[1]):
         print(f"    {disorder}: {count}")
@@ -558,6 +679,7 @@ def main():
         collection_name=args.collection,
         chroma_persist_dir=chroma_dir,
         batch_size=args.batch_size,
+        build_sentence_index=args.sentence_index,
     )
 
     elapsed = time.time() - start_time
@@ -0,0 +1,189 @@
+"""
+End-to-end load test: NLP service -> /rag/query
+Sends requests at a fixed target rate (open loop, so slow responses do not
+lower the offered load). Each request runs NLP extraction and then the RAG
+query. The report covers p50/p95/p99 latency per stage, including the RAG
+pipeline_metrics stages, plus throughput and an error breakdown per stage.
+
+Run against scripts/mock_openai.py to avoid spending OpenAI quota.
+
+Usage:
+    python scripts/load_test.py --rps 5 --duration 60
+    python scripts/load_test.py --nlp-url http://localhost:8000 --rag-url http://localhost:8001 --rps 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_common import percentile  # noqa: E402
+from app.services.nlp_bridge import load_criteria, to_pipeline_inputs  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "For the past month I have felt sad and empty nearly every day. I can't sleep "
+    "more than four hours and I've lost interest in seeing my friends.",
+    "I feel worthless and guilty all the time. My concentration is terrible at work "
+    "and I keep thinking that everyone would be better off without me.",
+    "Over the last three weeks I've had no energy, I've been eating much more than "
+    "usual and I sleep twelve hours a day but still feel exhausted.",
+    "Nothing is enjoyable anymore. I used to love painting but I haven't touched it "
+    "in two months. I move and speak slowly and feel hopeless about the future.",
+    "I've been irritable and restless for weeks, pacing around the house, unable to "
+    "decide anything, and I've lost about five kilograms without trying.",
+]
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Counter = Counter()
+        self.completed = 0
+        self.cached = 0
+        self.sent = 0
+        self.elapsed = 0.0
+
+    def record(self, stage: str, ms: float):
+        self.latencies.setdefault(stage, []).append(ms)
+
+    def error(self, stage: str, reason: str):
+        self.errors[(stage, reason)] += 1
+
+
+def _error_reason(exc: Exception) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        try:
+            detail = str(exc.response.json().get("detail", ""))
+        except ValueError:
+            detail = ""
+        # e.g. "HTTP 500: RAG assessment failed: RateLimitError"
+        return f"HTTP {exc.response.status_code}: {detail[:60]}" if detail else f"HTTP {exc.response.status_code}"
+    return type(exc).__name__
+
+
+async def one_request(
+    client: httpx.AsyncClient,
+    args,
+    text: str,
+    stats: LoadStats,
+):
+    start = time.perf_counter()
+    payload: Dict[str, Any] = {"text": text}
+
+    if not args.skip_nlp:
+        try:
+            response = await client.post(f"{args.nlp_url}/nlp/extract-symptoms", json={"text": text})
+            response.raise_for_status()
+            # Same 9-criterion payload the backend and the in-process bridge send
+            payload.update(to_pipeline_inputs(response.json()["data"], args.criteria))
+        except Exception as e:
+            stats.error("nlp", _error_reason(e))
+            return
+        stats.record("nlp_ms", (time.perf_counter() - start) * 1000)
+
+    rag_start = time.perf_counter()
+    try:
+        response = await client.post(f"{args.rag_url}/rag/query", json=payload)
+        response.raise_for_status()
+        data = response.json()["data"]
+    except Exception as e:
+        stats.error("rag", _error_reason(e))
+        return
+    stats.record("rag_http_ms", (time.perf_counter() - rag_start) * 1000)
+
+    # Every timing the pipeline reports, including ones added after this script
+    for stage, value in (data.get("metrics") or {}).items():
+        if stage.endswith("_ms") and isinstance(value, (int, float)):
+            stats.record(f"rag.{stage}", value)
+    if data.get("cached"):
+        stats.cached += 1
+
+    stats.record("end_to_end_ms", (time.perf_counter() - start) * 1000)
+    stats.completed += 1
+
+
+async def run(args) -> LoadStats:
+    stats = LoadStats()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    timeout = httpx.Timeout(args.timeout)
+    rng = random.Random(args.seed)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        tasks = []
+        interval = 1.0 / args.rps
+        total = int(args.rps * args.duration)
+        start = time.perf_counter()
+        for i in range(total):
+            # Open loop: fire on schedule regardless of outstanding requests
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = rng.choice(SAMPLE_TEXTS)
+            if args.unique:
+                text = f"{text} (request {i})"
+            tasks.append(asyncio.create_task(one_request(client, args, text, stats)))
+        await asyncio.gather(*tasks)
+        stats.elapsed = time.perf_counter() - start
+        stats.sent = total
+    return stats
+
+
+def report(stats: LoadStats, args):
+    print(f"\nSent {stats.sent} requests at {args.rps} RPS over {stats.elapsed:.1f}s")
+    print(f"  Completed:  {stats.completed} ({stats.completed / max(stats.elapsed, 1e-9):.2f} req/s)")
+    print(f"  Cached:     {stats.cached}")
+    print(f"  Failed:     {sum(stats.errors.values())}")
+
+    print("\nLatency (ms):")
+    for stage, values in stats.latencies.items():
+        print(
+            f"  {stage:<32} p50 {percentile(values, 50):9.1f} | "
+            f"p95 {percentile(values, 95):9.1f} | "
+            f"p99 {percentile(values, 99):9.1f} | n={len(values)}"
+        )
+
+    if stats.errors:
+        print("\nErrors by stage:")
+        for (stage, reason), count in stats.errors.most_common():
+            print(f"  {stage:<5} {reason:<70} {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the NLP -> RAG pipeline")
+    parser.add_argument("--nlp-url", default="http://localhost:8000", help="NLP service base URL")
+    parser.add_argument("--rag-url", default="http://localhost:8001", help="RAG service base URL")
+    parser.add_argument("--rps", type=float, default=2.0, help="Target requests per second (default: 2)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test duration in seconds (default: 30)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--max-connections", type=int, default=200, help="HTTP connection pool size")
+    parser.add_argument("--skip-nlp", action="store_true", help="Send text straight to /rag/query")
+    parser.add_argument(
+        "--criteria",
+        default=None,
+        help="Criterion table shared with the backend (default: NLP_CRITERIA_PATH)",
+    )
+    parser.add_argument(
+        "--unique",
+        action="store_true",
+        help="Make every request text unique so assessment caches do not hit",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not args.skip_nlp:
+        from app.config.settings import settings
+
+        args.criteria = load_criteria(args.criteria or settings.nlp_criteria_path)
+
+    stats = asyncio.run(run(args))
+    report(stats, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Local OpenAI stand-in for load testing
+Serves /v1/embeddings and /v1/chat/completions (including streaming) with
+configurable latency, error and 429 rates. Embeddings are deterministic
+hashing vectors, and assessments are deterministic JSON derived from the
+prompt. Token usage is counted with tiktoken, and prompt-prefix caching is
+simulated (prefixes of 1024+ tokens in 128-token steps) so usage reports
+cached_tokens like the real API. --ms-per-input-token adds prefill time for
+the uncached prompt, so prompt-size changes show up in llm_ms. Totals are
+available at GET /stats.
+
+Usage:
+    python scripts/mock_openai.py --port 8100
+    python scripts/mock_openai.py --chat-latency-ms 800 --latency-dist lognormal --rate-limit-rate 0.02
+
+Then point the RAG service at it:
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=mock uvicorn app.main:app --port 8001
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from array import array
+from typing import Any, Dict, List, Set
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tiktoken  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from app.services.embedding_providers import HashingEmbeddingProvider  # noqa: E402
+
+_ENCODER = None
+
+_CRITERIA = [
+    ("A1", "Depressed mood most of the day"),
+    ("A2", "Diminished interest or pleasure"),
+    ("A3", "Change in weight or appetite"),
+    ("A4", "Insomnia or hypersomnia"),
+    ("A5", "Psychomotor agitation or retardation"),
+    ("A6", "Fatigue or loss of energy"),
+    ("A7", "Worthlessness or excessive guilt"),
+    ("A8", "Diminished ability to concentrate"),
+    ("A9", "Recurrent thoughts of death"),
+]
+_STRENGTHS = ["strong", "moderate", "weak", "absent"]
+
+# OpenAI caches prompt prefixes of at least 1024 tokens in 128-token increments
+_CACHE_MIN_TOKENS = 1024
+_CACHE_STEP_TOKENS = 128
+
+
+def encoder():
+    """Lazy-load the tiktoken encoder (downloaded on first use)"""
+    global _ENCODER
+    if _ENCODER is None:
+        _ENCODER = tiktoken.get_encoding("cl100k_base")
+    return _ENCODER
+
+
+def count_tokens(text: str) -> int:
+    return len(encoder().encode(text))
+
+
+class MockState:
+    """Runtime configuration plus usage counters"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.embedders: Dict[int, HashingEmbeddingProvider] = {}
+        self.prefix_cache: Set[bytes] = set()
+        self.stats = {
+            "embedding_requests": 0,
+            "chat_requests": 0,
+            "embedding_tokens": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "completion_tokens": 0,
+            "errors_500": 0,
+            "errors_429": 0,
+        }
+
+    def embedder(self, dimensions: int) -> HashingEmbeddingProvider:
+        if dimensions not in self.embedders:
+            self.embedders[dimensions] = HashingEmbeddingProvider(dimensions)
+        return self.embedders[dimensions]
+
+    def cached_prefix(self, tokens: List[int]) -> int:
+        """Length of the longest previously seen cacheable prefix; records this prompt's prefixes"""
+        digest = hashlib.sha256()
+        cached = 0
+        position = 0
+        for end in range(_CACHE_MIN_TOKENS, len(tokens) + 1, _CACHE_STEP_TOKENS):
+            digest.update(array("I", tokens[position:end]).tobytes())
+            position = end
+            key = digest.copy().digest()
+            if key in self.prefix_cache:
+                cached = end
+            else:
+                self.prefix_cache.add(key)
+        return cached
+
+    def latency(self, mean_ms: float) -> float:
+        """Sample a delay in seconds from the configured distribution"""
+        dist = self.args.latency_dist
+        if mean_ms <= 0:
+            return 0.0
+        if dist == "fixed":
+            ms = mean_ms
+        elif dist == "uniform":
+            ms = self.rng.uniform(0.5 * mean_ms, 1.5 * mean_ms)
+        else:
+            # Lognormal with the requested mean and a heavy right tail
+            sigma = self.args.latency_sigma
+            ms = self.rng.lognormvariate(0, sigma) * mean_ms / math.exp(sigma ** 2 / 2)
+        return ms / 1000
+
+    def injected_failure(self):
+        """Return an error response for a sampled 429/500, or None"""
+        roll = self.rng.random()
+        if roll < self.args.rate_limit_rate:
+            self.stats["errors_429"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1", "x-ratelimit-remaining-requests": "0"},
+                content={"error": {
+                    "message": "Rate limit reached (mock)",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }},
+            )
+        if roll < self.args.rate_limit_rate + self.args.error_rate:
+            self.stats["errors_500"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Internal server error (mock)", "type": "server_error"}},
+            )
+        return None
+
+
+def build_assessment(user_prompt: str) -> Dict[str, Any]:
+    """Deterministic ClinicalAssessment-shaped JSON derived from the prompt"""
+    seed = int.from_bytes(hashlib.sha256(user_prompt.encode()).digest()[:8], "little")
+    rng = random.Random(seed)
+    cited = rng.sample(_CRITERIA, k=rng.randint(3, 6))
+    return {
+        "clinical_narrative": (
+            "Mock assessment. The presentation describes "
+            + ", ".join(name.lower() for _, name in cited)
+            + ". This text is generated deterministically for load testing."
+        ),
+        "dsm_references": [
+            {
+                "criteria_code": code,
+                "criteria_text": name,
+                "relevance": "Mentioned in the patient presentation",
+                "evidence_strength": rng.choice(_STRENGTHS),
+            }
+            for code, name in cited
+        ],
+        "differential_considerations": [
+            {
+                "condition": "Persistent Depressive Disorder",
+                "dsm5_code": "F34.1",
+                "rationale": "Duration should be clarified",
+                "distinguishing_features": "Chronic course of at least two years",
+            }
+        ],
+        "severity_rationale": rng.choice(["mild", "moderate", "severe"]) + " (mock)",
+        "recommended_assessments": [{"instrument": "PHQ-9", "purpose": "Quantify severity"}],
+        "risk_factors": ["Mock risk factor"],
+        "protective_factors": ["Mock protective factor"],
+        "confidence_notes": "Deterministic mock output",
+    }
+
+
+def create_app(state: MockState) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI")
+    args = state.args
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        state.stats["embedding_requests"] += 1
+        texts: List[str] = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = int(body.get("dimensions") or 1536)
+
+        await asyncio.sleep(state.latency(args.embed_latency_ms))
+        failure = state.injected_failure()
+        if failure is not None:
+            return failure
+
+        vectors = state.embedder(dimensions).embed_sync(texts)
+        tokens = sum(count_tokens(t) for t in texts)
+        state.stats["embedding_tokens"] += tokens
+        return {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": vector}
+                for i, vector in enumerate(vectors)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state.stats["chat_requests"] += 1
+        messages = body.get("messages", [])
+        prompt_text = "".join(m.get("content") or "" for m in messages)
+        user_prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+
+        await asyncio.sleep(state.latency(args.chat_latency_ms))
+        failure = state.injected_failure()
+        if failure is not None:
+            return failure
+
+        content = json.dumps(build_assessment(user_prompt))
+        prompt_token_ids = encoder().encode(prompt_text)
+        prompt_tokens = len(prompt_token_ids)
+        cached_tokens = state.cached_prefix(prompt_token_ids)
+        completion_tokens = count_tokens(content)
+        # Prefill time grows with the uncached part of the prompt
+        await asyncio.sleep((prompt_tokens - cached_tokens) * args.ms_per_input_token / 1000)
+        state.stats["prompt_tokens"] += prompt_tokens
+        state.stats["cached_prompt_tokens"] += cached_tokens
+        state.stats["completion_tokens"] += completion_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "gpt-4o")
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(completion_tokens * args.ms_per_output_token / 1000)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        async def stream():
+            tokens = encoder().encode(content)
+            step = 8
+            for i in range(0, len(tokens), step):
+                piece = encoder().decode(tokens[i:i + step])
+                await asyncio.sleep(step * args.ms_per_output_token / 1000)
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            if include_usage:
+                usage_chunk = {**final, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return state.stats
+
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Local OpenAI stand-in for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embed-latency-ms", type=float, default=60.0, help="Mean embedding latency")
+    parser.add_argument("--chat-latency-ms", type=float, default=600.0, help="Mean time to first token")
+    parser.add_argument(
+        "--ms-per-output-token",
+        type=float,
+        default=10.0,
+        help="Generation time per completion token (default: 10)",
+    )
+    parser.add_argument(
+        "--ms-per-input-token",
+        type=float,
+        default=0.0,
+        help="Prefill time per uncached prompt token (default: 0)",
+    )
+    parser.add_argument(
+        "--latency-dist",
+        choices=["fixed", "uniform", "lognormal"],
+        default="lognormal",
+        help="Latency distribution around the mean (default: lognormal)",
+    )
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal sigma (default: 0.5)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests failing with 429")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and failure sampling")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    state = MockState(args)
+    print(
+        f"Mock OpenAI on http://{args.host}:{args.port}/v1 "
+        f"(embed ~{args.embed_latency_ms:.0f}ms, chat ~{args.chat_latency_ms:.0f}ms "
+        f"+ {args.ms_per_output_token:.0f}ms/token, {args.latency_dist}, "
+        f"errors {args.error_rate:.1%}, 429s {args.rate_limit_rate:.1%})"
+    )
+    uvicorn.run(create_app(state), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
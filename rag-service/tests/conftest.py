@@ -0,0 +1,32 @@
+"""
+Shared test setup. Tests run without network access: embeddings come from
+the deterministic hashing provider and every on-disk store lives in a
+temporary directory. The environment is set before ``app`` is imported so
+settings pick it up.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_DATA_DIR = tempfile.mkdtemp(prefix="rag_tests_")
+
+os.environ.update({
+    "OPENAI_API_KEY": "test",
+    "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+    "EMBEDDING_PROVIDER": "hashing",
+    "EMBEDDING_DIMENSIONS": "64",
+    "EMBEDDING_CACHE_PATH": "",
+    "CHROMA_PERSIST_DIR": os.path.join(_DATA_DIR, "chroma"),
+    "JOB_QUEUE_PATH": os.path.join(_DATA_DIR, "jobs.db"),
+    "HTTP_WARM_CONNECTIONS": "0",
+})
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Per-test directory for SQLite files and persisted indexes"""
+    return str(tmp_path)
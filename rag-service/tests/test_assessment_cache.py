@@ -0,0 +1,67 @@
+"""AssessmentCache exact and semantic tiers"""
+from app.services.assessment_cache import AssessmentCache
+
+RESULT = {"assessment": {"summary": "x"}}
+
+
+def make_cache(**kwargs):
+    options = dict(ttl_seconds=60, max_entries=2, semantic_enabled=True,
+                   semantic_ttl_seconds=60, semantic_max_distance=0.05)
+    options.update(kwargs)
+    return AssessmentCache(**options)
+
+
+def test_exact_key_depends_on_prompt_version_model_and_prompt():
+    key = AssessmentCache.exact_key("v1", "gpt-4o", "prompt")
+    assert key == AssessmentCache.exact_key("v1", "gpt-4o", "prompt")
+    assert key != AssessmentCache.exact_key("v2", "gpt-4o", "prompt")
+    assert key != AssessmentCache.exact_key("v1", "gpt-4o-mini", "prompt")
+    assert key != AssessmentCache.exact_key("v1", "gpt-4o", "prompt ")
+
+
+def test_exact_tier_hits_expires_and_evicts():
+    cache = make_cache()
+    cache.put_exact("a", RESULT)
+    assert cache.get_exact("a") is RESULT
+    cache.put_exact("b", RESULT)
+    cache.put_exact("c", RESULT)  # max_entries=2 evicts "a"
+    assert cache.get_exact("a") is None
+
+    expired = make_cache(ttl_seconds=-1)
+    expired.put_exact("a", RESULT)
+    assert expired.get_exact("a") is None
+
+
+def test_semantic_tier_requires_same_symptoms_scope_and_close_vector():
+    cache = make_cache()
+    symptoms = AssessmentCache.symptom_set([
+        {"dsm5Code": "A1", "detected": True},
+        {"dsm5Code": "A4", "detected": False},
+    ])
+    assert symptoms == frozenset({"A1"})
+
+    cache.put_semantic([1.0, 0.0], symptoms, RESULT, scope="s")
+    assert cache.get_semantic([0.999, 0.01], symptoms, scope="s") is RESULT
+    assert cache.get_semantic([0.0, 1.0], symptoms, scope="s") is None
+    assert cache.get_semantic([1.0, 0.0], frozenset({"A2"}), scope="s") is None
+    assert cache.get_semantic([1.0, 0.0], symptoms, scope="other") is None
+
+
+def test_semantic_tier_disabled():
+    cache = make_cache(semantic_enabled=False)
+    cache.put_semantic([1.0], frozenset(), RESULT)
+    assert cache.get_semantic([1.0], frozenset()) is None
+
+
+def test_index_version_change_clears_both_tiers():
+    cache = make_cache()
+    cache.set_index_version("v1")
+    cache.put_exact("a", RESULT)
+    cache.put_semantic([1.0, 0.0], frozenset(), RESULT)
+    cache.set_index_version("v1")
+    assert cache.get_exact("a") is RESULT
+
+    cache.set_index_version("v2")
+    assert cache.get_exact("a") is None
+    assert cache.get_semantic([1.0, 0.0], frozenset()) is None
+    assert cache.get_stats()["index_version"] == "v2"
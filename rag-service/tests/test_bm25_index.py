@@ -0,0 +1,56 @@
+"""BM25 postings, scoring, persistence and rank fusion"""
+import math
+
+import pytest
+
+from app.services.bm25_index import BM25Index, index_path, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = {
+    "mdd": "Major depressive disorder F32.1 with depressed mood most of the day",
+    "gad": "Generalized anxiety disorder F41.1: excessive anxiety and worry",
+    "sleep": "Insomnia disorder; sleep disturbance and early waking",
+    "mixed": "Depressed mood with anxiety; anxiety anxiety",
+}
+
+
+@pytest.fixture
+def index():
+    return BM25Index().build(list(DOCUMENTS), list(DOCUMENTS.values()))
+
+
+def test_tokenize_keeps_codes_and_drops_stopwords():
+    assert tokenize("The F32.1 code and criterion A1") == ["f32.1", "code", "criterion", "a1"]
+
+
+def test_search_ranks_matching_documents(index):
+    results = index.search("anxiety", top_k=10)
+    assert [chunk_id for chunk_id, _ in results] == ["mixed", "gad"]
+    assert index.search("F41.1", top_k=10)[0][0] == "gad"
+    assert index.search("unrelated words", top_k=10) == []
+    assert len(index.search("depressed mood anxiety", top_k=1)) == 1
+
+
+def test_score_matches_okapi_formula(index):
+    (chunk_id, score), = index.search("insomnia", top_k=1)
+    assert chunk_id == "sleep"
+    lengths = [len(tokenize(text)) for text in DOCUMENTS.values()]
+    avg = sum(lengths) / len(lengths)
+    idf = math.log(1 + (4 - 1 + 0.5) / (1 + 0.5))
+    expected = idf * 1 * 2.5 / (1 + 1.5 * (1 - 0.75 + 0.75 * lengths[2] / avg))
+    assert score == pytest.approx(expected, rel=1e-5)
+
+
+def test_save_and_load_round_trip(index, data_dir):
+    path = index_path(data_dir, "dsm5")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.ids == index.ids
+    assert loaded.search("depressed anxiety", 4) == pytest.approx(index.search("depressed anxiety", 4))
+    assert BM25Index.load(index_path(data_dir, "missing")) is None
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "a", "d"]], k=60)
+    assert [item for item, _ in fused][:2] in (["a", "b"], ["b", "a"])
+    assert dict(fused)["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert dict(fused)["d"] == pytest.approx(1 / 63)
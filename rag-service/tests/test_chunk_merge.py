@@ -0,0 +1,76 @@
+"""Merging of overlapping neighbour chunks, end to end with ingestion offsets"""
+from scripts.ingest_pdf import chunk_text
+
+from app.services.chunk_merge import merge_adjacent_chunks, merge_page_ranges
+
+
+def ctx(chunk_id, text, section, start, distance=0.2, pages="1-1", **meta):
+    return {
+        "id": chunk_id,
+        "document": text,
+        "distance": distance,
+        "metadata": {
+            "section_index": section,
+            "char_start": start,
+            "char_end": start + len(text),
+            "page_range": pages,
+            "token_count": 99,
+            **meta,
+        },
+    }
+
+
+def test_overlapping_neighbours_merge_without_duplicated_text():
+    section = "Criterion A. Depressed mood. Criterion B. Anhedonia. Criterion C. Weight."
+    first = ctx("a", section[0:40], 0, 0, distance=0.3, pages="10-11")
+    second = ctx("b", section[30:], 0, 30, distance=0.1, pages="11-12")
+    other = ctx("c", "Unrelated section text", 1, 0)
+
+    merged = merge_adjacent_chunks([first, other, second])
+
+    # The merged reference takes the place and ID of its best-ranked member
+    assert [c["id"] for c in merged] == ["a", "c"]
+    combined = merged[0]
+    assert combined["document"] == section
+    assert combined["merged_ids"] == ["a", "b"]
+    assert combined["distance"] == 0.1
+    assert combined["metadata"]["page_range"] == "10-12"
+    assert (combined["metadata"]["char_start"], combined["metadata"]["char_end"]) == (0, len(section))
+    # Stored counts of both members, with the second's overlapping 10 characters taken out
+    assert combined["metadata"]["token_count"] == round(99 + 99 * (len(section) - 40) / (len(section) - 30))
+
+    second["metadata"].pop("token_count")
+    assert "token_count" not in merge_adjacent_chunks([first, second])[0]["metadata"]
+
+
+def test_gaps_other_sections_and_legacy_chunks_are_left_alone():
+    retrieved = [
+        ctx("a", "x" * 10, 0, 0),
+        ctx("b", "y" * 10, 0, 50),
+        ctx("c", "z" * 10, 1, 5),
+        {"id": "legacy", "document": "old", "distance": 0.5, "metadata": {"page_range": "3"}},
+    ]
+    assert merge_adjacent_chunks(retrieved) is retrieved
+
+
+def test_merge_page_ranges():
+    assert merge_page_ranges(["5-6", "3", "6-9"]) == "3-9"
+    assert merge_page_ranges(["", "n/a"]) == "n/a"
+
+
+def test_ingested_neighbours_merge_back_into_the_section_text():
+    paragraphs = [f"Paragraph {i}: " + "symptom detail " * 12 for i in range(8)]
+    pages = [{"page_num": 1, "text": "\n\n".join(paragraphs), "headings": []}]
+    chunks = chunk_text(pages, chunk_size=400, chunk_overlap=80)
+    assert len(chunks) > 2
+
+    section = "\n\n".join(p.strip() for p in paragraphs)
+    for chunk in chunks:
+        assert section[chunk["char_start"]:chunk["char_end"]] == chunk["text"]
+
+    retrieved = [
+        ctx(f"c{i}", c["text"], c["section_index"], c["char_start"], chunk_index=c["chunk_index"])
+        for i, c in enumerate(chunks)
+    ]
+    merged, = merge_adjacent_chunks(retrieved)
+    assert merged["document"] == section[chunks[0]["char_start"]:chunks[-1]["char_end"]]
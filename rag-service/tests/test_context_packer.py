@@ -0,0 +1,58 @@
+"""Token-budgeted packing of retrieved chunks"""
+from app.services.context_packer import ContextPacker
+
+
+class WordCounter:
+    """Stands in for LLMService: one token per whitespace-separated word"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def count_tokens(self, text):
+        self.calls += 1
+        return len(text.split())
+
+
+def chunk(chunk_id, tokens=None, words=10):
+    metadata = {"section_title": "Criteria", "disorder_code": "F32"}
+    if tokens is not None:
+        metadata["token_count"] = tokens
+    return {"id": chunk_id, "document": "word " * words, "metadata": metadata, "distance": 0.2}
+
+
+def test_chunks_are_kept_in_ranked_order_while_they_fit():
+    packer = ContextPacker(WordCounter())
+    fixed = packer.static_tokens + 3
+    cost = packer.reference_tokens(chunk("x", tokens=100))
+    retrieved = [chunk("a", tokens=100), chunk("b", tokens=500), chunk("c", tokens=100)]
+
+    packed, total = packer.pack("three word presentation", retrieved, budget=fixed + 2 * cost)
+
+    assert [c["id"] for c in packed] == ["a", "c"]
+    assert total == fixed + 2 * cost
+
+
+def test_oversized_presentation_is_sent_without_references():
+    packer = ContextPacker(WordCounter())
+    packed, total = packer.pack("word " * 50, [chunk("a", tokens=1)], budget=packer.static_tokens)
+    assert packed == []
+    assert total > packer.static_tokens
+
+
+def test_chunk_tokens_prefers_metadata_and_memoises_encoding():
+    counter = WordCounter()
+    packer = ContextPacker(counter)
+    assert packer.chunk_tokens(chunk("a", tokens=42)) == 42
+    assert counter.calls == 0
+
+    legacy = chunk("b", words=7)
+    assert packer.chunk_tokens(legacy) == 7
+    assert packer.chunk_tokens(legacy) == 7
+    assert counter.calls == 1
+
+
+def test_core_block_changes_static_cost():
+    packer = ContextPacker(WordCounter())
+    plain = packer.static_tokens
+    packer.set_core_block("core criteria " * 20)
+    assert packer.static_tokens >= plain + 40
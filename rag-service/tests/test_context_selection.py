@@ -0,0 +1,36 @@
+"""Score thresholding and MMR selection of retrieved context"""
+import numpy as np
+
+from app.config.settings import Settings
+from app.services.context_selection import mmr_select, select_context
+
+
+def contexts(distances):
+    return [{"id": f"c{i}", "document": f"doc {i}", "metadata": {}, "distance": d}
+            for i, d in enumerate(distances)]
+
+
+def test_mmr_skips_near_duplicates():
+    embeddings = np.array([
+        [1.0, 0.0, 0.0],
+        [0.99, 0.14, 0.0],   # near-copy of row 0
+        [0.8, 0.0, 0.6],
+    ], dtype=np.float32)
+    query = [1.0, 0.0, 0.0]
+    assert mmr_select(query, embeddings, k=2, lambda_mult=0.3) == [0, 2]
+    # Relevance only: plain top-k by similarity
+    assert mmr_select(query, embeddings, k=2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(query, embeddings[:0], k=2) == []
+
+
+def test_select_context_drops_low_scores_then_caps_count():
+    retrieved = contexts([0.1, 0.2, 0.9, 0.3])
+    embeddings = np.eye(4, dtype=np.float32)
+    query = [1.0, 0.5, 0.0, 0.4]
+    selected = select_context(retrieved, embeddings, query, final_k=2, min_score=0.5)
+    assert [c["id"] for c in selected] == ["c0", "c1"]
+    assert select_context(retrieved, embeddings, query, final_k=5, min_score=0.95) == []
+
+
+def test_selection_is_off_by_default():
+    assert Settings(openai_api_key="test").context_selection_enabled is False
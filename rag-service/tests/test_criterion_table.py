@@ -0,0 +1,72 @@
+"""Precomputed criterion table: ranking, pinning, core chunks and persistence"""
+import pytest
+
+from app.services.code_hierarchy import CodeHierarchy
+from app.services.criterion_table import CriterionTable, table_path
+
+METADATAS = [
+    {"disorder_code": "F32", "section_type": "diagnostic_criteria"},
+    {"disorder_code": "F32", "section_type": "diagnostic_criteria"},
+    {"disorder_code": "F33", "section_type": "diagnostic_criteria"},
+    {"disorder_code": "F51", "section_type": "diagnostic_criteria"},
+]
+ROWS = {
+    "ids": ["mdd_mood", "mdd_sleep", "rec_sleep", "insomnia"],
+    "documents": ["MDD mood criteria", "MDD sleep criteria", "Recurrent sleep criteria", "Insomnia criteria"],
+    "metadatas": METADATAS,
+    "embeddings": [
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.1, 1.0, 0.0],
+        [0.0, 0.9, 0.4],
+    ],
+}
+# A1 (depressed mood) points along x, A4 (sleep) along y
+CRITERION_VECTORS = {"A1": [1.0, 0.0, 0.0], "A4": [0.0, 1.0, 0.0]}
+
+
+@pytest.fixture
+def table():
+    return CriterionTable("sig").build(
+        CRITERION_VECTORS, ROWS, CodeHierarchy.from_metadatas(METADATAS)
+    )
+
+
+def test_best_chunk_per_disorder_for_each_criterion(table):
+    assert [e["id"] for e in table.entries["A1"]] == ["mdd_mood", "rec_sleep"]
+    # A4 also checks insomnia disorder (F51) as a differential
+    assert [e["id"] for e in table.entries["A4"]] == ["mdd_sleep", "rec_sleep", "insomnia"]
+    assert table.size == 4
+
+
+def test_pinned_orders_mdd_before_differentials_and_respects_limit(table):
+    symptoms = [
+        {"dsm5Code": "A4", "detected": True},
+        {"dsm5Code": "A1", "detected": False},
+    ]
+    pinned = table.pinned(symptoms, [0.0, 1.0, 0.0], limit=3)
+    assert [ctx["id"] for ctx in pinned] == ["mdd_sleep", "rec_sleep", "insomnia"]
+    assert pinned[0]["distance"] == pytest.approx(0.0, abs=1e-6)
+    assert [ctx["id"] for ctx in table.pinned(symptoms, [0.0, 1.0, 0.0], limit=1)] == ["mdd_sleep"]
+    assert table.pinned([], [0.0, 1.0, 0.0], limit=3) == []
+
+
+def test_core_chunks_cover_mdd_matches_only(table):
+    assert [ctx["id"] for ctx in table.core_chunks()] == ["mdd_mood", "mdd_sleep", "rec_sleep"]
+
+
+def test_save_and_load_round_trip(table, data_dir):
+    path = table_path(data_dir, "dsm5")
+    table.save(path)
+    loaded = CriterionTable.load(path)
+    assert loaded.signature == "sig"
+    assert loaded.entries == table.entries
+    symptoms = [{"dsm5Code": "A1", "detected": True}]
+    assert loaded.pinned(symptoms, [1.0, 0.0, 0.0], 2) == table.pinned(symptoms, [1.0, 0.0, 0.0], 2)
+    assert CriterionTable.load(table_path(data_dir, "missing")) is None
+
+
+def test_empty_collection_builds_empty_table():
+    table = CriterionTable().build(CRITERION_VECTORS, {"ids": []}, CodeHierarchy([]))
+    assert table.size == 0
+    assert table.pinned([{"dsm5Code": "A1", "detected": True}], [1.0, 0.0, 0.0], 3) == []
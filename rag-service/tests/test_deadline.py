@@ -0,0 +1,91 @@
+"""Stage budgets and deadline-aware embedding retries"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config.settings import settings
+from app.services.deadline import Deadline, DeadlineExceeded, within
+from app.services.embedding_providers import OpenAIEmbeddingProvider
+
+
+@pytest.fixture(autouse=True)
+def minimums(monkeypatch):
+    monkeypatch.setattr(settings, "deadline_embed_min_ms", 100)
+    monkeypatch.setattr(settings, "deadline_retrieval_min_ms", 100)
+    monkeypatch.setattr(settings, "deadline_llm_min_ms", 2000)
+
+
+def test_stage_may_use_everything_later_stages_do_not_need():
+    deadline = Deadline(10.0)
+    assert deadline.stage_timeout("embed") == pytest.approx(10.0 - 2.1, abs=0.01)
+    assert deadline.stage_timeout("retrieve") == pytest.approx(10.0 - 2.0, abs=0.01)
+    assert deadline.stage_timeout("llm") == pytest.approx(10.0, abs=0.01)
+
+
+def test_short_budget_is_split_by_minimums():
+    deadline = Deadline(1.1)
+    # 1.1s left against 2.2s of minimums: each pending stage gets its proportion
+    assert deadline.stage_timeout("embed") == pytest.approx(1.1 * 0.1 / 2.2, abs=0.005)
+    assert deadline.stage_timeout("llm") == pytest.approx(1.1, abs=0.01)
+    assert Deadline(-1.0).stage_timeout("embed") == 0.0
+
+
+def test_from_header_keeps_a_margin(monkeypatch):
+    monkeypatch.setattr(settings, "deadline_margin_ms", 250)
+    assert Deadline.from_header("5000").timeout == pytest.approx(4.75)
+    with pytest.raises(ValueError):
+        Deadline.from_header("soon")
+
+
+@pytest.mark.asyncio
+async def test_overrunning_stage_raises_deadline_exceeded():
+    with pytest.raises(DeadlineExceeded):
+        await within(Deadline(0.05), "llm", asyncio.sleep(1))
+    assert await within(None, "embed", asyncio.sleep(0, result="ok")) == "ok"
+
+
+class FlakyEmbeddings:
+    """Embeddings endpoint that fails a set number of times, recording timeouts"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.timeouts = []
+        self.with_raw_response = self
+
+    async def create(self, model, input, dimensions, timeout=None):
+        self.timeouts.append(timeout)
+        if len(self.timeouts) <= self.failures:
+            raise ConnectionError("connection reset")
+        response = SimpleNamespace(
+            data=[SimpleNamespace(embedding=[1.0, 0.0]) for _ in input],
+            usage=SimpleNamespace(total_tokens=len(input)),
+        )
+        return SimpleNamespace(headers={}, parse=lambda: response)
+
+
+def provider_with(embeddings):
+    provider = OpenAIEmbeddingProvider()
+    provider.client = SimpleNamespace(embeddings=embeddings)
+    provider.limiter = None
+    return provider
+
+
+@pytest.mark.asyncio
+async def test_embedding_retry_stops_when_backoff_would_miss_the_deadline():
+    embeddings = FlakyEmbeddings(failures=5)
+    with pytest.raises(Exception):
+        await provider_with(embeddings).embed(["text"], deadline=Deadline(0.5))
+    # The 1s minimum backoff cannot fit in 0.5s, so there is no second attempt
+    assert len(embeddings.timeouts) == 1
+
+
+@pytest.mark.asyncio
+async def test_embedding_call_timeout_is_capped_by_the_deadline():
+    embeddings = FlakyEmbeddings(failures=0)
+    vectors = await provider_with(embeddings).embed(["a", "b"], deadline=Deadline(3.0))
+    assert vectors == [[1.0, 0.0], [1.0, 0.0]]
+    assert 0 < embeddings.timeouts[0] <= 3.0
+
+    await provider_with(embeddings).embed(["a"])
+    assert embeddings.timeouts[-1] is None
@@ -0,0 +1,118 @@
+"""Micro-batching of concurrent embedding requests"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.deadline import Deadline
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+class FakeCreate:
+    """Records every provider call; each takes ``delay`` seconds"""
+
+    def __init__(self, delay=0.0, error=None):
+        self.calls = []
+        self.deadlines = []
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self, texts, stats, deadline):
+        self.calls.append(list(texts))
+        self.deadlines.append(deadline)
+        stats["rate_limit_wait_ms"] = 1.5
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_lone_request_is_sent_without_waiting_for_the_window():
+    create = FakeCreate()
+    batcher = EmbeddingBatcher(create, window_seconds=1.0, max_size=8)
+    start = time.perf_counter()
+    assert await batcher.embed(["abc"]) == [[3.0]]
+    assert time.perf_counter() - start < 0.5
+    assert create.calls == [["abc"]]
+
+
+@pytest.mark.asyncio
+async def test_requests_overlapping_a_call_share_the_next_one():
+    create = FakeCreate(delay=0.05)
+    batcher = EmbeddingBatcher(create, window_seconds=0.01, max_size=8)
+    stats = [{} for _ in range(4)]
+    results = await asyncio.gather(
+        batcher.embed(["a"], stats[0]),
+        batcher.embed(["bb", "a"], stats[1]),
+        batcher.embed(["ccc"], stats[2]),
+        batcher.embed(["bb"], stats[3]),
+    )
+    assert results == [[[1.0]], [[2.0], [1.0]], [[3.0]], [[2.0]]]
+    # First request goes alone; the rest are deduplicated into one call
+    assert create.calls == [["a"], ["bb", "a", "ccc"]]
+    assert (batcher.requests, batcher.calls) == (4, 2)
+    assert stats[0]["batch_callers"] == 1
+    assert stats[3] == {"rate_limit_wait_ms": 1.5, "batch_size": 3, "batch_callers": 3}
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_before_the_window():
+    create = FakeCreate(delay=0.02)
+    batcher = EmbeddingBatcher(create, window_seconds=10.0, max_size=2)
+    first = asyncio.ensure_future(batcher.embed(["x"]))
+    await asyncio.sleep(0)
+    results = await asyncio.wait_for(asyncio.gather(batcher.embed(["y"]), batcher.embed(["z"])), 1.0)
+    assert results == [[[1.0]], [[1.0]]]
+    await first
+    assert create.calls == [["x"], ["y", "z"]]
+
+    # Larger than max_size: its own call
+    assert await batcher.embed(["p", "q", "r"]) == [[1.0]] * 3
+    assert create.calls[-1] == ["p", "q", "r"]
+
+
+@pytest.mark.asyncio
+async def test_failure_reaches_every_caller_in_the_batch():
+    create = FakeCreate(delay=0.02, error=RuntimeError("provider down"))
+    batcher = EmbeddingBatcher(create, window_seconds=0.01, max_size=8)
+    results = await asyncio.gather(
+        batcher.embed(["a"]), batcher.embed(["b"]), batcher.embed(["c"]), return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(create.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_caller_does_not_fail_the_others():
+    create = FakeCreate(delay=0.05)
+    batcher = EmbeddingBatcher(create, window_seconds=0.01, max_size=8)
+    first = asyncio.ensure_future(batcher.embed(["a"]))
+    await asyncio.sleep(0)
+    cancelled = asyncio.ensure_future(batcher.embed(["b"]))
+    kept = asyncio.ensure_future(batcher.embed(["cc"]))
+    await asyncio.sleep(0.02)
+    cancelled.cancel()
+    assert await kept == [[2.0]]
+    assert await first == [[1.0]]
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+
+@pytest.mark.asyncio
+async def test_shared_call_runs_to_the_latest_deadline():
+    create = FakeCreate(delay=0.02)
+    batcher = EmbeddingBatcher(create, window_seconds=0.01, max_size=8)
+    short, long = Deadline(1.0), Deadline(5.0)
+    first = asyncio.ensure_future(batcher.embed(["a"], deadline=short))
+    await asyncio.sleep(0)
+    await asyncio.gather(batcher.embed(["b"], deadline=short), batcher.embed(["c"], deadline=long))
+    await first
+    assert create.deadlines == [short, long]
+
+    # Any caller without a deadline makes the call unbounded
+    first = asyncio.ensure_future(batcher.embed(["d"]))
+    await asyncio.sleep(0)
+    await asyncio.gather(batcher.embed(["e"], deadline=short), batcher.embed(["f"]))
+    await first
+    assert create.deadlines[-1] is None
@@ -0,0 +1,76 @@
+"""EmbeddingCache memory/disk tiers and EmbeddingService cache use"""
+import asyncio
+import os
+import threading
+
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_providers import HashingEmbeddingProvider
+from app.services.embedding_service import EmbeddingService
+
+
+def test_memory_hit_and_lru_eviction():
+    cache = EmbeddingCache(path=None, max_memory_entries=2)
+    cache.put_many({"a": [1.0], "b": [2.0]})
+    assert cache.get_many(["a"]) == {"a": [1.0]}
+    cache.put_many({"c": [3.0]})  # evicts "b", the least recently used
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+
+def test_disk_tier_survives_restart(data_dir):
+    path = os.path.join(data_dir, "embeddings.db")
+    cache = EmbeddingCache(path=path)
+    cache.put_many({"k": [0.5, -0.25]})
+    cache.close()
+
+    reopened = EmbeddingCache(path=path)
+    assert reopened.get_many(["k", "missing"]) == {"k": [0.5, -0.25]}
+    reopened.close()
+
+
+def test_async_disk_access_runs_off_the_event_loop(data_dir):
+    cache = EmbeddingCache(path=os.path.join(data_dir, "embeddings.db"), max_memory_entries=1)
+    loop_thread = threading.get_ident()
+    threads = []
+    read_disk, write_disk = cache._read_disk, cache._write_disk
+
+    def record(fn):
+        def wrapper(*args):
+            threads.append(threading.get_ident())
+            return fn(*args)
+        return wrapper
+
+    cache._read_disk = record(read_disk)
+    cache._write_disk = record(write_disk)
+
+    async def scenario():
+        cache.aput_many({"a": [1.0], "b": [2.0]})
+        cache._executor.submit(lambda: None).result()  # wait for the queued write
+        # "a" was evicted from memory, so it comes from disk
+        return await cache.aget_many(["a", "b"])
+
+    assert asyncio.run(scenario()) == {"a": [1.0], "b": [2.0]}
+    assert threads and loop_thread not in threads
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_service_serves_repeats_from_cache(data_dir):
+    service = EmbeddingService(HashingEmbeddingProvider(dimensions=16))
+    service.cache = EmbeddingCache(path=os.path.join(data_dir, "embeddings.db"))
+    service.batcher = None
+
+    stats = {}
+    first = await service.embed_batch(["low mood", "low mood", "poor sleep"], stats=stats)
+    assert stats["cache_misses"] == 2
+    assert first[0] == first[1]
+
+    stats = {}
+    again = await service.embed_batch(["poor sleep"], stats=stats)
+    assert (stats["cache_hits"], stats["cache_misses"]) == (1, 0)
+    assert again[0] == first[2]
+    assert service._api_calls == 1
+    service.close()
@@ -0,0 +1,68 @@
+"""Embedding providers and the collection embedding-identity check"""
+import numpy as np
+import pytest
+
+from app.config.settings import settings
+from app.services.embedding_providers import (
+    EmbeddingMismatchError,
+    HashingEmbeddingProvider,
+    create_provider,
+)
+from app.services.retrieval_service import RetrievalService
+
+
+@pytest.fixture
+def provider():
+    provider = HashingEmbeddingProvider(dimensions=32)
+    yield provider
+    provider.close()
+
+
+def test_hashing_vectors_are_deterministic_and_normalised(provider):
+    first, again, other = provider.embed_sync([
+        "Depressed mood most of the day",
+        "depressed MOOD most of the day",
+        "Insomnia nearly every day",
+    ])
+    assert first == again
+    assert len(first) == 32
+    assert np.linalg.norm(first) == pytest.approx(1.0, abs=1e-6)
+    assert np.dot(first, other) < np.dot(first, again)
+    assert provider.embed_sync([""]) == [[0.0] * 32]
+
+
+@pytest.mark.asyncio
+async def test_async_embed_matches_sync_across_batches(provider):
+    provider.batch_size = 2
+    texts = [f"criterion {i} text" for i in range(5)]
+    assert await provider.embed(texts) == provider.embed_sync(texts)
+
+
+def test_create_provider_falls_back_or_rejects():
+    provider = create_provider("hashing")
+    assert provider.identity == {
+        "embedding_provider": "hashing",
+        "embedding_model": "hashing-v1",
+        "embedding_dimensions": settings.embedding_dimensions,
+    }
+    provider.close()
+    with pytest.raises(ValueError):
+        create_provider("nonexistent")
+
+
+def test_collection_from_another_model_is_rejected(data_dir, monkeypatch):
+    monkeypatch.setattr(settings, "chroma_persist_dir", data_dir)
+    monkeypatch.setattr(settings, "chroma_collection_name", "identity_test")
+
+    ingest = RetrievalService()
+    ingest.embedding_identity = HashingEmbeddingProvider(dimensions=32).identity
+    assert ingest.collection.metadata["embedding_dimensions"] == 32
+
+    same = RetrievalService()
+    same.embedding_identity = HashingEmbeddingProvider(dimensions=32).identity
+    assert same.collection.name == "identity_test"
+
+    other = RetrievalService()
+    other.embedding_identity = HashingEmbeddingProvider(dimensions=64).identity
+    with pytest.raises(EmbeddingMismatchError):
+        other.collection
@@ -0,0 +1,42 @@
+"""Connection-pool accounting of the shared HTTP client"""
+import httpx
+import pytest
+
+from app.services.http_client import PoolStats, _CountingTransport
+
+
+def test_pool_stats_track_peak_and_saturation():
+    stats = PoolStats(max_connections=2)
+    for _ in range(3):
+        stats.acquire()
+    assert stats.snapshot() == {
+        "in_use": 3,
+        "peak": 3,
+        "max_connections": 2,
+        "saturation": 1.5,
+        "saturated_requests": 1,
+    }
+    for _ in range(3):
+        stats.release()
+    assert stats.in_use == 0 and stats.peak == 3
+
+
+@pytest.mark.asyncio
+async def test_slot_is_held_until_the_body_is_closed(monkeypatch):
+    async def respond(self, request):
+        if request.url.path == "/fail":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, stream=httpx.ByteStream(b'{"ok": true}'))
+
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", respond)
+    stats = PoolStats(max_connections=4)
+    async with httpx.AsyncClient(transport=_CountingTransport(stats), base_url="http://pool") as client:
+        async with client.stream("GET", "/models") as response:
+            assert stats.in_use == 1
+            assert await response.aread() == b'{"ok": true}'
+        assert stats.in_use == 0
+
+        with pytest.raises(httpx.ConnectError):
+            await client.get("/fail")
+        assert stats.in_use == 0
+        assert stats.peak == 1
@@ -0,0 +1,164 @@
+"""SQLite job queue and the async worker pool"""
+import asyncio
+import os
+import threading
+
+import pytest
+
+from app.services.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobWorkerPool
+
+REQUEST = {"patient_text": "Low mood for a month", "symptoms": None, "metadata": None, "retrieval_filter": None}
+
+
+@pytest.fixture
+def queue(data_dir):
+    queue = JobQueue(os.path.join(data_dir, "jobs.db"), result_ttl_seconds=3600)
+    yield queue
+    queue.close()
+
+
+def test_submit_deduplicates_by_request_and_key(queue):
+    job, created = queue.submit(REQUEST)
+    assert created and job["status"] == QUEUED and job["request"] == REQUEST
+    again, created = queue.submit(dict(REQUEST))
+    assert not created and again["id"] == job["id"]
+
+    keyed, created = queue.submit(REQUEST, idempotency_key="client-1")
+    assert created and keyed["id"] != job["id"]
+
+
+def test_claim_runs_jobs_oldest_first_and_records_outcome(queue):
+    first, _ = queue.submit({**REQUEST, "patient_text": "first"})
+    second, _ = queue.submit({**REQUEST, "patient_text": "second"})
+
+    claimed = queue.claim()
+    assert claimed["id"] == first["id"]
+    assert claimed["status"] == RUNNING and claimed["attempts"] == 1
+    queue.complete(first["id"], {"assessment": {"ok": True}})
+    assert queue.get(first["id"])["result"] == {"assessment": {"ok": True}}
+
+    assert queue.claim()["id"] == second["id"]
+    queue.fail(second["id"], "boom")
+    assert queue.get(second["id"])["status"] == FAILED
+    assert queue.claim() is None
+    assert queue.counts() == {SUCCEEDED: 1, FAILED: 1}
+
+    # A failed job is queued again when resubmitted
+    retried, created = queue.submit({**REQUEST, "patient_text": "second"})
+    assert created and retried["id"] == second["id"] and retried["status"] == QUEUED
+
+
+def test_interrupted_jobs_are_requeued(queue):
+    job, _ = queue.submit(REQUEST)
+    queue.claim()
+    assert queue.requeue_running() == 1
+    assert queue.claim()["attempts"] == 2
+
+
+def test_expired_results_are_hidden_and_purged(queue):
+    job, _ = queue.submit(REQUEST)
+    queue.claim()
+    queue.complete(job["id"], {})
+    queue.result_ttl_seconds = -1
+    assert queue.get(job["id"]) is None
+    assert queue.purge_expired() == 1
+
+
+def test_resubmitting_an_expired_job_queues_it_again(queue):
+    job, _ = queue.submit(REQUEST)
+    queue.claim()
+    queue.complete(job["id"], {"assessment": {}})
+    queue.result_ttl_seconds = -1
+
+    again, created = queue.submit(REQUEST)
+    assert created and again["id"] == job["id"]
+    assert again["status"] == QUEUED and again["result"] is None and again["attempts"] == 0
+    assert queue.get(job["id"])["status"] == QUEUED
+
+
+def test_jobs_interrupted_too_often_are_failed(queue):
+    queue.max_attempts = 2
+    job, _ = queue.submit(REQUEST)
+    queue.claim()
+    assert queue.requeue_running() == 1
+    queue.claim()
+    assert queue.requeue_running() == 0
+
+    failed = queue.get(job["id"])
+    assert failed["status"] == FAILED and failed["attempts"] == 2
+    assert "interrupted 2 times" in failed["error"]
+    assert queue.claim() is None
+
+
+class RecordingPipeline:
+    """Stands in for RAGPipeline.assess; notes the thread that touched the queue"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = []
+
+    async def assess(self, **request):
+        self.calls.append(request["patient_text"])
+        if request["patient_text"] == self.fail_on:
+            raise RuntimeError("LLM unavailable")
+        return {"assessment": {"text": request["patient_text"]}, "sources": [], "usage": {},
+                "pipeline_metrics": {}}
+
+
+@pytest.mark.asyncio
+async def test_workers_run_jobs_off_the_event_loop(queue, monkeypatch):
+    loop_thread = threading.get_ident()
+    queue_threads = set()
+    claim = queue.claim
+
+    def recording_claim():
+        queue_threads.add(threading.get_ident())
+        return claim()
+
+    monkeypatch.setattr(queue, "claim", recording_claim)
+    pipeline = RecordingPipeline(fail_on="bad")
+    ok, _ = queue.submit({**REQUEST, "patient_text": "good"})
+    bad, _ = queue.submit({**REQUEST, "patient_text": "bad"})
+
+    pool = JobWorkerPool(queue, pipeline, workers=2, poll_interval=0.01)
+    pool.start()
+    try:
+        for _ in range(200):
+            if queue.counts().get(QUEUED, 0) == 0 and queue.counts().get(RUNNING, 0) == 0:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await pool.stop()
+
+    assert sorted(pipeline.calls) == ["bad", "good"]
+    assert queue.get(ok["id"])["result"]["assessment"] == {"text": "good"}
+    assert queue.get(bad["id"])["error"] == "RAG assessment failed: LLM unavailable"
+    assert queue_threads and loop_thread not in queue_threads
+
+
+@pytest.mark.asyncio
+async def test_submission_during_an_empty_claim_is_not_missed(queue, monkeypatch):
+    pipeline = RecordingPipeline()
+    pool = JobWorkerPool(queue, pipeline, workers=1, poll_interval=30)
+    claim = queue.claim
+    loop = asyncio.get_running_loop()
+    submitted = []
+
+    def claim_then_submit():
+        job = claim()
+        if job is None and not submitted:
+            # Lands after the empty claim, before the worker goes back to sleep
+            submitted.append(queue.submit(REQUEST)[0])
+            loop.call_soon_threadsafe(pool.notify)
+        return job
+
+    monkeypatch.setattr(queue, "claim", claim_then_submit)
+    pool.start()
+    try:
+        for _ in range(200):
+            if pipeline.calls:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await pool.stop()
+    assert pipeline.calls == [REQUEST["patient_text"]]
@@ -0,0 +1,39 @@
+"""Incremental top-level field parsing of streamed JSON"""
+import json
+
+from app.services.json_stream import TopLevelFieldParser
+
+DOCUMENT = {
+    "summary": "Mood \"low\", sleep poor {not nested}",
+    "criteria": [{"code": "A1", "met": True}, {"code": "A4", "met": False}],
+    "confidence": 0.82,
+    "notes": None,
+    "flags": {"risk": "low", "items": [1, 2]},
+}
+
+
+def test_fields_are_emitted_once_complete_for_any_fragmenting():
+    text = json.dumps(DOCUMENT, indent=2)
+    for size in (1, 3, 7, len(text)):
+        parser = TopLevelFieldParser()
+        fields = []
+        for i in range(0, len(text), size):
+            fields.extend(parser.feed(text[i:i + size]))
+        assert fields == list(DOCUMENT.items())
+        assert parser.done
+        assert parser.emitted == list(DOCUMENT)
+        assert parser.text == text
+
+
+def test_field_is_not_emitted_before_its_value_ends():
+    parser = TopLevelFieldParser()
+    assert parser.feed('{"summary": "partial, still') == []
+    assert parser.feed(' going", "score": 1') == [("summary", "partial, still going")]
+    assert parser.feed("2}") == [("score", 12)]
+    assert parser.done
+
+
+def test_leading_text_is_skipped_and_trailing_text_ignored():
+    parser = TopLevelFieldParser()
+    assert parser.feed('Here you go: {"a": 1} trailing {"b": 2}') == [("a", 1)]
+    assert parser.done
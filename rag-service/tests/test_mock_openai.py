@@ -0,0 +1,109 @@
+"""Local OpenAI stand-in: deterministic embeddings, assessments and usage"""
+import json
+
+import httpx
+import pytest
+
+from app.services.embedding_providers import HashingEmbeddingProvider
+from scripts import mock_openai
+
+
+class CharEncoder:
+    """One token per character; tiktoken downloads its encodings"""
+
+    def encode(self, text):
+        return [ord(c) for c in text]
+
+    def decode(self, tokens):
+        return "".join(chr(t) for t in tokens)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(mock_openai, "_ENCODER", CharEncoder())
+    args = mock_openai.build_parser().parse_args([
+        "--embed-latency-ms", "0", "--chat-latency-ms", "0",
+        "--ms-per-output-token", "0", "--latency-dist", "fixed",
+    ])
+    app = mock_openai.create_app(mock_openai.MockState(args))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock")
+
+
+def chat_body(user_prompt, system_prompt="You are a clinician.", **extra):
+    return {
+        "model": "gpt-4o",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        **extra,
+    }
+
+
+@pytest.mark.asyncio
+async def test_embeddings_are_deterministic_hashing_vectors(client):
+    async with client:
+        body = {"model": "text-embedding-3-small", "input": ["low mood", "no sleep"], "dimensions": 16}
+        first = (await client.post("/v1/embeddings", json=body)).json()
+        second = (await client.post("/v1/embeddings", json=body)).json()
+        single = (await client.post("/v1/embeddings", json={**body, "input": "low mood"})).json()
+
+    vectors = [item["embedding"] for item in first["data"]]
+    assert vectors == [item["embedding"] for item in second["data"]]
+    assert vectors == HashingEmbeddingProvider(16).embed_sync(["low mood", "no sleep"])
+    assert single["data"][0]["embedding"] == vectors[0]
+    assert first["usage"] == {"prompt_tokens": 16, "total_tokens": 16}
+
+
+@pytest.mark.asyncio
+async def test_assessment_depends_only_on_the_user_prompt(client):
+    async with client:
+        first = (await client.post("/v1/chat/completions", json=chat_body("Sad for weeks"))).json()
+        again = (await client.post("/v1/chat/completions", json=chat_body("Sad for weeks", "Other"))).json()
+        other = (await client.post("/v1/chat/completions", json=chat_body("Cannot sleep"))).json()
+
+    content = first["choices"][0]["message"]["content"]
+    assert again["choices"][0]["message"]["content"] == content
+    assert other["choices"][0]["message"]["content"] != content
+    assessment = json.loads(content)
+    codes = [ref["criteria_code"] for ref in assessment["dsm_references"]]
+    assert 3 <= len(codes) <= 6 and set(codes) <= {f"A{i}" for i in range(1, 10)}
+    assert first["usage"] == {
+        "prompt_tokens": len("You are a clinician.Sad for weeks"),
+        "completion_tokens": len(content),
+        "total_tokens": len("You are a clinician.Sad for weeks") + len(content),
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+@pytest.mark.asyncio
+async def test_repeated_long_prefix_is_reported_as_cached(client):
+    system_prompt = "x" * 1500
+    async with client:
+        first = (await client.post("/v1/chat/completions", json=chat_body("a", system_prompt))).json()
+        second = (await client.post("/v1/chat/completions", json=chat_body("b", system_prompt))).json()
+        stats = (await client.get("/stats")).json()
+
+    assert first["usage"]["prompt_tokens_details"]["cached_tokens"] == 0
+    # Longest shared prefix in 128-token steps from 1024
+    assert second["usage"]["prompt_tokens_details"]["cached_tokens"] == 1408
+    assert stats["chat_requests"] == 2
+    assert stats["prompt_tokens"] == 2 * 1501
+    assert stats["cached_prompt_tokens"] == 1408
+
+
+@pytest.mark.asyncio
+async def test_stream_matches_the_non_streaming_response(client):
+    async with client:
+        plain = (await client.post("/v1/chat/completions", json=chat_body("Sad for weeks"))).json()
+        response = await client.post(
+            "/v1/chat/completions",
+            json=chat_body("Sad for weeks", stream=True, stream_options={"include_usage": True}),
+        )
+
+    events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    content = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"])
+    assert content == plain["choices"][0]["message"]["content"]
+    assert chunks[-1]["usage"]["completion_tokens"] == plain["usage"]["completion_tokens"]
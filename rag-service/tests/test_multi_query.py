@@ -0,0 +1,99 @@
+"""Multi-query retrieval: sub-query selection and rank fusion of their searches"""
+import pytest
+
+from app.config.settings import settings
+from app.prompts.query_templates import build_retrieval_subqueries
+from app.services.retrieval_service import RetrievalService
+
+PATIENT_TEXT = (
+    "I moved to a new city last spring for a job in logistics. "
+    "Since then I wake up at 4am every night and cannot fall back asleep. "
+    "Ok. "
+    "My manager says my reports are late and full of mistakes lately. "
+    "I have stopped calling my sister and I no longer enjoy playing the guitar at all."
+)
+
+SLEEP = {
+    "name": "Insomnia or hypersomnia",
+    "detected": True,
+    "sentenceContext": "Since then I wake up at 4am every night and cannot fall back asleep.",
+    "evidence": ["wake up at 4am"],
+}
+INTEREST = {"name": "Diminished interest or pleasure", "detected": True, "evidence": ["no longer enjoy"]}
+
+
+def test_subqueries_prefer_symptom_sentences_and_keep_order():
+    queries = build_retrieval_subqueries(PATIENT_TEXT, [SLEEP, INTEREST], max_sentences=2)
+    assert queries == [
+        "Since then I wake up at 4am every night and cannot fall back asleep.",
+        "I have stopped calling my sister and I no longer enjoy playing the guitar at all.",
+        f"DSM-5 diagnostic criteria for Insomnia or hypersomnia: {SLEEP['sentenceContext']}",
+        "DSM-5 diagnostic criteria for Diminished interest or pleasure: no longer enjoy",
+    ]
+
+
+def test_subqueries_without_symptoms_take_the_longest_sentences():
+    queries = build_retrieval_subqueries(PATIENT_TEXT, None, max_sentences=3)
+    # "Ok." is too short to be a query; the shortest remaining sentence is left out
+    assert queries == [
+        "Since then I wake up at 4am every night and cannot fall back asleep.",
+        "My manager says my reports are late and full of mistakes lately.",
+        "I have stopped calling my sister and I no longer enjoy playing the guitar at all.",
+    ]
+
+
+def test_subqueries_skip_undetected_symptoms_and_drop_duplicates():
+    undetected = {**INTEREST, "detected": False}
+    unnamed = {"detected": True, "evidence": ["tired"]}
+    queries = build_retrieval_subqueries(
+        "Short one. " + PATIENT_TEXT, [SLEEP, SLEEP, undetected, unnamed], max_sentences=1
+    )
+    assert queries == [
+        SLEEP["sentenceContext"],
+        f"DSM-5 diagnostic criteria for Insomnia or hypersomnia: {SLEEP['sentenceContext']}",
+    ]
+    assert build_retrieval_subqueries("", [{"name": "Fatigue", "detected": True}]) == [
+        "DSM-5 diagnostic criteria for Fatigue"
+    ]
+
+
+def result(*hits):
+    return {
+        "ids": [chunk_id for chunk_id, _ in hits],
+        "documents": [f"doc {chunk_id}" for chunk_id, _ in hits],
+        "metadatas": [{"chunk": chunk_id} for chunk_id, _ in hits],
+        "distances": [distance for _, distance in hits],
+    }
+
+
+@pytest.mark.asyncio
+async def test_multi_query_fuses_and_deduplicates_rankings(monkeypatch):
+    monkeypatch.setattr(settings, "rrf_k", 60)
+    service = RetrievalService()
+    per_query = {
+        "main": result(("a", 0.2), ("b", 0.3), ("c", 0.4)),
+        "sleep": result(("b", 0.1), ("d", 0.5)),
+        "interest": result(("b", 0.25), ("a", 0.35), ("e", 0.6)),
+    }
+    calls = []
+
+    async def aquery(query_embedding, top_k=None, where=None, query_text=None):
+        calls.append((query_text, top_k, where))
+        return per_query[query_text]
+
+    monkeypatch.setattr(service, "aquery", aquery)
+    merged = await service.amulti_query(
+        query_embeddings=[[1.0], [2.0], [3.0]],
+        top_k=4,
+        where={"disorder_code": "F32"},
+        query_texts=["main", "sleep", "interest"],
+    )
+
+    assert calls == [(text, 4, {"disorder_code": "F32"}) for text in per_query]
+    # b is in all three lists, a in two; each chunk appears once
+    assert merged["ids"] == ["b", "a", "d", "c"]
+    assert merged["documents"] == ["doc b", "doc a", "doc d", "doc c"]
+    assert merged["metadatas"][0] == {"chunk": "b"}
+    # Smallest distance to any query
+    assert merged["distances"] == [0.1, 0.2, 0.5, 0.4]
+    service.shutdown()
@@ -0,0 +1,103 @@
+"""In-process NLP bridge: isolated import of the NLP service and output mapping"""
+import os
+import sys
+
+import pytest
+
+from app.services import nlp_bridge
+from app.services.nlp_bridge import InProcessNLPService, load_criteria
+
+CRITERIA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "backend", "src", "models", "mdd-symptoms.json"
+)
+
+
+class FakeExtractor:
+    def extract(self, text):
+        return {
+            "symptoms": [{
+                "symptom_id": "sleep_disturbance",
+                "confidence": 0.9,
+                "matched_phrases": ["cannot sleep"],
+                "sentence_context": text,
+                "match_type": "lexical",
+            }],
+            "metadata": {"duration_days": 21, "functional_impairment": "work"},
+        }
+
+    def get_symptom_summary(self, result):
+        return {"detected": len(result["symptoms"])}
+
+
+@pytest.fixture
+def service():
+    service = InProcessNLPService()
+    service._extractor = FakeExtractor()
+    service._criteria = load_criteria(CRITERIA_PATH)
+    yield service
+    service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_extract_runs_on_the_worker_pool(service):
+    result = await service.extract("I cannot sleep at night")
+    assert result["summary"] == {"detected": 1}
+    assert result["metadata"]["processing_time_ms"] >= 0
+
+    with pytest.raises(RuntimeError):
+        await InProcessNLPService().extract("not loaded")
+
+
+@pytest.mark.asyncio
+async def test_pipeline_inputs_match_the_backend_mapping(service):
+    inputs = service.to_pipeline_inputs(await service.extract("I cannot sleep at night"))
+    symptoms = inputs["symptoms"]
+    # Every criterion, in table order, named as the backend's mdd-criteria.js names them
+    assert [s["dsm5Code"] for s in symptoms] == [f"A{i}" for i in range(1, 10)]
+    assert symptoms[0]["name"] == "Depressed mood most of the day, nearly every day"
+    assert [s["dsm5Code"] for s in symptoms if s["detected"]] == ["A4"]
+    assert symptoms[3]["evidence"] == ["cannot sleep"]
+    assert symptoms[0]["confidence"] == 0.0
+    assert inputs["metadata"]["durationDays"] == 21
+    assert inputs["metadata"]["durationSpecified"] is True
+    assert inputs["metadata"]["functionalImpairment"] == "work"
+
+
+@pytest.fixture
+def nlp_tree(tmp_path, monkeypatch):
+    """A minimal NLP service source tree whose modules use absolute ``app.*`` imports"""
+    for package in ("app", "app/services", "app/models"):
+        (tmp_path / package).mkdir()
+        (tmp_path / package / "__init__.py").write_text("")
+    (tmp_path / "app/models/symptom_patterns.py").write_text("SYMPTOM_PATTERNS = {'A1': {}}\n")
+    (tmp_path / "app/services/symptom_extractor.py").write_text(
+        "from app.models.symptom_patterns import SYMPTOM_PATTERNS\n"
+        "import app.models.symptom_patterns\n\n"
+        "class SymptomExtractor:\n"
+        "    patterns = SYMPTOM_PATTERNS\n"
+        "    module = app.models.symptom_patterns\n"
+    )
+    monkeypatch.setattr(sys, "meta_path", list(sys.meta_path))
+    yield tmp_path
+    for name in [n for n in sys.modules if n.split(".")[0] == nlp_bridge.NLP_PACKAGE]:
+        del sys.modules[name]
+
+
+def test_nlp_modules_load_under_their_own_package(nlp_tree):
+    own_app = sys.modules["app"]
+    own_modules = {name for name in sys.modules if name.split(".")[0] == "app"}
+
+    extractor = nlp_bridge._load_nlp_modules(str(nlp_tree))["SymptomExtractor"]
+
+    assert extractor.patterns == {"A1": {}}
+    assert extractor.module.__name__ == f"{nlp_bridge.NLP_PACKAGE}.models.symptom_patterns"
+    assert extractor.__module__ == f"{nlp_bridge.NLP_PACKAGE}.services.symptom_extractor"
+    # This service's package was never swapped out
+    assert sys.modules["app"] is own_app
+    assert {name for name in sys.modules if name.split(".")[0] == "app"} == own_modules
+    assert str(nlp_tree) not in sys.path
+    # Loading again reuses the imported modules
+    assert nlp_bridge._load_nlp_modules(str(nlp_tree))["SymptomExtractor"] is extractor
+
+    with pytest.raises(FileNotFoundError):
+        nlp_bridge._load_nlp_modules(str(nlp_tree / "missing"))
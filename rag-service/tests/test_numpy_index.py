@@ -0,0 +1,80 @@
+"""Exact search and where-filters of the in-memory NumPy index"""
+import numpy as np
+import pytest
+
+from app.services.numpy_index import NumpyIndex, UnsupportedFilterError
+
+
+@pytest.fixture
+def index():
+    index = NumpyIndex()
+    index.build(
+        ids=["a", "b", "c", "d"],
+        documents=["doc a", "doc b", "doc c", "doc d"],
+        metadatas=[
+            {"disorder_code": "F32", "page": 10},
+            {"disorder_code": "F33", "page": 20},
+            {"disorder_code": "F41.1", "page": 30},
+            {"page": 40},
+        ],
+        vectors=[np.array([[2.0, 0.0, 0.0], [0.0, 1.0, 0.0], [1.0, 1.0, 0.0], [0.0, 0.0, 1.0]])],
+    )
+    return index
+
+
+def test_query_ranks_by_cosine_similarity(index):
+    result = index.query([1.0, 0.1, 0.0], top_k=2)
+    assert result["ids"] == ["a", "c"]
+    assert result["documents"] == ["doc a", "doc c"]
+    # Rows are normalised at build time, so the scale of "a" does not matter
+    assert result["distances"][0] == pytest.approx(1 - 1 / np.linalg.norm([1.0, 0.1]), abs=1e-6)
+    assert result["distances"] == sorted(result["distances"])
+
+
+def test_top_k_larger_than_index_returns_everything(index):
+    assert index.query([1.0, 0.0, 0.0], top_k=10)["ids"][0] == "a"
+    assert len(index.query([1.0, 0.0, 0.0], top_k=10)["ids"]) == 4
+
+
+def test_where_filters(index):
+    query = [1.0, 1.0, 1.0]
+    assert index.query(query, 4, where={"disorder_code": "F33"})["ids"] == ["b"]
+    assert set(index.query(query, 4, where={"disorder_code": {"$in": ["F32", "F33"]}})["ids"]) == {"a", "b"}
+    assert set(index.query(query, 4, where={"disorder_code": {"$ne": "F32"}})["ids"]) == {"b", "c", "d"}
+    assert set(index.query(query, 4, where={"page": {"$gte": 30}})["ids"]) == {"c", "d"}
+    assert set(index.query(query, 4, where={
+        "$or": [{"disorder_code": "F32"}, {"page": {"$gt": 35}}],
+    })["ids"]) == {"a", "d"}
+    assert index.query(query, 4, where={"disorder_code": "F99"})["ids"] == []
+
+
+def test_unsupported_operator_raises(index):
+    with pytest.raises(UnsupportedFilterError):
+        index.query([1.0, 0.0, 0.0], 1, where={"page": {"$regex": "1"}})
+
+
+def test_lookup_respects_where_and_skips_unknown_ids(index):
+    found = index.lookup(["a", "b", "missing"], [1.0, 0.0, 0.0], where={"disorder_code": "F32"})
+    assert list(found) == ["a"]
+    document, metadata, distance = found["a"]
+    assert document == "doc a"
+    assert metadata["page"] == 10
+    assert distance == pytest.approx(0.0, abs=1e-6)
+
+
+def test_empty_index_returns_empty_result():
+    index = NumpyIndex()
+    index.build([], [], [], [])
+    assert index.size == 0
+    assert index.query([1.0, 0.0], top_k=3)["ids"] == []
+
+
+def test_query_batch_matches_single_queries(index):
+    queries = [[1.0, 0.1, 0.0], [0.0, 0.0, 1.0], [0.0, 0.0, 0.0]]
+    for where in (None, {"page": {"$gte": 20}}):
+        batch = index.query_batch(queries, top_k=2, where=where)
+        assert batch == [index.query(query, top_k=2, where=where) for query in queries]
+    assert index.query_batch(queries, 2, where={"disorder_code": "F99"}) == [
+        {"documents": [], "metadatas": [], "distances": [], "ids": []}
+    ] * 3
+    assert index.query_batch([], top_k=2) == []
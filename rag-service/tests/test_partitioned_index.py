@@ -0,0 +1,74 @@
+"""Disorder-code hierarchy and the per-partition NumPy index"""
+import numpy as np
+import pytest
+
+from app.services.code_hierarchy import CodeHierarchy
+from app.services.numpy_index import NumpyIndex
+from app.services.partitioned_index import PartitionedIndex
+
+METADATAS = [
+    {"disorder_code": "F32", "disorder_name": "Major Depressive Disorder", "page": 1},
+    {"disorder_code": "F32.1", "disorder_name": "Major Depressive Disorder", "page": 2},
+    {"disorder_code": "F33", "disorder_name": "Major Depressive Disorder", "page": 3},
+    {"disorder_code": "F41.1", "disorder_name": "Generalized Anxiety Disorder", "page": 4},
+    {"disorder_code": "F50", "disorder_name": "Anorexia Nervosa", "page": 5},
+    {"disorder_code": "", "page": 6},
+]
+
+
+def test_prefixes_resolve_to_present_codes():
+    hierarchy = CodeHierarchy.from_metadatas(METADATAS)
+    assert hierarchy.resolve(["F32"]) == {"F32", "F32.1"}
+    assert hierarchy.resolve(["f3"]) == {"F32", "F32.1", "F33"}
+    assert hierarchy.resolve(["F99"]) == set()
+    assert hierarchy.resolve([""]) == {""}
+    assert hierarchy.resolve_name("generalized anxiety disorder") == {"F41.1"}
+
+
+def test_codes_for_symptoms_adds_differentials_of_detected_criteria():
+    hierarchy = CodeHierarchy.from_metadatas(METADATAS)
+    base = hierarchy.codes_for_symptoms([])
+    assert base == {"F32", "F32.1", "F33", ""}
+    with_appetite = hierarchy.codes_for_symptoms([
+        {"dsm5Code": "A3", "detected": True},
+        {"dsm5Code": "A8", "detected": False},
+    ])
+    assert with_appetite == base | {"F50"}
+
+
+@pytest.fixture
+def indexes():
+    rng = np.random.default_rng(0)
+    vectors = [rng.normal(size=(len(METADATAS), 8)).astype(np.float32)]
+    ids = [f"c{i}" for i in range(len(METADATAS))]
+    documents = [f"doc {i}" for i in range(len(METADATAS))]
+    flat, partitioned = NumpyIndex(), PartitionedIndex()
+    flat.build(ids, documents, METADATAS, vectors)
+    partitioned.build(ids, documents, METADATAS, vectors)
+    return flat, partitioned, vectors[0]
+
+
+@pytest.mark.parametrize("where", [
+    None,
+    {"disorder_code": "F33"},
+    {"disorder_code": {"$eq": "F41.1"}},
+    {"disorder_code": {"$in": ["F32", "F32.1", "F50"]}},
+    {"disorder_code": {"$in": ["F32", "F32.1", "F33"]}, "page": {"$gte": 2}},
+    {"disorder_name": "Major Depressive Disorder"},
+    {"disorder_code": {"$in": ["F32", "F50"]}, "disorder_name": "Anorexia Nervosa"},
+])
+def test_partitioned_results_match_full_scan(indexes, where):
+    flat, partitioned, vectors = indexes
+    for query in vectors:
+        expected = flat.query(query.tolist(), top_k=3, where=where)
+        actual = partitioned.query(query.tolist(), top_k=3, where=where)
+        assert actual["ids"] == expected["ids"]
+        assert actual["distances"] == pytest.approx(expected["distances"], abs=1e-6)
+
+    batch = partitioned.query_batch(vectors.tolist(), top_k=3, where=where)
+    assert [r["ids"] for r in batch] == [flat.query(q.tolist(), 3, where)["ids"] for q in vectors]
+
+
+def test_unknown_partition_returns_nothing(indexes):
+    _, partitioned, vectors = indexes
+    assert partitioned.query(vectors[0].tolist(), 3, where={"disorder_code": "F99"})["ids"] == []
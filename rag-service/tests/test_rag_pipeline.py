@@ -0,0 +1,354 @@
+"""RAGPipeline over a small hashing-embedded collection, with the LLM stubbed"""
+import asyncio
+
+import pytest
+
+from app.config.settings import settings
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.rag_pipeline import RAGPipeline
+from app.services.sentence_index import SentenceIndex
+
+CHUNKS = [
+    ("Depressed mood most of the day, nearly every day", "F32", "diagnostic_criteria"),
+    ("Markedly diminished interest or pleasure in activities", "F32", "diagnostic_criteria"),
+    ("Insomnia or hypersomnia nearly every day", "F33", "diagnostic_criteria"),
+    ("Excessive anxiety and worry occurring more days than not", "F41.1", "diagnostic_criteria"),
+]
+
+
+@pytest.fixture
+def pipeline(data_dir, monkeypatch):
+    monkeypatch.setattr(settings, "chroma_persist_dir", data_dir)
+    monkeypatch.setattr(settings, "chroma_collection_name", "pipeline_test")
+    monkeypatch.setattr(settings, "assessment_cache_enabled", False)
+    monkeypatch.setattr(settings, "request_coalescing_enabled", False)
+    pipeline = RAGPipeline()
+    # tiktoken downloads its encodings; one token per word keeps tests offline
+    pipeline.llm_service.count_tokens = lambda text: len(text.split())
+    texts = [text for text, _, _ in CHUNKS]
+    pipeline.retrieval_service.add_documents(
+        ids=[f"chunk_{i}" for i in range(len(CHUNKS))],
+        documents=texts,
+        embeddings=pipeline.embedding_service.embed_batch_sync(texts),
+        metadatas=[
+            {"disorder_code": code, "disorder_name": "", "section_type": section, "page_range": "1-2"}
+            for _, code, section in CHUNKS
+        ],
+    )
+    yield pipeline
+    pipeline.embedding_service.close()
+
+
+def stub_llm(pipeline, fail_on=None):
+    """Replace the chat call; prompts containing ``fail_on`` raise"""
+    prompts = []
+
+    async def generate_assessment(system_prompt, user_prompt, input_tokens=None, deadline=None, **_):
+        prompts.append(user_prompt)
+        if fail_on and fail_on in user_prompt:
+            raise RuntimeError("LLM unavailable")
+        return {
+            "result": {"clinical_narrative": "Meets criteria", "confidence": 0.8},
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120,
+                      "cached_prompt_tokens": 64, "model": "stub"},
+            "rate_limit_wait_ms": 0.0,
+        }
+
+    pipeline.llm_service.generate_assessment = generate_assessment
+    return prompts
+
+
+@pytest.mark.asyncio
+async def test_assess_batch_aggregates_usage_and_isolates_failures(pipeline):
+    prompts = stub_llm(pipeline, fail_on="trigger failure")
+    items = [
+        {"patient_text": "Low mood and no interest in hobbies for weeks"},
+        {"patient_text": "Cannot sleep and worries constantly", "retrieval_filter": {"disorder_code": "F33"}},
+        {"patient_text": "Please trigger failure for this presentation"},
+    ]
+
+    result = await pipeline.assess_batch(items)
+
+    assert len(prompts) == 3
+    assert [r["success"] for r in result["results"]] == [True, True, False]
+    assert result["results"][2]["error"] == "LLM unavailable"
+    assert result["usage"] == {
+        "prompt_tokens": 200, "completion_tokens": 40, "total_tokens": 240,
+        "cached_prompt_tokens": 128, "model": pipeline.llm_service.model,
+    }
+    assert result["metrics"]["succeeded"] == 2
+    assert result["metrics"]["vector_searches"] == 2
+    sources = result["results"][1]["data"]["sources"]
+    assert sources and all(s["code"] == "F33" for s in sources)
+
+
+@pytest.mark.asyncio
+async def test_assess_batch_keeps_input_order(pipeline):
+    markers = ["alpha", "bravo", "charlie", "delta"]
+
+    async def generate_assessment(system_prompt, user_prompt, input_tokens=None, deadline=None, **_):
+        marker = next(m for m in markers if m in user_prompt)
+        # Earlier items finish last
+        await asyncio.sleep(0.01 * (len(markers) - markers.index(marker)))
+        return {
+            "result": {"clinical_narrative": marker, "confidence": 0.8},
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12, "model": "stub"},
+            "rate_limit_wait_ms": 0.0,
+        }
+
+    pipeline.llm_service.generate_assessment = generate_assessment
+    result = await pipeline.assess_batch([
+        {"patient_text": f"Low mood for weeks, case {marker}"} for marker in markers
+    ])
+
+    assert [r["index"] for r in result["results"]] == [0, 1, 2, 3]
+    assert [r["data"]["assessment"]["clinical_narrative"] for r in result["results"]] == markers
+    assert result["usage"]["total_tokens"] == 48
+
+
+@pytest.mark.asyncio
+async def test_assess_batch_searches_the_memory_index_once_per_filter(pipeline):
+    stub_llm(pipeline)
+    retrieval = pipeline.retrieval_service
+    retrieval.backend = "numpy"
+    index = retrieval.numpy_index
+    batches = []
+    query_batch = index.query_batch
+
+    def recording_query_batch(query_embeddings, top_k, where=None):
+        batches.append((len(query_embeddings), where))
+        return query_batch(query_embeddings, top_k, where)
+
+    index.query_batch = recording_query_batch
+    texts = ["Low mood and no interest", "Cannot sleep at night", "Worries all the time"]
+
+    result = await pipeline.assess_batch([{"patient_text": text} for text in texts])
+
+    assert batches == [(3, None)]
+    assert result["metrics"]["vector_searches"] == 1
+    # Same sources as searching one query at a time
+    for text, item in zip(texts, result["results"]):
+        single = await pipeline.assess(text)
+        assert item["data"]["sources"] == single["sources"]
+
+
+@pytest.mark.asyncio
+async def test_assess_batch_enforces_the_deadline(pipeline):
+    release, prompts = gate_llm(pipeline)
+    items = [{"patient_text": "Low mood and no interest"}, {"patient_text": "Cannot sleep at night"}]
+
+    # The LLM stage overruns: every item fails on its own, the batch still returns
+    result = await asyncio.wait_for(pipeline.assess_batch(items, deadline=Deadline(0.2)), 2.0)
+    assert [r["success"] for r in result["results"]] == [False, False]
+    assert all("Deadline exceeded" in r["error"] for r in result["results"])
+    release.set()
+
+    # Out of time before the shared stages: the whole batch fails
+    with pytest.raises(DeadlineExceeded):
+        await pipeline.assess_batch(items, deadline=Deadline(0.0))
+    assert prompts == []
+
+
+@pytest.mark.asyncio
+async def test_multi_query_embeds_once_and_fuses_searches(pipeline, monkeypatch):
+    monkeypatch.setattr(settings, "multi_query_enabled", True)
+    stub_llm(pipeline)
+    embed_calls = []
+    embed_batch = pipeline.embedding_service.embed_batch
+
+    async def recording_embed_batch(texts, **kwargs):
+        embed_calls.append(list(texts))
+        return await embed_batch(texts, **kwargs)
+
+    pipeline.embedding_service.embed_batch = recording_embed_batch
+    symptoms = [{"name": "Insomnia or hypersomnia", "detected": True, "evidence": ["cannot sleep"]}]
+
+    result = await pipeline.assess(
+        "I cannot sleep more than three hours a night. Nothing I used to enjoy interests me anymore.",
+        symptoms=symptoms,
+    )
+
+    # Main query plus two patient sentences and one symptom query, in a single call
+    assert len(embed_calls) == 1 and len(embed_calls[0]) == 4
+    assert result["pipeline_metrics"]["retrieval_queries"] == 4
+    excerpts = [source["excerpt"] for source in result["sources"]]
+    assert excerpts and len(excerpts) == len(set(excerpts))
+
+
+def test_merged_chunks_are_counted_from_stored_token_counts(pipeline):
+    section = "Criterion A. Depressed mood. Criterion B. Anhedonia. Criterion C. Weight."
+
+    def chunk(chunk_id, start, end, token_count):
+        return {"id": chunk_id, "document": section[start:end], "distance": 0.2, "metadata": {
+            "section_index": 0, "char_start": start, "char_end": end, "token_count": token_count,
+        }}
+
+    def no_tokenizing(text):
+        raise AssertionError("chunk text tokenized at query time")
+
+    pipeline.llm_service.count_tokens = no_tokenizing
+    pipeline.context_packer.llm_service.count_tokens = no_tokenizing
+    merged, absorbed, removed = pipeline._merge_chunks([chunk("a", 0, 40, 8), chunk("b", 30, len(section), 9)])
+
+    assert absorbed == 1
+    assert merged[0]["metadata"]["token_count"] == round(8 + 9 * (len(section) - 40) / (len(section) - 30))
+    assert removed > 0
+
+
+@pytest.mark.asyncio
+async def test_compressed_prompt_reports_its_uncompressed_size(pipeline, monkeypatch):
+    stub_llm(pipeline)
+    document = (
+        "Depressed mood most of the day, nearly every day, as indicated by subjective report. "
+        "Diminished ability to think or concentrate, or indecisiveness. "
+        "Recurrent thoughts of death, recurrent suicidal ideation without a specific plan."
+    )
+    retrieval = pipeline.retrieval_service
+    retrieval.add_documents(
+        ids=["long"],
+        documents=[document],
+        embeddings=pipeline.embedding_service.embed_batch_sync([document]),
+        metadatas=[{"disorder_code": "F32", "section_type": "diagnostic_criteria", "page_range": "3"}],
+    )
+    retrieval._sentence_index = SentenceIndex(identity=pipeline.embedding_service.identity).build(
+        ["long"], [document], [0],
+        embed=pipeline.embedding_service.embed_batch_sync,
+        count_tokens=pipeline.llm_service.count_tokens,
+    )
+    retrieval._sentence_index_loaded = True
+    monkeypatch.setattr(settings, "context_compression_chunk_tokens", 12)
+    text = "I cannot concentrate and keep thinking about death"
+
+    whole = (await pipeline.assess(text))["pipeline_metrics"]
+    assert whole["prompt_tokens_uncompressed"] == whole["prompt_tokens_estimate"]
+
+    monkeypatch.setattr(settings, "context_compression_enabled", True)
+    compressed = (await pipeline.assess(text))["pipeline_metrics"]
+    assert compressed["context_tokens_compressed"] > 0
+    assert compressed["prompt_tokens_estimate"] < whole["prompt_tokens_estimate"]
+    assert compressed["prompt_tokens_uncompressed"] == whole["prompt_tokens_estimate"]
+    assert "llm_ms" in compressed
+
+
+@pytest.mark.asyncio
+async def test_failed_criterion_rebuild_backs_off(pipeline, monkeypatch):
+    attempts = []
+
+    async def failing_refresh():
+        attempts.append(1)
+        raise RuntimeError("embedding provider down")
+
+    monkeypatch.setattr(pipeline, "refresh_criterion_table", failing_refresh)
+
+    assert pipeline._current_criterion_table() is None
+    # Requests while the build runs do not start another one
+    assert pipeline._current_criterion_table() is None
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert attempts == [1]
+
+    # Failed: later requests wait for the backoff instead of rebuilding
+    for _ in range(5):
+        pipeline._current_criterion_table()
+        await asyncio.sleep(0)
+    assert attempts == [1]
+    assert pipeline._criterion_retry_at > 0
+
+    # An index change allows an immediate retry
+    pipeline._invalidate_criterion_table("v2")
+    pipeline._current_criterion_table()
+    await asyncio.sleep(0)
+    assert len(attempts) == 2
+    await asyncio.sleep(0)
+
+
+def gate_llm(pipeline):
+    """Stub the chat call so it blocks until the returned event is set"""
+    release = asyncio.Event()
+    prompts = stub_llm(pipeline)
+    generate = pipeline.llm_service.generate_assessment
+
+    async def gated(*args, **kwargs):
+        await release.wait()
+        return await generate(*args, **kwargs)
+
+    pipeline.llm_service.generate_assessment = gated
+    return release, prompts
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_run(pipeline, monkeypatch):
+    monkeypatch.setattr(settings, "request_coalescing_enabled", True)
+    release, prompts = gate_llm(pipeline)
+
+    first = asyncio.ensure_future(pipeline.assess("Low mood and  no interest", metadata={"duration": "3w"}))
+    await asyncio.sleep(0)
+    # Same canonical input (whitespace differs)
+    second = asyncio.ensure_future(pipeline.assess(" Low mood and no interest ", metadata={"duration": "3w"}))
+    # Different metadata: its own run
+    other = asyncio.ensure_future(pipeline.assess("Low mood and no interest", metadata={"duration": "1y"}))
+    await asyncio.sleep(0.05)
+    release.set()
+    results = await asyncio.gather(first, second, other)
+
+    assert len(prompts) == 2
+    assert pipeline.coalesced_calls == 1
+    assert [r["pipeline_metrics"]["coalesced"] for r in results] == [False, True, False]
+    assert results[0]["assessment"] == results[1]["assessment"]
+    # Each caller gets its own copy to annotate
+    assert results[0]["pipeline_metrics"] is not results[1]["pipeline_metrics"]
+    assert pipeline._inflight == {}
+
+    # Finished runs are not reused
+    await pipeline.assess("Low mood and no interest", metadata={"duration": "3w"})
+    assert len(prompts) == 3
+    assert pipeline.coalesced_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_waiter_leaves_the_shared_run_going(pipeline, monkeypatch):
+    monkeypatch.setattr(settings, "request_coalescing_enabled", True)
+    release, prompts = gate_llm(pipeline)
+
+    starter = asyncio.ensure_future(pipeline.assess("Cannot sleep and worries constantly"))
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(pipeline.assess("Cannot sleep and worries constantly"))
+    await asyncio.sleep(0.05)
+    starter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await starter
+
+    release.set()
+    result = await waiter
+    assert result["pipeline_metrics"]["coalesced"] is True
+    assert len(prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_waiter_gives_up_at_its_own_deadline(pipeline, monkeypatch):
+    from app.services.deadline import Deadline, DeadlineExceeded
+
+    monkeypatch.setattr(settings, "request_coalescing_enabled", True)
+    release, prompts = gate_llm(pipeline)
+
+    starter = asyncio.ensure_future(pipeline.assess("Excessive worry every day"))
+    await asyncio.sleep(0)
+    with pytest.raises(DeadlineExceeded):
+        await pipeline.assess("Excessive worry every day", deadline=Deadline(0.05))
+
+    release.set()
+    assert (await starter)["pipeline_metrics"]["coalesced"] is False
+    assert len(prompts) == 1
+
+
+def test_request_key_is_canonical():
+    key = RAGPipeline.request_key
+    assert key("a  b", None, {"x": 1, "y": 2}, None) == key(" a b ", [], {"y": 2, "x": 1}, {})
+    assert key("a b", None, None, {"disorder_code": "F32"}) != key("a b", None, None, None)
+    assert key("a b", [{"name": "insomnia"}], None, None) != key("a b", None, None, None)
+
+
+def test_prompt_cache_layout_is_off_by_default():
+    from app.config.settings import Settings
+
+    assert Settings(openai_api_key="test").prompt_cache_layout is False
@@ -0,0 +1,176 @@
+"""Token buckets, header-driven limits and chat token reservations"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.llm_service import LLMService
+from app.services.rate_limiter import RateLimiter, parse_reset
+
+
+def test_parse_reset_durations():
+    assert parse_reset("1s") == 1.0
+    assert parse_reset("6m0s") == 360.0
+    assert parse_reset("20ms") == pytest.approx(0.02)
+    assert parse_reset("1h2m3.5s") == pytest.approx(3723.5)
+    assert parse_reset("2.5") == 2.5
+    assert parse_reset(None) == 0.0
+    assert parse_reset("soon") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_token_refill():
+    # 6000 TPM refills 100 tokens per second
+    limiter = RateLimiter("test", tpm=6000)
+    assert await limiter.acquire(5950) < 50
+    start = time.monotonic()
+    await limiter.acquire(100)
+    assert time.monotonic() - start == pytest.approx(0.5, abs=0.2)
+
+
+def test_reconcile_returns_unused_reservation():
+    limiter = RateLimiter("test", tpm=6000)
+    limiter.tokens.take(5000)
+    limiter.reconcile(reserved=5000, actual=1200)
+    assert limiter.tokens.level == pytest.approx(6000 - 1200, abs=5)
+
+
+def test_headers_lower_limits_and_429_pauses_callers():
+    limiter = RateLimiter("test")
+    limiter.observe_headers({
+        "x-ratelimit-limit-requests": "500",
+        "x-ratelimit-remaining-requests": "499",
+        "x-ratelimit-limit-tokens": "30000",
+        "x-ratelimit-remaining-tokens": "1000",
+    })
+    assert limiter.tokens.capacity == 30000
+    assert limiter.tokens.level == 1000
+
+    limiter.on_rate_limited({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "2s"})
+    assert limiter._paused_until - time.monotonic() == pytest.approx(2.0, abs=0.1)
+
+
+class StubCompletions:
+    """Chat completions endpoint returning fixed usage, recording the call"""
+
+    def __init__(self, completion_tokens):
+        self.completion_tokens = completion_tokens
+        self.kwargs = None
+        self.with_raw_response = self
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+        usage = SimpleNamespace(
+            prompt_tokens=100,
+            completion_tokens=self.completion_tokens,
+            total_tokens=100 + self.completion_tokens,
+            prompt_tokens_details=None,
+        )
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"ok": true}'))],
+            usage=usage,
+        )
+        return SimpleNamespace(headers={}, parse=lambda: response)
+
+
+@pytest.mark.asyncio
+async def test_chat_reserves_prompt_plus_max_tokens_then_reconciles():
+    llm = LLMService()
+    llm.max_tokens = 1000
+    completions = StubCompletions(completion_tokens=250)
+    llm.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    llm.limiter = RateLimiter("chat:test", tpm=60000)
+
+    reserved = []
+    acquire = llm.limiter.acquire
+
+    async def recording_acquire(tokens):
+        reserved.append(tokens)
+        return await acquire(tokens)
+
+    llm.limiter.acquire = recording_acquire
+    result = await llm.generate_assessment("system", "user", input_tokens=100)
+
+    assert result["result"] == {"ok": True}
+    assert reserved == [1100]
+    assert completions.kwargs["max_tokens"] == 1000
+    # Only the billed 350 tokens stay charged
+    assert llm.limiter.tokens.level == pytest.approx(60000 - 350, abs=5)
+
+
+class StubStream:
+    """Streaming response yielding ``pieces``, then a usage chunk or ``error``"""
+
+    def __init__(self, pieces, completion_tokens=None, error=None):
+        self.pieces = pieces
+        self.completion_tokens = completion_tokens
+        self.error = error
+        self.closed = False
+
+    async def __aiter__(self):
+        for piece in self.pieces:
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+        if self.error is not None:
+            raise self.error
+        if self.completion_tokens is not None:
+            usage = SimpleNamespace(
+                prompt_tokens=100,
+                completion_tokens=self.completion_tokens,
+                total_tokens=100 + self.completion_tokens,
+                prompt_tokens_details=None,
+            )
+            yield SimpleNamespace(usage=usage, choices=[])
+
+    async def close(self):
+        self.closed = True
+
+
+def streaming_llm(stream):
+    llm = LLMService()
+    llm.max_tokens = 1000
+    llm.limiter = RateLimiter("chat:test", tpm=60000)
+    # One token per word keeps the test offline
+    llm.count_tokens = lambda text: len(text.split())
+
+    async def create(**kwargs):
+        return SimpleNamespace(headers={}, parse=lambda: stream)
+
+    completions = SimpleNamespace(create=create)
+    completions.with_raw_response = completions
+    llm.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return llm
+
+
+@pytest.mark.asyncio
+async def test_completed_stream_reconciles_billed_usage():
+    llm = streaming_llm(StubStream(["one two ", "three"], completion_tokens=40))
+    parts = [part async for part in llm.stream_assessment("system", "user", input_tokens=100)]
+    assert parts[-1]["usage"]["total_tokens"] == 140
+    assert llm.limiter.tokens.level == pytest.approx(60000 - 140, abs=5)
+
+
+@pytest.mark.asyncio
+async def test_failed_stream_charges_only_what_was_generated():
+    stream = StubStream(["one two ", "three"], error=RuntimeError("connection reset"))
+    llm = streaming_llm(stream)
+    with pytest.raises(RuntimeError):
+        async for _ in llm.stream_assessment("system", "user", input_tokens=100):
+            pass
+    # Prompt plus three streamed tokens, not the 1100-token reservation
+    assert llm.limiter.tokens.level == pytest.approx(60000 - 103, abs=5)
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_releases_its_reservation():
+    stream = StubStream(["one two ", "three ", "four"], completion_tokens=40)
+    llm = streaming_llm(stream)
+    parts = llm.stream_assessment("system", "user", input_tokens=100)
+    # The client disconnects after the first fragment
+    async for part in parts:
+        if "content" in part:
+            break
+    await parts.aclose()
+    assert llm.limiter.tokens.level == pytest.approx(60000 - 102, abs=5)
+    assert stream.closed
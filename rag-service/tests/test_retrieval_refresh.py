@@ -0,0 +1,111 @@
+"""RetrievalService notices an index replaced by another process"""
+import pytest
+
+from app.config.settings import settings
+from app.services.retrieval_service import RetrievalService
+
+
+def fill(service, prefix, vectors):
+    service.add_documents(
+        ids=[f"{prefix}_{i}" for i in range(len(vectors))],
+        documents=[f"{prefix} document {i}" for i in range(len(vectors))],
+        embeddings=vectors,
+        metadatas=[{"disorder_code": "F32", "section_type": "general"} for _ in vectors],
+    )
+
+
+@pytest.fixture
+def persist_dir(data_dir, monkeypatch):
+    monkeypatch.setattr(settings, "chroma_persist_dir", data_dir)
+    monkeypatch.setattr(settings, "chroma_collection_name", "refresh_test")
+    monkeypatch.setattr(settings, "retrieval_backend", "numpy")
+    monkeypatch.setattr(settings, "hybrid_retrieval", False)
+    return data_dir
+
+
+def test_reingestion_by_another_instance_is_picked_up(persist_dir):
+    service = RetrievalService()
+    fill(service, "old", [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    service.load_index()
+    assert service.query([1.0, 0.0, 0.0], top_k=1)["ids"] == ["old_0"]
+    versions = []
+    service.on_index_change(versions.append)
+
+    # Stand-in for scripts/ingest_pdf.py: separate service, same persisted store
+    ingest = RetrievalService()
+    ingest.delete_collection()
+    ingest._collection = None
+    fill(ingest, "new", [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0], [0.0, 1.0, 0.0]])
+
+    assert service.check_stored_index() is True
+    assert len(versions) == 1
+    assert service.document_count == 3
+    assert service.query([1.0, 0.0, 0.0], top_k=1)["ids"] == ["new_0"]
+    # No further change: nothing to reload
+    assert service.check_stored_index() is False
+
+
+def test_own_writes_do_not_count_as_external_changes(persist_dir):
+    service = RetrievalService()
+    fill(service, "a", [[1.0, 0.0, 0.0]])
+    service.load_index()
+    fill(service, "b", [[0.0, 1.0, 0.0]])
+    assert service.check_stored_index() is False
+    assert service.document_count == 2
+
+
+@pytest.mark.asyncio
+async def test_refresh_is_rate_limited_unless_forced(persist_dir, monkeypatch):
+    monkeypatch.setattr(settings, "index_refresh_interval_seconds", 3600)
+    service = RetrievalService()
+    fill(service, "a", [[1.0, 0.0, 0.0]])
+    service.load_index()
+    calls = []
+    monkeypatch.setattr(service, "check_stored_index", lambda: calls.append(1) or False)
+
+    await service.arefresh_if_changed()
+    await service.arefresh_if_changed()
+    assert len(calls) == 1
+    await service.arefresh_if_changed(force=True)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_collection_reads_after_a_refresh_stay_off_the_event_loop(persist_dir, monkeypatch):
+    import threading
+
+    from app.services import retrieval_service
+
+    monkeypatch.setattr(settings, "retrieval_backend", "chroma")
+    monkeypatch.setattr(settings, "hybrid_retrieval", True)
+    service = RetrievalService()
+    fill(service, "old", [[1.0, 0.0, 0.0]])
+    service.load_index()
+
+    ingest = RetrievalService()
+    ingest.delete_collection()
+    ingest._collection = None
+    fill(ingest, "new", [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+    threads = []
+    from_metadatas = retrieval_service.CodeHierarchy.from_metadatas
+    plan = service._plan
+
+    def recording_plan(top_k):
+        # Only an uncached count reads the collection
+        if service._doc_count is None:
+            threads.append(threading.get_ident())
+        return plan(top_k)
+
+    monkeypatch.setattr(
+        retrieval_service.CodeHierarchy, "from_metadatas",
+        lambda metadatas: threads.append(threading.get_ident()) or from_metadatas(metadatas),
+    )
+    monkeypatch.setattr(service, "_plan", recording_plan)
+
+    assert await service.arefresh_if_changed(force=True) is True
+    service._doc_count = None
+    assert await service.adisorder_filter("F3") == {"disorder_code": "F32"}
+    result = await service.aquery([1.0, 0.0, 0.0], top_k=1, query_text="new document")
+    assert result["ids"] == ["new_0"]
+    assert threads and threading.get_ident() not in threads
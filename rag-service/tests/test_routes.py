@@ -0,0 +1,73 @@
+"""Request handling in the API routes, with the pipeline stubbed out"""
+import json
+
+import httpx
+import pytest
+
+from app.api import routes
+from app.main import app
+
+RESULT = {
+    "assessment": {"summary": "ok"},
+    "sources": [],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    "pipeline_metrics": {},
+}
+
+
+class StubRetrieval:
+    async def adisorder_filter(self, code_prefix):
+        return {"disorder_code": code_prefix.upper()}
+
+
+class StubPipeline:
+    """Records the keyword arguments each handler passes to the pipeline"""
+
+    def __init__(self):
+        self.retrieval_service = StubRetrieval()
+        self.calls = []
+
+    async def assess(self, **kwargs):
+        self.calls.append(kwargs)
+        return RESULT
+
+    async def assess_stream(self, **kwargs):
+        self.calls.append(kwargs)
+        yield {"event": "done", "data": {"usage": RESULT["usage"]}}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    pipeline = StubPipeline()
+    monkeypatch.setattr(routes, "rag_pipeline", pipeline)
+    return pipeline
+
+
+BODY = {
+    "text": "Two months of low mood and poor sleep",
+    "symptoms": [{"name": "Depressed mood", "dsm5Code": "A1", "detected": True}],
+    "disorder_filter": "f32",
+}
+
+
+async def post(path, body):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post(path, json=body, headers={"X-Request-Timeout-Ms": "5000"})
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/rag/query", "/rag/query/stream"])
+async def test_query_handlers_share_pipeline_inputs(pipeline, path):
+    response = await post(path, BODY)
+    assert response.status_code == 200
+
+    call, = pipeline.calls
+    expected = await routes._pipeline_inputs(routes.RAGQueryRequest(**BODY))
+    assert {k: v for k, v in call.items() if k != "deadline"} == expected
+    assert call["retrieval_filter"] == {"disorder_code": "F32"}
+    assert call["deadline"] is not None
+    if path.endswith("stream"):
+        assert "event: done" in response.text
+    else:
+        assert json.loads(response.text)["data"]["assessment"] == {"summary": "ok"}
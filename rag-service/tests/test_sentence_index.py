@@ -0,0 +1,164 @@
+"""Sentence splitting, the per-sentence index, context compression and ingestion gating"""
+import os
+
+import numpy as np
+import pytest
+
+from app.config.settings import settings
+from app.services import sentence_index
+from app.services.embedding_providers import HashingEmbeddingProvider
+from app.services.retrieval_service import RetrievalService
+from app.services.sentence_index import GAP_MARKER, SentenceIndex, compress_context, split_sentences
+
+DOCUMENTS = {
+    "mdd": (
+        "Depressed mood most of the day, nearly every day. "
+        "Markedly diminished interest or pleasure in all activities. "
+        "Significant weight loss when not dieting, or weight gain."
+    ),
+    "gad": (
+        "Excessive anxiety and worry occurring more days than not. "
+        "The individual finds it difficult to control the worry."
+    ),
+}
+
+
+def count_tokens(text):
+    return len(text.split())
+
+
+@pytest.fixture
+def provider():
+    provider = HashingEmbeddingProvider(dimensions=64)
+    yield provider
+    provider.close()
+
+
+@pytest.fixture
+def index(provider):
+    return SentenceIndex(identity=provider.identity).build(
+        list(DOCUMENTS), list(DOCUMENTS.values()), [0, 0], embed=provider._encode, count_tokens=count_tokens
+    )
+
+
+def test_split_sentences_keeps_short_pieces_with_the_next_sentence():
+    text = "Criterion A.\nDepressed mood most of the day. Loss of interest in activities."
+    spans = [text[s:e] for s, e in split_sentences(text)]
+    assert spans == [
+        "Criterion A.\nDepressed mood most of the day.",
+        "Loss of interest in activities.",
+    ]
+    assert split_sentences("   ") == []
+    assert split_sentences("Too short.") == [(0, 10)]
+
+
+def test_build_indexes_every_sentence(index):
+    assert index.ids == ["mdd", "gad"]
+    assert index.size == 5
+    assert index.sentence_rows("mdd") == (0, 3, 0)
+    assert index.sentence_rows("gad") == (3, 5, 0)
+    assert index.sentence_rows("missing") is None
+    assert np.linalg.norm(index.vectors, axis=1) == pytest.approx(np.ones(5), rel=1e-5)
+    assert int(index.tokens[0]) == count_tokens("Depressed mood most of the day, nearly every day.")
+
+
+def test_save_and_load_round_trip_keeps_identity(index, provider, data_dir):
+    path = sentence_index.index_path(data_dir, "dsm5")
+    index.save(path)
+    loaded = SentenceIndex.load(path)
+    assert loaded.identity == provider.identity
+    assert loaded.ids == index.ids
+    assert loaded.sentence_rows("gad") == index.sentence_rows("gad")
+    assert np.allclose(loaded.vectors, index.vectors)
+    assert SentenceIndex.load(sentence_index.index_path(data_dir, "missing")) is None
+
+
+def test_compress_keeps_the_sentences_closest_to_the_query(index, provider):
+    ctx = {"id": "mdd", "document": DOCUMENTS["mdd"], "metadata": {"page_range": "1"}}
+    query = provider._encode(["Significant weight loss when not dieting, or weight gain."])[0]
+    compressed, = compress_context([ctx], index, query, budget=12, chunk_tokens=lambda c: count_tokens(c["document"]))
+
+    assert compressed["id"] == "mdd"
+    assert compressed["original_document"] == DOCUMENTS["mdd"]
+    assert compressed["document"].endswith("Significant weight loss when not dieting, or weight gain.")
+    assert len(compressed["document"]) < len(DOCUMENTS["mdd"])
+    assert compressed["metadata"]["page_range"] == "1"
+
+    # Within budget, or not in the index: left whole
+    whole = compress_context([ctx], index, query, budget=100, chunk_tokens=lambda c: 30)
+    assert whole == [ctx]
+    other = {"id": "unknown", "document": DOCUMENTS["mdd"], "metadata": {}}
+    assert compress_context([other], index, query, budget=5, chunk_tokens=lambda c: 30) == [other]
+
+
+def test_compress_marks_dropped_text(index, provider):
+    ctx = {"id": "mdd", "document": DOCUMENTS["mdd"], "metadata": {}}
+    scores = np.asarray([1.0, 0.0, 0.9], dtype=np.float32)
+    reduced = index.compress(ctx, scores, [(0, 0), (1, 0), (2, 0)], budget=25)
+    assert GAP_MARKER in reduced["document"]
+    assert "diminished interest" not in reduced["document"]
+
+
+@pytest.fixture
+def persisted(monkeypatch, data_dir, index):
+    monkeypatch.setattr(settings, "chroma_persist_dir", data_dir)
+    monkeypatch.setattr(settings, "chroma_collection_name", "sentences_test")
+    index.save(sentence_index.index_path(data_dir, "sentences_test"))
+    return index
+
+
+def test_retrieval_service_uses_a_matching_index(persisted, provider):
+    service = RetrievalService()
+    service.embedding_identity = provider.identity
+    assert service.sentence_index.ids == persisted.ids
+
+
+def test_retrieval_service_ignores_an_index_from_another_model(persisted):
+    service = RetrievalService()
+    service.embedding_identity = HashingEmbeddingProvider(dimensions=32).identity
+    assert service.sentence_index is None
+
+
+def test_retrieval_service_checks_dimensions_of_legacy_index(persisted, data_dir):
+    persisted.identity = {}
+    persisted.save(sentence_index.index_path(data_dir, "sentences_test"))
+
+    other = RetrievalService()
+    other.embedding_identity = HashingEmbeddingProvider(dimensions=32).identity
+    assert other.sentence_index is None
+    same = RetrievalService()
+    same.embedding_identity = HashingEmbeddingProvider(dimensions=64).identity
+    assert same.sentence_index is not None
+
+
+def chunk(chunk_id, text):
+    return {"id": chunk_id, "text": text, "metadata": {"disorder_code": "F32"}, "char_start": 0}
+
+
+@pytest.mark.parametrize("flag, enabled, built", [
+    (None, False, False),
+    (None, True, True),
+    (True, False, True),
+    (False, True, False),
+])
+def test_ingestion_builds_sentence_index_only_when_requested(monkeypatch, data_dir, flag, enabled, built):
+    import scripts.ingest_pdf as ingest_pdf
+
+    monkeypatch.setattr(settings, "context_compression_enabled", enabled)
+    # Overridden by the ingestion; restored afterwards
+    monkeypatch.setattr(settings, "chroma_persist_dir", data_dir)
+    monkeypatch.setattr(settings, "chroma_collection_name", "gated")
+    monkeypatch.setattr(ingest_pdf, "_token_encoder", lambda: type("Enc", (), {"encode": staticmethod(str.split)}))
+    path = sentence_index.index_path(data_dir, "gated")
+    # A stale index from an earlier ingestion is never left behind
+    SentenceIndex().save(path)
+
+    ingest_pdf.ingest_to_chromadb(
+        chunks=[chunk(chunk_id, text) for chunk_id, text in DOCUMENTS.items()],
+        collection_name="gated",
+        chroma_persist_dir=data_dir,
+        build_sentence_index=flag,
+    )
+    assert os.path.exists(path) == built
+    if built:
+        assert SentenceIndex.load(path).identity["embedding_provider"] == "hashing"